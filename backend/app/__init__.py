@@ -1,14 +1,66 @@
 from flask import Flask
+from .admission import init_admission
+from .config import apply_config, load_config, load_secret_key
+from .encoding import init_encoding
+from .jobs import start_job_runner
+from .metrics import init_metrics
+from .reminders import start_scheduler
+from .slowlog import init_slow_query_log
+from .stats import start_reconciler
 from .routes import register_blueprints
-import secrets
 
 
-def create_app():
+def create_app(config=None, start_background=True):
     """
     创建并配置Flask应用实例
+    config 为 load_config() 的结果，不提供时从配置文件和环境变量加载
+    start_background 为 False 时不启动后台线程，由调用方在工作进程中调用 start_background_tasks（见 serve.py）
     """
+    config = config or load_config()
+    apply_config(config)
+
     app = Flask(__name__)
-    app.secret_key = secrets.token_hex(32)
+    # 会话签名密钥需在所有工作进程和重启之间保持一致
+    app.secret_key = load_secret_key(config)
+    app.config["ADMIN_TOKEN"] = config.get("admin_token")
     register_blueprints(app)
+    init_metrics(app)
+    init_admission(app)
+    init_encoding(app)
+    init_slow_query_log()
+    if start_background:
+        start_background_tasks()
 
     return app
+
+
+def start_background_tasks():
+    """
+    按已应用的配置启动后台线程（提醒调度、统计对账与后台任务），需在 apply_config 之后调用
+    """
+    start_scheduler()
+    start_reconciler()
+    start_job_runner()
+
+
+def init_worker_resources():
+    """
+    重置从父进程继承的进程级资源（连接池、缓存、事件通道、哈希进程池），并丢弃父进程的后台线程状态
+    多进程部署时在 fork 出工作进程之后、加载应用之前调用；此时配置可能尚未应用，
+    后台线程在加载应用之后由 start_background_tasks 启动
+    """
+    from .cache import set_cache
+    from .db import reset_pool
+    from .events import reset_events
+    from .hashing import shutdown_hash_pool
+    from .jobs import stop_job_runner
+    from .reminders import stop_scheduler
+    from .stats import stop_reconciler
+
+    reset_pool()
+    set_cache(None)
+    reset_events()
+    shutdown_hash_pool()
+    stop_scheduler()
+    stop_reconciler()
+    stop_job_runner()
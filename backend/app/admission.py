@@ -0,0 +1,316 @@
+"""
+请求准入控制
+数据库变慢时，处理中的请求越积越多，每个请求都占着一个线程并等待连接池，只会让过载更严重；
+准入控制在请求进入视图之前决定放行、排队还是快速拒绝：
+- 按用户（未登录时按客户端地址）的令牌桶限流，每个接口按 costs 消耗不同数量的令牌，超出时返回 429
+- 进程内同时处理的请求数有上限，超出时最多排队 queue_timeout 秒，仍无空位时返回 503；
+  消耗多个令牌的昂贵请求只能使用上限的 expensive_share，过载时先被拒绝
+- 上限随数据库延迟自适应：每 adjust_interval 秒按这段时间内 SQL 执行与借出连接的平均耗时调整，
+  超过 target_latency 时按比例下调，否则逐步恢复到 max_concurrent
+拒绝的响应都带 Retry-After
+
+令牌桶与并发上限都是进程内的，总的上限为工作进程数乘以这里的配置；
+流式响应在开始输出时即释放名额，其数据库连接仍受连接池大小限制
+
+部署在反向代理之后时 remote_addr 都是代理的地址，所有未登录的客户端会共用一个令牌桶；
+此时应把 trusted_proxies 设为代理的层数，按 X-Forwarded-For 中代理追加的地址识别客户端
+（客户端自己伪造的 X-Forwarded-For 位于代理追加的地址之前，不会被采用）
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# 准入控制配置
+# enabled: 是否启用
+# max_concurrent / min_concurrent: 每个进程同时处理的请求数上下限，实际上限在两者之间自适应
+# queue_timeout: 没有空位时最多等待的秒数
+# max_waiting: 最多同时等待的请求数，超出时不排队直接拒绝
+# expensive_share: 令牌消耗大于 1 的请求可使用的并发上限比例
+# target_latency: 数据库平均耗时（秒）的目标值，超过时下调并发上限
+# adjust_interval: 调整并发上限的间隔（秒）
+# backoff: 超过目标延迟时并发上限乘以的系数
+# rate / burst: 每个用户每秒补充的令牌数与令牌桶容量，rate 为 0 表示不限流
+# default_cost: 未在 costs 中列出的接口每次请求消耗的令牌数
+# costs: 接口（蓝图名.视图函数名）到令牌消耗的映射，0 表示不受准入控制；
+#        变更通知的长连接大部分时间在等待，由 events 的订阅数上限约束，不占用并发名额
+# retry_after: 并发已满时 Retry-After 的秒数
+# max_clients: 进程内最多保存的令牌桶数，超出时淘汰最久未使用的
+# trusted_proxies: 应用前的反向代理层数，大于 0 时按 X-Forwarded-For / X-Forwarded-Proto 还原客户端地址；
+#                  没有代理时必须为 0，否则客户端可以伪造地址绕过限流
+ADMISSION_CONFIG = {
+    "enabled": True,
+    "max_concurrent": 64,
+    "min_concurrent": 2,
+    "queue_timeout": 0.5,
+    "max_waiting": 64,
+    "expensive_share": 0.5,
+    "target_latency": 0.25,
+    "adjust_interval": 1.0,
+    "backoff": 0.8,
+    "rate": 10,
+    "burst": 40,
+    "default_cost": 1,
+    "costs": {
+        "users.ping": 0,
+        "metrics.metrics": 0,
+        "events.stream_events": 0,
+        "events.poll_events": 0,
+        "users.login": 5,
+        "users.create_user": 5,
+        "tasks.search_tasks": 5,
+        "bulk.import_tasks_route": 20,
+    },
+    "retry_after": 1,
+    "max_clients": 100000,
+    "trusted_proxies": 0,
+}
+
+RATE_LIMITED = "请求过于频繁，请稍后重试"
+OVERLOADED = "服务繁忙，请稍后重试"
+
+
+def request_cost(endpoint):
+    """
+    接口每次请求消耗的令牌数，0 表示不受准入控制
+    """
+    return ADMISSION_CONFIG["costs"].get(endpoint, ADMISSION_CONFIG["default_cost"])
+
+
+def client_key(user_id, remote_addr):
+    return f"user:{user_id}" if user_id is not None else f"ip:{remote_addr}"
+
+
+def concurrency_share(cost):
+    return ADMISSION_CONFIG["expensive_share"] if cost > 1 else 1.0
+
+
+def retry_after(seconds):
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+class RateLimiter:
+    """
+    按客户端的令牌桶：每秒补充 rate 个令牌，最多积累 burst 个
+    """
+
+    def __init__(self):
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, cost, now=None):
+        """
+        取出 cost 个令牌，返回 0；令牌不足时不取出，返回需要等待的秒数
+        """
+        rate, burst = ADMISSION_CONFIG["rate"], ADMISSION_CONFIG["burst"]
+        if not rate:
+            return 0
+        cost = min(cost, burst)
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            wait = 0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > ADMISSION_CONFIG["max_clients"]:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def refund(self, key, cost):
+        """
+        归还令牌（请求因并发已满被拒绝，没有实际处理）
+        """
+        with self._lock:
+            entry = self._buckets.get(key)
+            if entry is not None:
+                self._buckets[key] = (min(ADMISSION_CONFIG["burst"], entry[0] + cost), entry[1])
+
+
+class AdaptiveLimit:
+    """
+    随数据库延迟调整的并发上限（加性增、乘性减）
+    由数据库的查询钩子与连接获取钩子提供样本，每 adjust_interval 秒按这段时间的平均耗时调整一次
+    """
+
+    def __init__(self):
+        self.value = ADMISSION_CONFIG["max_concurrent"]
+        self.latency = 0.0
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        # 本轮的 {类别: [耗时之和, 样本数]}
+        self._samples = {"query": [0.0, 0], "acquire": [0.0, 0]}
+
+    def observe(self, kind, seconds, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            sample = self._samples[kind]
+            sample[0] += seconds
+            sample[1] += 1
+            if now - self._window_start >= ADMISSION_CONFIG["adjust_interval"]:
+                self._adjust(now)
+
+    def _adjust(self, now):
+        self.latency = max(total / count if count else 0.0 for total, count in self._samples.values())
+        low, high = ADMISSION_CONFIG["min_concurrent"], ADMISSION_CONFIG["max_concurrent"]
+        if self.latency > ADMISSION_CONFIG["target_latency"]:
+            self.value = max(low, int(self.value * ADMISSION_CONFIG["backoff"]))
+        else:
+            self.value = min(high, self.value + max(1, self.value // 10))
+        self._window_start = now
+        self._samples = {kind: [0.0, 0] for kind in self._samples}
+
+
+class ConcurrencyLimiter:
+    """
+    进程内同时处理的请求数限制（线程版本），上限取自 AdaptiveLimit
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self.waiting = 0
+        self.counts = {"admitted": 0, "rejected_rate": 0, "rejected_busy": 0}
+        self._cond = threading.Condition()
+
+    def _has_room(self, share):
+        return self.in_flight < max(1, int(self.limit.value * share))
+
+    def _enter(self):
+        self.in_flight += 1
+        self.counts["admitted"] += 1
+        return True
+
+    def _rejected(self):
+        self.counts["rejected_busy"] += 1
+        return False
+
+    def rate_limited(self):
+        self.counts["rejected_rate"] += 1
+
+    def acquire(self, timeout, share=1.0):
+        """
+        占用一个名额，最多等待 timeout 秒，返回是否成功
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if self._has_room(share):
+                return self._enter()
+            if self.waiting >= ADMISSION_CONFIG["max_waiting"]:
+                return self._rejected()
+            self.waiting += 1
+            try:
+                while not self._has_room(share):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return self._rejected()
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            return self._enter()
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            # 等待者的可用比例不同，全部唤醒各自重新判断
+            self._cond.notify_all()
+
+    def stats(self):
+        return {
+            **self.counts,
+            "limit": self.limit.value,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "latency_seconds": self.limit.latency,
+        }
+
+
+_limit = None
+_limiter = None
+_rate_limiter = RateLimiter()
+
+
+def install_limiter(factory):
+    """
+    创建进程内的自适应上限与并发限制（factory 为 ConcurrencyLimiter 或其异步版本），
+    并挂载数据库的计时钩子作为延迟样本
+    """
+    from .db import add_acquire_hook, add_query_hook
+
+    global _limit, _limiter
+    _limit = AdaptiveLimit()
+    _limiter = factory(_limit)
+    add_query_hook(_on_query)
+    add_acquire_hook(_on_acquire)
+    return _limiter
+
+
+def get_rate_limiter():
+    return _rate_limiter
+
+
+def _on_query(statement, params, seconds, rowcount, error, shard):
+    if _limit is not None:
+        _limit.observe("query", seconds)
+
+
+def _on_acquire(seconds):
+    if _limit is not None:
+        _limit.observe("acquire", seconds)
+
+
+def admission_stats():
+    """
+    准入控制统计，供 /metrics 使用；未启用时为空
+    """
+    return _limiter.stats() if _limiter is not None else {}
+
+
+def admit_request():
+    """
+    Flask before_request 钩子：限流与并发控制，拒绝时直接返回响应
+    """
+    from flask import g, jsonify, request, session
+
+    cost = request_cost(request.endpoint)
+    if not ADMISSION_CONFIG["enabled"] or not cost:
+        return None
+    key = client_key(session.get("user_id"), request.remote_addr)
+    wait = _rate_limiter.take(key, cost)
+    if wait:
+        _limiter.rate_limited()
+        return jsonify({"error": RATE_LIMITED}), 429, retry_after(wait)
+    if not _limiter.acquire(ADMISSION_CONFIG["queue_timeout"], concurrency_share(cost)):
+        _rate_limiter.refund(key, cost)
+        return jsonify({"error": OVERLOADED}), 503, retry_after(ADMISSION_CONFIG["retry_after"])
+    g.admitted = True
+    return None
+
+
+def release_request(exc):
+    """
+    Flask teardown_request 钩子：归还名额
+    """
+    from flask import g
+
+    if g.pop("admitted", False):
+        _limiter.release()
+
+
+def init_admission(app):
+    """
+    为 Flask 应用启用准入控制
+    需在 init_metrics 之后调用，被拒绝的请求同样计入请求统计
+    配置了 trusted_proxies 时以 ProxyFix 包装应用，request.remote_addr 为代理转发的客户端地址
+    """
+    hops = ADMISSION_CONFIG["trusted_proxies"]
+    if hops:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+    install_limiter(ConcurrencyLimiter)
+    app.before_request(admit_request)
+    app.teardown_request(release_request)
@@ -0,0 +1,92 @@
+"""
+基于 asyncio 的服务模式（ASGI）
+/api/users、/api/tasks、/api/tags 的路由与同步版本一致，请求校验与 SQL 复用 app.routes，
+数据库访问使用 aiomysql 连接池，等待数据库时不占用线程，单个进程即可承载大量并发慢连接
+"""
+import time
+
+from quart import Quart, g, request
+from quart.json.provider import DefaultJSONProvider
+
+from ..config import apply_config, load_config, load_secret_key
+from ..encoding import install_json_provider
+from ..metrics import Gauge, http_in_flight, http_latency, http_requests, register
+from ..slowlog import init_slow_query_log
+from .admission import init_admission
+from .db import close_async_pool, get_async_pool_stats, get_async_replica_stats
+from .responses import compress_response
+from .routes import register_blueprints
+
+
+def _collect_async_pool():
+    stats = get_async_pool_stats()
+    return {(name,): stats[name] for name in ("in_use", "idle", "size", "timeouts", "wait_total_seconds")}
+
+
+def _collect_async_replicas():
+    return {
+        (replica, name): value
+        for replica, stats in get_async_replica_stats().items()
+        for name, value in stats.items()
+    }
+
+
+register(Gauge("youtime_db_async_pool", "异步数据库连接池状态", ("stat",), func=_collect_async_pool))
+register(
+    Gauge("youtime_db_async_replica", "异步读副本状态（up、in_use、failures）", ("replica", "stat"), func=_collect_async_replicas)
+)
+
+
+def _endpoint():
+    return request.url_rule.rule if request.url_rule else "<unmatched>"
+
+
+async def _before_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_in_flight = True
+    http_in_flight.inc()
+
+
+async def _after_request(response):
+    start = g.pop("metrics_start", None)
+    if start is not None:
+        endpoint = _endpoint()
+        http_latency.observe(time.perf_counter() - start, request.method, endpoint)
+        http_requests.inc(request.method, endpoint, str(response.status_code))
+    return response
+
+
+async def _teardown_request(exc):
+    if g.pop("metrics_in_flight", False):
+        http_in_flight.dec()
+
+
+def create_async_app(config=None):
+    """
+    创建异步应用实例，配置方式与 create_app 相同
+    会话密钥相同，两种服务模式签发的会话可以互通
+    """
+    from ..db import add_acquire_hook, add_query_hook
+    from ..metrics import _on_acquire, _on_query
+
+    config = config or load_config()
+    apply_config(config)
+
+    app = Quart(__name__)
+    app.secret_key = load_secret_key(config)
+    app.config["ADMIN_TOKEN"] = config.get("admin_token")
+    register_blueprints(app)
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    init_admission(app)
+    install_json_provider(app, DefaultJSONProvider)
+    app.after_request(compress_response)
+    add_acquire_hook(_on_acquire)
+    add_query_hook(_on_query)
+    init_slow_query_log()
+
+    # 连接池与事件循环绑定，在服务停止时关闭
+    app.after_serving(close_async_pool)
+    return app
@@ -0,0 +1,97 @@
+"""
+准入控制的异步版本，规则与配置同 app.admission
+"""
+import asyncio
+
+from quart import g, jsonify, request, session
+
+from ..admission import (
+    ADMISSION_CONFIG,
+    OVERLOADED,
+    RATE_LIMITED,
+    ConcurrencyLimiter,
+    client_key,
+    concurrency_share,
+    get_rate_limiter,
+    install_limiter,
+    request_cost,
+    retry_after,
+)
+
+
+class AsyncConcurrencyLimiter(ConcurrencyLimiter):
+    """
+    ConcurrencyLimiter 的协程版本，排队时不占用线程
+    """
+
+    def __init__(self, limit):
+        super().__init__(limit)
+        # 在事件循环中首次排队时创建
+        self._cond = None
+
+    async def acquire(self, timeout, share=1.0):
+        if self._has_room(share):
+            return self._enter()
+        if self.waiting >= ADMISSION_CONFIG["max_waiting"]:
+            return self._rejected()
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        self.waiting += 1
+        try:
+            async with self._cond:
+                await asyncio.wait_for(self._cond.wait_for(lambda: self._has_room(share)), timeout)
+                return self._enter()
+        except asyncio.TimeoutError:
+            return self._rejected()
+        finally:
+            self.waiting -= 1
+
+    async def release(self):
+        self.in_flight -= 1
+        if self._cond is not None and self.waiting:
+            async with self._cond:
+                self._cond.notify_all()
+
+
+_limiter = None
+
+
+async def admit_request():
+    """
+    admission.admit_request 的异步版本
+    """
+    cost = request_cost(request.endpoint)
+    if not ADMISSION_CONFIG["enabled"] or not cost:
+        return None
+    rate_limiter = get_rate_limiter()
+    key = client_key(session.get("user_id"), request.remote_addr)
+    wait = rate_limiter.take(key, cost)
+    if wait:
+        _limiter.rate_limited()
+        return jsonify({"error": RATE_LIMITED}), 429, retry_after(wait)
+    if not await _limiter.acquire(ADMISSION_CONFIG["queue_timeout"], concurrency_share(cost)):
+        rate_limiter.refund(key, cost)
+        return jsonify({"error": OVERLOADED}), 503, retry_after(ADMISSION_CONFIG["retry_after"])
+    g.admitted = True
+    return None
+
+
+async def release_request(exc):
+    if g.pop("admitted", False):
+        await _limiter.release()
+
+
+def init_admission(app):
+    """
+    为 Quart 应用启用准入控制，需在请求统计钩子之后注册
+    配置了 trusted_proxies 时以 hypercorn 的 ProxyFixMiddleware 包装应用，规则同 app.admission
+    """
+    global _limiter
+    hops = ADMISSION_CONFIG["trusted_proxies"]
+    if hops:
+        from hypercorn.middleware import ProxyFixMiddleware
+
+        app.asgi_app = ProxyFixMiddleware(app.asgi_app, mode="legacy", trusted_hops=hops)
+    _limiter = install_limiter(AsyncConcurrencyLimiter)
+    app.before_request(admit_request)
+    app.teardown_request(release_request)
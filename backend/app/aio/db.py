@@ -0,0 +1,431 @@
+import asyncio
+import time
+
+import aiomysql
+from pymysql import Error
+
+from ..db import (
+    INSERT_SHARD_USER,
+    LOOKUP_SHARD,
+    MAIN_SHARD,
+    PLACE_USER,
+    POOL_CONFIG,
+    READ,
+    REPLICA_STATUS,
+    WRITE,
+    ShardUnavailable,
+    _acquire_hooks,
+    _query_hooks,
+    _run_hooks,
+    build_replica_set,
+    cached_shard,
+    forget_shard,
+    placement_shard,
+    remember_shard,
+    replica_lag_ok,
+    shard_config,
+    shard_user_stub,
+    sharding_enabled,
+    use_primary_for,
+)
+
+
+class AsyncConnectionPool:
+    """
+    基于 aiomysql 的异步连接池
+    与同步连接池使用同一份 DB_CONFIG / SHARD_CONFIG / POOL_CONFIG；等待连接时不占用线程，
+    等待超过 timeout 视为连接失败
+    """
+
+    def __init__(self, config, size=10, timeout=5.0, recycle=3600, shard=MAIN_SHARD, **_):
+        self.config = config
+        self.shard = shard
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self._pool = None
+        self._lock = asyncio.Lock()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def _get(self):
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    self._pool = await aiomysql.create_pool(
+                        host=self.config.get("host", "localhost"),
+                        port=int(self.config.get("port", 3306)),
+                        user=self.config.get("user"),
+                        password=self.config.get("password", ""),
+                        db=self.config.get("database"),
+                        charset=self.config.get("charset", "utf8mb4"),
+                        minsize=0,
+                        maxsize=self.size,
+                        pool_recycle=self.recycle,
+                        autocommit=False,
+                        cursorclass=aiomysql.DictCursor,
+                    )
+        return self._pool
+
+    def _record_wait(self, waited):
+        self._wait_total += waited
+        if waited > self._wait_max:
+            self._wait_max = waited
+
+    async def acquire(self):
+        """
+        借出一个连接，超时或连接失败时返回 None
+        """
+        start = time.monotonic()
+        try:
+            pool = await self._get()
+            connection = await asyncio.wait_for(pool.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            self._record_wait(time.monotonic() - start)
+            return None
+        except Error as e:
+            print(f"数据库连接失败: {e}")
+            return None
+        self._checkouts += 1
+        self._record_wait(time.monotonic() - start)
+        return connection
+
+    async def release(self, connection, discard=False):
+        """
+        归还连接
+        未结束的事务先回滚（aiomysql 会直接关闭仍处于事务中的连接）；discard 为 True 时关闭该连接
+        """
+        if not discard and connection.get_transaction_status():
+            try:
+                await connection.rollback()
+            except Error:
+                discard = True
+        if discard:
+            self._discarded += 1
+            connection.close()
+        await self._pool.release(connection)
+
+    @property
+    def in_use(self):
+        pool = self._pool
+        return pool.size - pool.freesize if pool else 0
+
+    async def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+    def stats(self):
+        """
+        连接池统计信息
+        """
+        pool = self._pool
+        in_use = pool.size - pool.freesize if pool else 0
+        return {
+            "size": self.size,
+            "in_use": in_use,
+            "idle": pool.freesize if pool else 0,
+            "checkouts": self._checkouts,
+            "timeouts": self._timeouts,
+            "discarded": self._discarded,
+            "wait_total_seconds": round(self._wait_total, 6),
+            "wait_max_seconds": round(self._wait_max, 6),
+        }
+
+
+_pool = None
+_replicas = None
+_shard_pools = {}
+
+
+def get_async_pool(shard=MAIN_SHARD):
+    """
+    获取进程内共享的异步连接池，首次调用时按 POOL_CONFIG 创建，每个分片各有一个
+    需在事件循环中使用，连接池与创建它的事件循环绑定
+    """
+    global _pool
+    if shard != MAIN_SHARD:
+        pool = _shard_pools.get(shard)
+        if pool is None:
+            pool = _shard_pools[shard] = AsyncConnectionPool(shard_config(shard), shard=shard, **POOL_CONFIG)
+        return pool
+    if _pool is None:
+        _pool = AsyncConnectionPool(shard_config(MAIN_SHARD), **POOL_CONFIG)
+    return _pool
+
+
+def get_async_replica_set():
+    """
+    异步读副本集合，配置与选择策略同 db.get_replica_set，未配置副本时为 None
+    """
+    global _replicas
+    if _replicas is None:
+        _replicas = build_replica_set(lambda config: AsyncConnectionPool(config, **POOL_CONFIG))
+    return _replicas
+
+
+async def close_async_pool():
+    """
+    关闭并丢弃当前异步连接池（含读副本与各分片的连接池）
+    """
+    global _pool, _replicas, _shard_pools
+    pool, _pool = _pool, None
+    replicas, _replicas = _replicas, None
+    shard_pools, _shard_pools = _shard_pools, {}
+    if pool is not None:
+        await pool.close()
+    if replicas is not None:
+        for replica in replicas.replicas:
+            await replica.pool.close()
+    for shard_pool in shard_pools.values():
+        await shard_pool.close()
+
+
+def get_async_pool_stats():
+    return get_async_pool().stats()
+
+
+def get_async_replica_stats():
+    replicas = _replicas
+    return replicas.stats() if replicas is not None else {}
+
+
+class InstrumentedAsyncCursor:
+    """
+    异步游标包装
+    与同步的 InstrumentedCursor 一样记录每次 execute / executemany 的耗时并调用查询钩子
+    """
+
+    def __init__(self, cursor, shard=MAIN_SHARD):
+        self._cursor = cursor
+        self.shard = shard
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    async def execute(self, operation, params=None):
+        return await self._timed(self._cursor.execute, operation, params)
+
+    async def executemany(self, operation, seq_params):
+        return await self._timed(self._cursor.executemany, operation, seq_params)
+
+    async def _timed(self, method, operation, params):
+        start = time.perf_counter()
+        error = None
+        try:
+            return await method(operation, params)
+        except Error as e:
+            error = e
+            raise
+        finally:
+            _run_hooks(
+                _query_hooks,
+                operation,
+                params,
+                time.perf_counter() - start,
+                self._cursor.rowcount,
+                error,
+                self.shard,
+            )
+
+
+def _instrument(cursor, pool):
+    return InstrumentedAsyncCursor(cursor, pool.shard) if _query_hooks else cursor
+
+
+async def _lag_ok(connection):
+    try:
+        async with connection.cursor() as cursor:
+            await cursor.execute(REPLICA_STATUS)
+            return replica_lag_ok(await cursor.fetchone())
+    except Error as e:
+        print(f"检查复制延迟失败: {e}")
+        return False
+
+
+async def _acquire_replica(user_id):
+    """
+    db._acquire_replica 的异步版本，返回 (连接池, 连接)，应使用主库时返回 (None, None)
+    """
+    replicas = get_async_replica_set()
+    if replicas is None or use_primary_for(user_id):
+        return None, None
+    for replica in replicas.candidates():
+        connection = await replica.pool.acquire()
+        if connection is None:
+            replicas.mark_down(replica, "借出连接失败")
+            continue
+        if replicas.lag_check_due(replica) and not await _lag_ok(connection):
+            await replica.pool.release(connection)
+            replicas.mark_down(replica, "复制延迟过大")
+            continue
+        return replica.pool, connection
+    return None, None
+
+
+async def locate_user(user_id):
+    """
+    db.locate_user 的异步版本，与同步版本共用进程内的目录缓存
+    """
+    if not sharding_enabled():
+        return MAIN_SHARD, False
+    location = cached_shard(user_id)
+    if location is not None:
+        return location
+    async with AsyncDatabaseConnection() as (conn, cursor):
+        if not conn or not cursor:
+            raise ShardUnavailable(f"无法读取用户 {user_id} 的分片目录")
+        await cursor.execute(LOOKUP_SHARD, (user_id,))
+        row = await cursor.fetchone()
+    return remember_shard(user_id, row)
+
+
+async def place_user(user_id):
+    """
+    db.place_user 的异步版本
+    """
+    if not sharding_enabled():
+        return MAIN_SHARD
+    shard = placement_shard(user_id)
+    try:
+        async with AsyncDatabaseConnection(shard=shard) as (conn, cursor):
+            if not conn or not cursor:
+                return MAIN_SHARD
+            await cursor.execute(INSERT_SHARD_USER, shard_user_stub(user_id))
+            await conn.commit()
+        async with AsyncDatabaseConnection() as (conn, cursor):
+            if not conn or not cursor:
+                return MAIN_SHARD
+            await cursor.execute(PLACE_USER, (user_id, shard))
+            await conn.commit()
+    except Error as e:
+        print(f"为用户 {user_id} 分配分片失败: {e}")
+        return MAIN_SHARD
+    forget_shard(user_id)
+    return shard
+
+
+async def get_async_connection(intent=WRITE, user_id=None, shard=None):
+    """
+    借出一个连接，返回 (所属连接池, 连接)，连接需归还给该连接池
+    分片与读副本的选择规则同 db.get_db_connection；分片不可用时连接为 None
+    """
+    start = time.perf_counter() if _acquire_hooks else None
+    if shard is None and user_id is not None:
+        try:
+            shard, moving = await locate_user(user_id)
+        except ShardUnavailable as e:
+            print(e)
+            return None, None
+        if moving and intent == WRITE:
+            print(f"用户 {user_id} 正在迁移分片")
+            return None, None
+    shard = shard or MAIN_SHARD
+    pool, connection = await _acquire_replica(user_id) if intent == READ and shard == MAIN_SHARD else (None, None)
+    if connection is None:
+        pool = get_async_pool(shard)
+        connection = await pool.acquire()
+    if start is not None:
+        _run_hooks(_acquire_hooks, time.perf_counter() - start)
+    return pool, connection
+
+
+class AsyncDatabaseConnection:
+    """
+    异步数据库上下文管理器，用法与 DatabaseConnection 相同：
+
+        async with AsyncDatabaseConnection() as (conn, cursor):
+            await cursor.execute(...)
+
+    游标为字典游标，fetchone / fetchall 等同样需要 await
+    """
+
+    def __init__(self, intent=WRITE, user_id=None, shard=None):
+        self.intent = intent
+        self.user_id = user_id
+        self.shard = shard
+        self.pool = None
+        self.connection = None
+        self.cursor = None
+
+    async def __aenter__(self):
+        self.pool, self.connection = await get_async_connection(self.intent, self.user_id, self.shard)
+        if not self.connection:
+            print("无法获取数据库连接")
+            return None, None
+        self.cursor = _instrument(await self.connection.cursor(), self.pool)
+        return self.connection, self.cursor
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if not self.connection:
+            return
+        # 数据库异常后连接状态不可信，直接丢弃
+        discard = exc_type is not None and issubclass(exc_type, Error)
+        try:
+            await self.cursor.close()
+        except Error:
+            discard = True
+        await self.pool.release(self.connection, discard=discard)
+
+
+class AsyncRowStream:
+    """
+    基于非缓冲游标的异步分块结果迭代器，对应同步的 RowStream
+    结果读完或调用 close() 时归还连接；未读完就关闭时丢弃该连接
+    """
+
+    def __init__(self, pool, connection, cursor, chunk_size):
+        self.pool = pool
+        self.connection = connection
+        self.cursor = cursor
+        self.chunk_size = chunk_size
+        self._closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._closed:
+            raise StopAsyncIteration
+        try:
+            rows = await self.cursor.fetchmany(self.chunk_size)
+        except Error:
+            await self.close(discard=True)
+            raise
+        if not rows:
+            await self.close()
+            raise StopAsyncIteration
+        return rows
+
+    async def close(self, discard=False):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self.cursor.close()
+        except Error:
+            discard = True
+        await self.pool.release(self.connection, discard=discard)
+
+
+async def stream_query(query, params=None, chunk_size=500, intent=WRITE, user_id=None, shard=None):
+    """
+    以非缓冲字典游标执行查询，返回 AsyncRowStream
+    intent / user_id 同 AsyncDatabaseConnection；获取连接失败时返回 None
+    """
+    pool, connection = await get_async_connection(intent, user_id, shard)
+    if not connection:
+        return None
+    try:
+        cursor = _instrument(await connection.cursor(aiomysql.SSDictCursor), pool)
+        await cursor.execute(query, params)
+    except Error as e:
+        print(f"流式查询失败: {e}")
+        await pool.release(connection, discard=True)
+        return None
+    return AsyncRowStream(pool, connection, cursor, chunk_size)
@@ -0,0 +1,67 @@
+from quart import current_app, jsonify, request
+from quart.wrappers.response import DataBody
+
+from ..cache import make_etag, versions_shared
+from ..conditional import request_shape, set_etag_headers
+from ..db import WRITE
+from ..encoding import choose_encoding, compress, compression_candidate, mark_encoded
+from ..streaming import STREAM_CHUNK_SIZE, STREAM_FORMATS, RowEncoder
+from .db import stream_query
+
+
+def check_not_modified(user_id, *namespaces):
+    """
+    与 conditional.check_not_modified 相同，ETag 在两种服务模式之间一致
+    """
+    etag = make_etag(user_id, namespaces, request_shape(request))
+    if versions_shared() and request.if_none_match.contains_weak(etag):
+        response = current_app.response_class("", status=304)
+        set_etag_headers(response, etag)
+        return etag, response
+    return etag, None
+
+
+def json_with_etag(result, status, etag):
+    """
+    序列化结果，成功时附带 ETag
+    """
+    response = jsonify(result)
+    if status == 200:
+        set_etag_headers(response, etag)
+    return response, status
+
+
+async def stream_rows(query, params, fmt, transform=None, intent=WRITE, user_id=None):
+    """
+    streaming.stream_rows 的异步版本，输出格式相同
+    获取连接失败时返回 None
+    """
+    rows = await stream_query(query, params, STREAM_CHUNK_SIZE, intent, user_id)
+    if rows is None:
+        return None
+    encoder = RowEncoder(fmt, current_app.json.dumps, transform)
+
+    async def generate():
+        # 客户端断开时生成器被关闭，finally 中归还连接
+        try:
+            async for chunk in rows:
+                yield encoder.chunk(chunk)
+            yield encoder.end()
+        finally:
+            await rows.close(discard=not rows._closed)
+
+    return current_app.response_class(generate(), mimetype=STREAM_FORMATS[fmt])
+
+
+async def compress_response(response):
+    """
+    encoding.compress_response 的异步版本，只压缩已完整生成的响应体
+    """
+    if not compression_candidate(response) or not isinstance(response.response, DataBody):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = await response.get_data()
+    encoding = choose_encoding(request.accept_encodings, len(data))
+    if encoding:
+        mark_encoded(response, encoding, compress(data, encoding))
+    return response
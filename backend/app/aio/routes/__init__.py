@@ -0,0 +1,27 @@
+from quart import Blueprint
+
+from ...metrics import render_metrics
+from .bulk import bulk_bp
+from .events import event_bp
+from .tags import tag_bp
+from .tasks import task_bp
+from .users import user_bp
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+async def metrics():
+    return render_metrics(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+def register_blueprints(app):
+    """
+    注册异步蓝图，路由与同步版本一致
+    """
+    app.register_blueprint(user_bp)
+    app.register_blueprint(task_bp)
+    app.register_blueprint(bulk_bp)
+    app.register_blueprint(tag_bp)
+    app.register_blueprint(event_bp)
+    app.register_blueprint(metrics_bp)
@@ -0,0 +1,117 @@
+"""
+/api/tasks/import 的异步实现
+请求体先写入临时文件（超过 SPOOL_MEMORY_SIZE 落盘），再按与同步版本相同的规则逐条解析，
+校验、SQL 与报告全部复用 app.bulk，写入以异步驱动执行
+"""
+import tempfile
+
+from pymysql import Error
+from quart import Blueprint, jsonify, request, session
+
+from ...bulk import (
+    IMPORT_BATCH_SIZE,
+    ImportReport,
+    _batch_tasks,
+    assign_tags_query,
+    import_stats_deltas,
+    insert_tags_query,
+    iter_import_records,
+    iter_lines,
+    missing_tag_names,
+    remember_tag_ids,
+    tag_ids_query,
+)
+from ...routes.bulk import _import_format, _on_import_commit
+from ...routes.tasks import AUTO_INCREMENT_STEP, _insert_tasks_query, _inserted_ids
+from ...stats import stats_delta_query
+from ..db import AsyncDatabaseConnection
+
+bulk_bp = Blueprint("bulk", __name__, url_prefix="/api/tasks")
+
+# 请求体在内存中保留的最大字节数，超出部分写入磁盘
+SPOOL_MEMORY_SIZE = 1024 * 1024
+
+
+async def _spool_body():
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_SIZE)
+    async for chunk in request.body:
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+async def _import_tasks(user_id, lines, fmt, on_commit, batch_size=IMPORT_BATCH_SIZE):
+    """
+    app.bulk.import_tasks 的异步版本，分批、重试与报告规则相同
+    """
+    report = ImportReport()
+    tag_ids = {}
+    step = None
+
+    async def flush(cursor, batch):
+        nonlocal step
+        await cursor.execute(*_insert_tasks_query(user_id, [row for _, row, _ in batch]))
+        first_id = cursor.lastrowid
+        if step is None:
+            await cursor.execute(AUTO_INCREMENT_STEP)
+            step = (await cursor.fetchone())["step"]
+        task_ids = _inserted_ids(first_id, len(batch), step)
+        names = missing_tag_names(batch, tag_ids)
+        if names:
+            await cursor.execute(*insert_tags_query(user_id, names))
+            await cursor.execute(*tag_ids_query(user_id, names))
+            remember_tag_ids(tag_ids, await cursor.fetchall())
+        assign, unassigned = assign_tags_query(batch, task_ids, tag_ids)
+        if assign:
+            await cursor.execute(*assign)
+        await cursor.execute(*stats_delta_query(user_id, import_stats_deltas(batch)))
+        return task_ids, unassigned
+
+    async def commit(conn, cursor, batch):
+        try:
+            task_ids, unassigned = await flush(cursor, batch)
+            await conn.commit()
+        except Error as e:
+            await conn.rollback()
+            tag_ids.clear()
+            if len(batch) == 1:
+                report.error(batch[0][0], f"写入失败: {e}")
+                return
+            for item in batch:
+                await commit(conn, cursor, [item])
+            return
+        report.committed(batch, unassigned)
+        on_commit(_batch_tasks(batch, task_ids))
+
+    async with AsyncDatabaseConnection(user_id=user_id) as (conn, cursor):
+        if not conn or not cursor:
+            return None
+        batch = []
+        for line_no, row, tag_names, error in iter_import_records(lines, fmt):
+            if error:
+                report.error(line_no, error)
+                continue
+            batch.append((line_no, row, tag_names))
+            if len(batch) >= batch_size:
+                await commit(conn, cursor, batch)
+                batch = []
+        if batch:
+            await commit(conn, cursor, batch)
+    return report
+
+
+@bulk_bp.route("/import", methods=["POST"])
+async def import_tasks_route():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    fmt = _import_format(request)
+    if not fmt:
+        return jsonify({"error": "无效的导入格式"}), 400
+
+    with await _spool_body() as body:
+        report = await _import_tasks(user_id, iter_lines(body), fmt, _on_import_commit(user_id))
+    if report is None:
+        return jsonify({"error": "数据库连接失败"}), 500
+    return jsonify(report.to_dict()), 200
@@ -0,0 +1,98 @@
+"""
+/api/events 的异步实现，接口与 app.routes.events 相同
+每个连接只是一个等待队列的协程，单个进程可以承载大量空闲的长连接
+"""
+import asyncio
+
+from quart import Blueprint, current_app, jsonify, request, session
+
+from ...events import (
+    EVENT_CONFIG,
+    SSE_HEADERS,
+    SSE_HEARTBEAT,
+    get_hub,
+    parse_since,
+    poll_result,
+    poll_timeout,
+    sse_message,
+    sse_preamble,
+)
+from ...routes.events import _too_many
+
+event_bp = Blueprint("events", __name__, url_prefix="/api/events")
+
+
+def _subscribe(hub, user_id):
+    """
+    订阅用户的事件，返回 (订阅, 队列)；事件可能由其他线程（Redis 监听线程、提醒调度线程）投递，
+    经 call_soon_threadsafe 交给事件循环
+    """
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    subscription = hub.subscribe(user_id, lambda event: loop.call_soon_threadsafe(events.put_nowait, event))
+    return subscription, events
+
+
+@event_bp.route("/", methods=["GET"])
+async def stream_events():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+    last_id, _ = parse_since(request.headers.get("Last-Event-ID"))
+    hub = get_hub()
+    subscription, events = _subscribe(hub, user_id)
+    if subscription is None:
+        return _too_many()
+    missed = hub.events_since(user_id, last_id) if last_id is not None else []
+    replayed = {event["at"] for event in missed}
+
+    async def generate():
+        # 客户端断开时生成器被关闭，finally 中取消订阅
+        try:
+            yield sse_preamble()
+            for event in missed:
+                yield sse_message(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), EVENT_CONFIG["heartbeat"])
+                except asyncio.TimeoutError:
+                    yield SSE_HEARTBEAT
+                    continue
+                if event["at"] not in replayed:
+                    yield sse_message(event)
+        finally:
+            hub.unsubscribe(subscription)
+
+    response = current_app.response_class(generate(), mimetype="text/event-stream", headers=SSE_HEADERS)
+    # 长连接不受 RESPONSE_TIMEOUT 限制
+    response.timeout = None
+    return response
+
+
+@event_bp.route("/poll", methods=["GET"])
+async def poll_events():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+    since, error = parse_since(request.args.get("since"))
+    if error:
+        return jsonify({"error": error}), 400
+    if since is None:
+        return jsonify(poll_result([], None)), 200
+
+    hub = get_hub()
+    events = hub.events_since(user_id, since)
+    if not events:
+        subscription, arrived = _subscribe(hub, user_id)
+        if subscription is None:
+            return _too_many()
+        try:
+            events = hub.events_since(user_id, since)
+            if not events:
+                try:
+                    events = [await asyncio.wait_for(arrived.get(), poll_timeout(request.args))]
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            hub.unsubscribe(subscription)
+    return jsonify(poll_result(events, since)), 200
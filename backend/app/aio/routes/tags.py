@@ -0,0 +1,234 @@
+"""
+/api/tags 的异步实现
+请求校验与 SQL 全部复用 app.routes.tags，这里只负责以异步驱动执行
+"""
+from quart import Blueprint, jsonify, request, session
+
+from ...cache import invalidate, read_through_async
+from ...conditional import set_etag_headers
+from ...db import READ
+from ...routes.tags import (
+    ASSIGN_TAG,
+    INSERT_TAG,
+    LIST_TAGS,
+    LIST_TAGS_WITH_COUNTS,
+    PURGE_TAG,
+    REMOVE_TASK_TAG,
+    RENAME_TAG,
+    SOFT_DELETE_TAG,
+    TAG_OWNED,
+    TASK_OWNED,
+    TASKS_OF_TAG,
+    TOUCH_TASK,
+    TOUCH_TASKS_OF_TAG,
+    _assign_args,
+    _owned_tags_query,
+    _remove_args,
+    _tag_name,
+)
+from ...streaming import parse_stream_format
+from ..db import AsyncDatabaseConnection
+from ..responses import check_not_modified, json_with_etag, stream_rows
+
+tag_bp = Blueprint("tags", __name__, url_prefix="/api/tags")
+
+
+async def _fetch_tags(user_id, with_counts=False):
+    """
+    与同步版本的 _fetch_tags 相同，缓存键也相同
+    """
+    namespace = ("tags", "tasks") if with_counts else "tags"
+    query = LIST_TAGS_WITH_COUNTS if with_counts else LIST_TAGS
+
+    async def load():
+        async with AsyncDatabaseConnection(READ, user_id) as (conn, cursor):
+            if not conn or not cursor:
+                return {"error": "数据库连接失败"}, 500
+            await cursor.execute(query, (user_id,))
+            return await cursor.fetchall(), 200
+
+    return await read_through_async(namespace, user_id, [query], load)
+
+
+@tag_bp.route("/", methods=["GET"])
+async def get_tags():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    include = request.args.get("include")
+    if include not in (None, "counts"):
+        return jsonify({"error": "无效的 include 参数"}), 400
+    with_counts = include == "counts"
+
+    etag, not_modified = check_not_modified(user_id, "tags", *(["tasks"] if with_counts else []))
+    if not_modified:
+        return not_modified
+
+    result, status = await _fetch_tags(user_id, with_counts)
+    return json_with_etag(result, status, etag)
+
+
+@tag_bp.route("/", methods=["POST"])
+async def create_tag():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    name = _tag_name(await request.get_json())
+    if not name:
+        return jsonify({"error": "缺少必要字段"}), 400
+
+    async with AsyncDatabaseConnection(user_id=user_id) as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        await cursor.execute(INSERT_TAG, (user_id, name))
+        await conn.commit()
+    invalidate(user_id, "tags")
+    return jsonify({"message": "标签创建成功"}), 201
+
+
+@tag_bp.route("/<int:tag_id>", methods=["PUT"])
+async def update_tag(tag_id):
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    name = _tag_name(await request.get_json())
+    if not name:
+        return jsonify({"error": "缺少必要字段"}), 400
+
+    async with AsyncDatabaseConnection(user_id=user_id) as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        await cursor.execute(RENAME_TAG, (name, tag_id, user_id))
+        if cursor.rowcount == 0:
+            return jsonify({"error": "标签未找到或无权限"}), 404
+        await cursor.execute(TOUCH_TASKS_OF_TAG, (tag_id, user_id))
+        await conn.commit()
+    # 任务列表可以附带标签名（include=tags），改名后一并失效
+    invalidate(user_id, "tags", "tasks")
+    return jsonify({"message": "标签更新成功"}), 200
+
+
+@tag_bp.route("/<int:tag_id>", methods=["DELETE"])
+async def delete_tag(tag_id):
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    async with AsyncDatabaseConnection(user_id=user_id) as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        await cursor.execute(SOFT_DELETE_TAG, (tag_id, user_id))
+        if cursor.rowcount == 0:
+            return jsonify({"error": "标签未找到或无权限"}), 404
+        await cursor.execute(TOUCH_TASKS_OF_TAG, (tag_id, user_id))
+        await conn.commit()
+    invalidate(user_id, "tags", "tasks")
+    return jsonify({"message": "标签删除成功"}), 200
+
+
+@tag_bp.route("/<int:tag_id>/purge", methods=["DELETE"])
+async def purge_tag(tag_id):
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    async with AsyncDatabaseConnection(user_id=user_id) as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        await cursor.execute(TOUCH_TASKS_OF_TAG, (tag_id, user_id))
+        await cursor.execute(PURGE_TAG, (tag_id, user_id))
+        if cursor.rowcount == 0:
+            return jsonify({"error": "标签未找到或无权限"}), 404
+        await conn.commit()
+    invalidate(user_id, "tags", "tasks")
+    return jsonify({"message": "标签永久删除成功"}), 200
+
+
+@tag_bp.route("/<int:tag_id>/tasks", methods=["GET"])
+async def get_tasks_by_tag(tag_id):
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    fmt, error = parse_stream_format(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    etag, not_modified = check_not_modified(user_id, "tasks", "tags")
+    if not_modified:
+        return not_modified
+
+    async with AsyncDatabaseConnection(READ, user_id) as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        await cursor.execute(TAG_OWNED, (tag_id, user_id))
+        if not await cursor.fetchone():
+            return jsonify({"error": "标签未找到或无权限"}), 404
+        if not fmt:
+            await cursor.execute(TASKS_OF_TAG, (tag_id, user_id))
+            tasks = await cursor.fetchall()
+
+    if fmt:
+        response = await stream_rows(TASKS_OF_TAG, (tag_id, user_id), fmt, intent=READ, user_id=user_id)
+        if response is None:
+            return jsonify({"error": "数据库连接失败"}), 500
+        set_etag_headers(response, etag)
+        return response
+    return json_with_etag(tasks, 200, etag)
+
+
+@tag_bp.route("/assign", methods=["POST"])
+async def assign_tags_to_task():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    task_id, tag_ids = _assign_args(await request.get_json())
+    if not task_id or not tag_ids or not isinstance(tag_ids, list):
+        return jsonify({"error": "缺少参数"}), 400
+
+    async with AsyncDatabaseConnection(user_id=user_id) as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+
+        await cursor.execute(TASK_OWNED, (task_id, user_id))
+        if not await cursor.fetchone():
+            return jsonify({"error": "任务未找到或无权限"}), 404
+
+        await cursor.execute(*_owned_tags_query(user_id, tag_ids))
+        valid_tag_ids = {row["id"] for row in await cursor.fetchall()}
+        if len(valid_tag_ids) != len(tag_ids):
+            return jsonify({"error": "存在无效或无权限的标签"}), 400
+
+        await cursor.executemany(ASSIGN_TAG, [(task_id, tag_id) for tag_id in valid_tag_ids])
+        await cursor.execute(TOUCH_TASK, (task_id,))
+        await conn.commit()
+    invalidate(user_id, "tasks", "tags")
+
+    return jsonify({"message": "标签关联成功"}), 200
+
+
+@tag_bp.route("/remove", methods=["POST"])
+async def remove_tag_from_task():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    task_id, tag_id = _remove_args(await request.get_json())
+    if not task_id or not tag_id:
+        return jsonify({"error": "缺少参数"}), 400
+
+    async with AsyncDatabaseConnection(user_id=user_id) as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        await cursor.execute(REMOVE_TASK_TAG, (task_id, tag_id, user_id))
+        if cursor.rowcount == 0:
+            return jsonify({"error": "关联未找到或无权限"}), 404
+        await cursor.execute(TOUCH_TASK, (task_id,))
+        await conn.commit()
+    invalidate(user_id, "tasks", "tags")
+
+    return jsonify({"message": "标签移除成功"}), 200
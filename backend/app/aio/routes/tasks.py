@@ -0,0 +1,397 @@
+"""
+/api/tasks 的异步实现
+请求校验与 SQL 全部复用 app.routes.tasks，这里只负责以异步驱动执行
+"""
+from datetime import datetime
+
+from quart import Blueprint, jsonify, request, session
+
+from ...cache import invalidate, read_through_async
+from ...conditional import set_etag_headers
+from ...db import READ
+from ...events import parse_since
+from ...reminders import CLOSED_STATUSES, pending_reminders, schedule_task
+from ...routes.tasks import (
+    AUTO_INCREMENT_STEP,
+    DUE_BUCKETS,
+    DUE_SUMMARY,
+    INSERT_TASK,
+    LOCK_TASK_LEVELS,
+    PURGE_TASK,
+    SELECT_NOW,
+    SOFT_DELETE_TASK,
+    TASK_LEVELS,
+    _batch_stats_deltas,
+    _build_task_query,
+    _changes_levels,
+    _changes_query,
+    _changes_result,
+    _decode_tags,
+    _delete_stats_deltas,
+    _due_summary_params,
+    _insert_tasks_query,
+    _lock_tasks_query,
+    _merge_tags,
+    _paginate,
+    _parse_batch_ids,
+    _parse_batch_operations,
+    _parse_changes_args,
+    _parse_list_args,
+    _plan_batch_writes,
+    _record_creates,
+    _reschedule,
+    _schedule_batch,
+    _search_filters,
+    _soft_delete_tasks_query,
+    _stats_now,
+    _sync_token_expired,
+    _task_fields_for_update,
+    _task_row_for_create,
+    _task_tags_query,
+    _tasks_by_ids_query,
+    _update_statement,
+    _update_stats_deltas,
+)
+from ...stats import (
+    COUNT_OVERDUE,
+    COUNT_TASKS,
+    LOCK_STATS,
+    READ_STATS,
+    reconcile_deltas,
+    stat_key,
+    stats_delta_query,
+    summarize,
+)
+from ..db import AsyncDatabaseConnection
+from ..responses import check_not_modified, json_with_etag, stream_rows
+
+task_bp = Blueprint("tasks", __name__, url_prefix="/api/tasks")
+
+
+async def _attach_tags(cursor, user_id, tasks):
+    if not tasks:
+        return tasks
+    await cursor.execute(*_task_tags_query(user_id, tasks))
+    return _merge_tags(tasks, await cursor.fetchall())
+
+
+async def _apply_stats_deltas(cursor, user_id, deltas):
+    query = stats_delta_query(user_id, deltas)
+    if query:
+        await cursor.execute(*query)
+
+
+async def _fetch_tasks(
+    user_id, extra_filters=None, extra_values=None, page=None, rank=None, include_tags=False, fields=None
+):
+    """
+    与同步版本的 _fetch_tasks 相同，缓存键也相同
+    """
+    query, params, limit = _build_task_query(user_id, extra_filters, extra_values, page, rank, fields=fields)
+
+    async def load():
+        async with AsyncDatabaseConnection(READ, user_id) as (conn, cursor):
+            if not conn or not cursor:
+                return {"error": "数据库连接失败"}, 500
+            await cursor.execute(query, params)
+            tasks = await cursor.fetchall()
+            if include_tags:
+                tasks = await _attach_tags(cursor, user_id, tasks)
+            return tasks, 200
+
+    namespace = ("tasks", "tags") if include_tags else "tasks"
+    tasks, status = await read_through_async(namespace, user_id, [query, params, include_tags], load)
+    if status != 200:
+        return tasks, status
+    return _paginate(tasks, page, limit), 200
+
+
+async def _stream_tasks(
+    fmt, etag, user_id, extra_filters=None, extra_values=None, page=None, rank=None, include_tags=False, fields=None
+):
+    if page:
+        page = dict(page, limit=None)
+    query, params, _ = _build_task_query(user_id, extra_filters, extra_values, page, rank, include_tags, fields)
+    response = await stream_rows(query, params, fmt, _decode_tags if include_tags else None, READ, user_id)
+    if response is None:
+        return jsonify({"error": "数据库连接失败"}), 500
+    set_etag_headers(response, etag)
+    return response
+
+
+@task_bp.route("/", methods=["GET"])
+async def get_tasks():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    page, fmt, include_tags, fields, error = _parse_list_args(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    etag, not_modified = check_not_modified(user_id, "tasks", *(["tags"] if include_tags else []))
+    if not_modified:
+        return not_modified
+    if fmt:
+        return await _stream_tasks(fmt, etag, user_id, page=page, include_tags=include_tags, fields=fields)
+
+    result, status = await _fetch_tasks(user_id, page=page, include_tags=include_tags, fields=fields)
+    return json_with_etag(result, status, etag)
+
+
+@task_bp.route("/", methods=["POST"])
+async def create_task():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    row, error = _task_row_for_create(await request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+
+    async with AsyncDatabaseConnection(user_id=user_id) as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        await cursor.execute(INSERT_TASK, (user_id,) + row)
+        task_id = cursor.lastrowid
+        await _apply_stats_deltas(cursor, user_id, {stat_key(row[2], row[3]): 1})
+        await conn.commit()
+    invalidate(user_id, "tasks")
+    schedule_task(task_id, user_id, row[4])
+    return jsonify({"message": "任务创建成功", "task_id": task_id}), 201
+
+
+@task_bp.route("/<int:task_id>", methods=["PUT"])
+async def update_task(task_id):
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    fields, values, error = _task_fields_for_update(await request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+
+    async with AsyncDatabaseConnection(user_id=user_id) as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        old = None
+        if _changes_levels(fields):
+            await cursor.execute(LOCK_TASK_LEVELS, (task_id, user_id))
+            old = await cursor.fetchone()
+            if not old:
+                return jsonify({"error": "任务未找到或未更新"}), 404
+        await cursor.execute(_update_statement(tuple(fields)), tuple(values + [task_id, user_id]))
+        if cursor.rowcount == 0:
+            return jsonify({"error": "任务未找到或未更新"}), 404
+        if old:
+            await _apply_stats_deltas(cursor, user_id, _update_stats_deltas(old, fields, values))
+        await conn.commit()
+    invalidate(user_id, "tasks")
+    _reschedule(user_id, task_id, fields, values)
+    return jsonify({"message": "任务更新成功"}), 200
+
+
+@task_bp.route("/<int:task_id>", methods=["DELETE"])
+async def delete_task(task_id):
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    async with AsyncDatabaseConnection(user_id=user_id) as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        await cursor.execute(SOFT_DELETE_TASK, (task_id, user_id))
+        if cursor.rowcount == 0:
+            return jsonify({"error": "任务未找到或已删除"}), 404
+        await cursor.execute(TASK_LEVELS, (task_id,))
+        await _apply_stats_deltas(cursor, user_id, _delete_stats_deltas(await cursor.fetchone()))
+        await conn.commit()
+    invalidate(user_id, "tasks")
+    return jsonify({"message": "任务删除成功"}), 200
+
+
+@task_bp.route("/<int:task_id>/purge", methods=["DELETE"])
+async def purge_task(task_id):
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    async with AsyncDatabaseConnection(user_id=user_id) as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        await cursor.execute(PURGE_TASK, (task_id, user_id))
+        await conn.commit()
+        if cursor.rowcount == 0:
+            return jsonify({"error": "任务未找到或未软删除"}), 404
+    invalidate(user_id, "tasks")
+    return jsonify({"message": "任务已彻底删除"}), 200
+
+
+@task_bp.route("/changes", methods=["GET"])
+async def get_task_changes():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    since, limit, error = _parse_changes_args(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    async with AsyncDatabaseConnection(user_id=user_id) as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        await cursor.execute(SELECT_NOW)
+        now = (await cursor.fetchone())["now"]
+        if _sync_token_expired(since, now):
+            return jsonify({"error": "同步令牌已过期，请重新全量同步"}), 410
+
+        await cursor.execute(*_changes_query(user_id, since, limit))
+        rows = await cursor.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        live = await _attach_tags(cursor, user_id, [row for row in rows if not row["is_deleted"]])
+
+    return jsonify(_changes_result(rows, live, since, now, has_more)), 200
+
+
+@task_bp.route("/search", methods=["GET"])
+async def search_tasks():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    filters, values, rank, error = _search_filters(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    page, fmt, include_tags, fields, error = _parse_list_args(request.args, searching=rank is not None)
+    if error:
+        return jsonify({"error": error}), 400
+    if fmt:
+        etag, _ = check_not_modified(user_id, "tasks", *(["tags"] if include_tags else []))
+        return await _stream_tasks(fmt, etag, user_id, filters, values, page, rank, include_tags, fields)
+
+    result, status_code = await _fetch_tasks(user_id, filters, values, page, rank, include_tags, fields)
+    return jsonify(result), status_code
+
+
+@task_bp.route("/due/summary", methods=["GET"])
+async def get_due_summary():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    params = _due_summary_params(user_id, datetime.now())
+
+    async def load():
+        async with AsyncDatabaseConnection(READ, user_id) as (conn, cursor):
+            if not conn or not cursor:
+                return {"error": "数据库连接失败"}, 500
+            await cursor.execute(DUE_SUMMARY, params)
+            row = await cursor.fetchone()
+            return {bucket: int(row[bucket]) for bucket in DUE_BUCKETS}, 200
+
+    result, status = await read_through_async("tasks", user_id, [DUE_SUMMARY, params], load)
+    return jsonify(result), status
+
+
+@task_bp.route("/stats", methods=["GET"])
+async def get_task_stats():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    now = _stats_now()
+
+    async def load():
+        async with AsyncDatabaseConnection(user_id=user_id) as (conn, cursor):
+            if not conn or not cursor:
+                return {"error": "数据库连接失败"}, 500
+            await cursor.execute(READ_STATS, (user_id,))
+            rows = await cursor.fetchall()
+            if not rows:
+                # 与同步版本相同：先对账一次（见 app.stats.reconcile_user）
+                await cursor.execute(LOCK_STATS, (user_id,))
+                stored = await cursor.fetchall()
+                await cursor.execute(COUNT_TASKS, (user_id,))
+                await _apply_stats_deltas(cursor, user_id, reconcile_deltas(stored, await cursor.fetchall()))
+                await conn.commit()
+                await cursor.execute(READ_STATS, (user_id,))
+                rows = await cursor.fetchall()
+            await cursor.execute(COUNT_OVERDUE, (user_id, now, *CLOSED_STATUSES))
+            return summarize(rows, (await cursor.fetchone())["overdue"]), 200
+
+    result, status = await read_through_async("tasks", user_id, [READ_STATS, now], load)
+    return jsonify(result), status
+
+
+@task_bp.route("/reminders", methods=["GET"])
+async def get_reminders():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+    since, error = parse_since(request.args.get("since"))
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify(pending_reminders(user_id, since)), 200
+
+
+@task_bp.route("/batch", methods=["GET"])
+async def get_tasks_batch():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    ids, error = _parse_batch_ids(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    async with AsyncDatabaseConnection(user_id=user_id) as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        await cursor.execute(*_tasks_by_ids_query(user_id, ids))
+        tasks = await cursor.fetchall()
+    found = {task["id"] for task in tasks}
+    return jsonify({"tasks": tasks, "missing": [i for i in ids if i not in found]}), 200
+
+
+async def _apply_batch(cursor, user_id, creates, updates, deletes, results):
+    if creates:
+        await cursor.execute(*_insert_tasks_query(user_id, [row for _, row in creates]))
+        first_id = cursor.lastrowid
+        await cursor.execute(AUTO_INCREMENT_STEP)
+        _record_creates(creates, first_id, (await cursor.fetchone())["step"], results)
+
+    existing = {}
+    lock = _lock_tasks_query(user_id, updates, deletes)
+    if lock:
+        await cursor.execute(*lock)
+        existing = {row["id"]: row for row in await cursor.fetchall()}
+
+    groups, delete_ids = _plan_batch_writes(user_id, updates, deletes, existing, results)
+    for fields, params in groups.items():
+        await cursor.executemany(_update_statement(fields), params)
+    if delete_ids:
+        await cursor.execute(*_soft_delete_tasks_query(user_id, delete_ids))
+    await _apply_stats_deltas(cursor, user_id, _batch_stats_deltas(creates, updates, delete_ids, existing, results))
+
+
+@task_bp.route("/batch", methods=["POST"])
+async def batch_tasks():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    results, creates, updates, deletes, error = _parse_batch_operations(await request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+
+    if creates or updates or deletes:
+        async with AsyncDatabaseConnection(user_id=user_id) as (conn, cursor):
+            if not conn or not cursor:
+                return jsonify({"error": "数据库连接失败"}), 500
+            await _apply_batch(cursor, user_id, creates, updates, deletes, results)
+            await conn.commit()
+        invalidate(user_id, "tasks")
+        _schedule_batch(user_id, creates, updates, results)
+
+    return jsonify({"results": results}), 200
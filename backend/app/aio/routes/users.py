@@ -0,0 +1,129 @@
+"""
+/api/users 的异步实现
+SQL 复用 app.routes.users；密码哈希仍在哈希进程池中计算，等待结果时不阻塞事件循环
+"""
+import asyncio
+
+from quart import Blueprint, jsonify, request, session
+
+from ...cache import invalidate
+from ...hashing import HashPoolBusy, hash_password, needs_rehash, rehash_in_background, verify_password
+from ...jobs import INSERT_JOB, notify_job_runner
+from ...routes.users import (
+    DEACTIVATE_USER,
+    INSERT_USER,
+    LIST_USERS,
+    SELECT_LOGIN_USER,
+    UPDATE_PASSWORD_HASH,
+    _credentials,
+    _new_user_fields,
+)
+from ..db import AsyncDatabaseConnection, place_user
+
+user_bp = Blueprint("users", __name__, url_prefix="/api/users")
+
+
+def _busy():
+    return jsonify({"error": "服务繁忙，请稍后重试"}), 429, {"Retry-After": "1"}
+
+
+async def _store_rehash(user_id, password_hash):
+    async with AsyncDatabaseConnection() as (conn, cursor):
+        if not conn or not cursor:
+            return
+        await cursor.execute(UPDATE_PASSWORD_HASH, (password_hash, user_id))
+        await conn.commit()
+
+
+@user_bp.route("/", methods=["GET"])
+async def get_users():
+    async with AsyncDatabaseConnection() as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        await cursor.execute(LIST_USERS)
+        users = await cursor.fetchall()
+    return jsonify(users), 200
+
+
+@user_bp.route("/", methods=["POST"])
+async def create_user():
+    username, email, password = _new_user_fields(await request.get_json())
+    if not username or not email or not password:
+        return jsonify({"error": "缺少必要字段"}), 400
+
+    try:
+        password_hash = await asyncio.to_thread(hash_password, password)
+    except HashPoolBusy:
+        return _busy()
+
+    async with AsyncDatabaseConnection() as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        await cursor.execute(INSERT_USER, (username, email, password_hash))
+        user_id = cursor.lastrowid
+        await conn.commit()
+    await place_user(user_id)
+    return jsonify({"message": "用户创建成功"}), 201
+
+
+@user_bp.route("/login", methods=["POST"])
+async def login():
+    username, password = _credentials(await request.get_json())
+    if not username or not password:
+        return jsonify({"error": "缺少用户名或密码"}), 400
+    async with AsyncDatabaseConnection() as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        await cursor.execute(SELECT_LOGIN_USER, (username,))
+        row = await cursor.fetchone()
+    if not row:
+        return jsonify({"error": "无效的用户名或密码"}), 401
+    try:
+        valid = await asyncio.to_thread(verify_password, row["password_hash"], password)
+    except HashPoolBusy:
+        return _busy()
+    if not valid:
+        return jsonify({"error": "无效的用户名或密码"}), 401
+    if needs_rehash(row["password_hash"]):
+        user_id = row["id"]
+        loop = asyncio.get_running_loop()
+        # 回调在哈希模块的写库线程中执行，交回事件循环写库
+        rehash_in_background(
+            password,
+            lambda new_hash: asyncio.run_coroutine_threadsafe(_store_rehash(user_id, new_hash), loop),
+        )
+    session["user_id"] = row["id"]
+    return jsonify({"message": "登录成功", "user": {"id": row["id"], "username": row["username"]}}), 200
+
+
+@user_bp.route("/logout", methods=["POST"])
+async def logout():
+    session.pop("user_id", None)
+    return jsonify({"message": "退出登录成功"}), 200
+
+
+@user_bp.route("/delete", methods=["POST"])
+async def delete_user():
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    async with AsyncDatabaseConnection() as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        await cursor.execute(DEACTIVATE_USER, (user_id,))
+        if cursor.rowcount == 0:
+            session.pop("user_id", None)
+            return jsonify({"error": "用户不存在或已删除"}), 404
+        await cursor.execute(INSERT_JOB, ("delete_user", user_id))
+        job_id = cursor.lastrowid
+        await conn.commit()
+    notify_job_runner()
+    invalidate(user_id, "tasks", "tags")
+    session.pop("user_id", None)
+    return jsonify({"message": "用户删除已提交", "job_id": job_id}), 202
+
+
+@user_bp.route("/ping", methods=["GET"])
+async def ping():
+    return jsonify({"message": "pong!"})
@@ -0,0 +1,335 @@
+"""
+任务批量导入与导出
+导入逐行解析 NDJSON 或 CSV，每条记录按与 POST /api/tasks/ 相同的规则校验，
+每 IMPORT_BATCH_SIZE 条合并为一条多行 INSERT，标签按名称关联（不存在的标签会被创建），
+每批在一个事务中写入任务、task_tags 与统计计数；内存占用只与批大小有关
+
+导出即 GET /api/tasks/?stream=ndjson|csv&include=tags，命令行版本见下
+
+    python -m app.bulk import 42 tasks.ndjson     # 为用户 42 导入，格式按扩展名判断
+    python -m app.bulk export 42 csv > tasks.csv
+"""
+import csv
+import json
+from collections import Counter
+
+from mysql.connector import Error
+
+from .db import DatabaseConnection
+from .routes.tasks import (
+    AUTO_INCREMENT_STEP,
+    _build_task_query,
+    _decode_tags,
+    _insert_tasks_query,
+    _inserted_ids,
+    _task_row_for_create,
+)
+from .stats import apply_stats_deltas, stat_key
+from .streaming import CSV_LIST_SEPARATOR
+
+IMPORT_FORMATS = ("ndjson", "csv")
+# 每批导入的任务数
+IMPORT_BATCH_SIZE = 500
+# 报告中最多列出的错误数，超出的只计数
+MAX_IMPORT_ERRORS = 100
+# 单条记录最多关联的标签数
+MAX_IMPORT_TAGS = 20
+# 读取请求体或文件的块大小
+READ_CHUNK_SIZE = 64 * 1024
+
+ASSIGN_TAGS = "INSERT IGNORE INTO task_tags (task_id, tag_id) VALUES "
+
+
+def import_format(content_type, filename=None):
+    """
+    按 Content-Type 或文件扩展名判断导入格式，无法识别时返回 None
+    """
+    content_type = (content_type or "").split(";")[0].strip()
+    if content_type in ("application/x-ndjson", "application/jsonl"):
+        return "ndjson"
+    if content_type == "text/csv":
+        return "csv"
+    if filename:
+        extension = filename.rsplit(".", 1)[-1].lower()
+        if extension in ("ndjson", "jsonl"):
+            return "ndjson"
+        if extension == "csv":
+            return "csv"
+    return None
+
+
+def iter_lines(stream, chunk_size=READ_CHUNK_SIZE):
+    """
+    从二进制流中逐行读取并解码，保留行尾换行符（CSV 的多行字段需要）
+    每次只读取 chunk_size 字节
+    """
+    pending = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield (line + b"\n").decode("utf-8", errors="replace")
+    if pending:
+        yield pending.decode("utf-8", errors="replace")
+
+
+def _tag_names(value):
+    """
+    解析记录中的 tags：NDJSON 中为名称数组，CSV 中为 CSV_LIST_SEPARATOR 分隔的名称
+    返回 (去重后的名称列表, 错误信息)
+    """
+    if value in (None, ""):
+        return [], None
+    if isinstance(value, str):
+        value = value.split(CSV_LIST_SEPARATOR)
+    if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+        return None, "无效的标签"
+    names = list(dict.fromkeys(name.strip() for name in value if name.strip()))
+    if len(names) > MAX_IMPORT_TAGS or any(len(name) > 256 for name in names):
+        return None, "无效的标签"
+    return names, None
+
+
+def iter_import_records(lines, fmt):
+    """
+    逐条解析并校验导入记录
+    产出 (行号, 任务行, 标签名列表, 错误信息)，任务行与 _task_row_for_create 的结果相同
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        records = ((reader.line_num, data) for data in reader)
+    else:
+        records = ((line_no, line) for line_no, line in enumerate(lines, 1) if line.strip())
+
+    for line_no, data in records:
+        if fmt == "csv":
+            # 空单元格视为未提供，使用与单个创建接口相同的默认值
+            data = {key: value for key, value in data.items() if key and value not in ("", None)}
+        else:
+            try:
+                data = json.loads(data)
+            except ValueError:
+                yield line_no, None, None, "无效的 JSON"
+                continue
+        if not isinstance(data, dict):
+            yield line_no, None, None, "无效的记录"
+            continue
+        names, error = _tag_names(data.get("tags"))
+        if error:
+            yield line_no, None, None, error
+            continue
+        row, error = _task_row_for_create(data)
+        yield line_no, row, names, error
+
+
+class ImportReport:
+    """
+    导入结果：成功条数、失败条数与前 MAX_IMPORT_ERRORS 条错误（附行号）
+    """
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line_no, message, failed=True):
+        if failed:
+            self.failed += 1
+        if len(self.errors) < MAX_IMPORT_ERRORS:
+            self.errors.append({"line": line_no, "error": message})
+
+    def committed(self, batch, unassigned):
+        self.imported += len(batch)
+        for line_no, name in unassigned:
+            self.error(line_no, f"标签已删除，未关联: {name}", failed=False)
+
+    def to_dict(self):
+        return {
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+def _tag_key(name):
+    # tags 的唯一索引使用不区分大小写的排序规则，按同样的方式匹配已有标签
+    return name.casefold()
+
+
+def missing_tag_names(batch, tag_ids):
+    """
+    这一批记录中尚未解析出 id 的标签名
+    """
+    names = {}
+    for _, _, tag_names in batch:
+        for name in tag_names:
+            if _tag_key(name) not in tag_ids:
+                names.setdefault(_tag_key(name), name)
+    return list(names.values())
+
+
+def insert_tags_query(user_id, names):
+    """
+    创建不存在的标签；同名标签（含已软删除的）已存在时忽略
+    """
+    placeholders = ", ".join(["(%s, %s)"] * len(names))
+    return (
+        f"INSERT IGNORE INTO tags (user_id, name) VALUES {placeholders}",
+        tuple(value for name in names for value in (user_id, name)),
+    )
+
+
+def tag_ids_query(user_id, names):
+    placeholders = ",".join(["%s"] * len(names))
+    return (
+        f"SELECT id, name FROM tags WHERE user_id = %s AND is_deleted = 0 AND name IN ({placeholders})",
+        tuple([user_id] + names),
+    )
+
+
+def remember_tag_ids(tag_ids, rows):
+    for row in rows:
+        tag_ids[_tag_key(row["name"])] = row["id"]
+
+
+def assign_tags_query(batch, task_ids, tag_ids):
+    """
+    这一批任务的 task_tags 多行 INSERT（没有标签时为 None），以及无法关联的 [(行号, 标签名)]
+    task_ids 为多行 INSERT 为这一批记录分配的任务id（见 _inserted_ids）
+    同名标签已被软删除时无法关联，任务本身仍然导入
+    """
+    pairs = []
+    unassigned = []
+    for task_id, (line_no, _, tag_names) in zip(task_ids, batch):
+        for name in tag_names:
+            tag_id = tag_ids.get(_tag_key(name))
+            if tag_id is None:
+                unassigned.append((line_no, name))
+            else:
+                pairs.append((task_id, tag_id))
+    if not pairs:
+        return None, unassigned
+    return (
+        ASSIGN_TAGS + ", ".join(["(%s, %s)"] * len(pairs)),
+        tuple(value for pair in pairs for value in pair),
+    ), unassigned
+
+
+def import_stats_deltas(batch):
+    return Counter(stat_key(row[2], row[3]) for _, row, _ in batch)
+
+
+def _batch_tasks(batch, task_ids):
+    return [(task_id, row[4]) for task_id, (_, row, _) in zip(task_ids, batch)]
+
+
+def import_tasks(user_id, lines, fmt, on_commit=None, batch_size=IMPORT_BATCH_SIZE):
+    """
+    为用户导入任务，lines 为文本行的迭代器（见 iter_lines）
+    每批提交后以 [(任务id, due_date)] 调用 on_commit；已提交的批次不会因后续批次失败而回滚
+    某一批写入失败时（如截止日期格式被数据库拒绝）回滚该批并逐条重试，定位出错的行
+    返回 ImportReport，数据库连接失败时返回 None
+    """
+    report = ImportReport()
+    tag_ids = {}
+    step = None
+
+    def flush(cursor, batch):
+        nonlocal step
+        cursor.execute(*_insert_tasks_query(user_id, [row for _, row, _ in batch]))
+        first_id = cursor.lastrowid
+        if step is None:
+            cursor.execute(AUTO_INCREMENT_STEP)
+            step = cursor.fetchone()["step"]
+        task_ids = _inserted_ids(first_id, len(batch), step)
+        names = missing_tag_names(batch, tag_ids)
+        if names:
+            cursor.execute(*insert_tags_query(user_id, names))
+            cursor.execute(*tag_ids_query(user_id, names))
+            remember_tag_ids(tag_ids, cursor.fetchall())
+        assign, unassigned = assign_tags_query(batch, task_ids, tag_ids)
+        if assign:
+            cursor.execute(*assign)
+        apply_stats_deltas(cursor, user_id, import_stats_deltas(batch))
+        return task_ids, unassigned
+
+    def commit(conn, cursor, batch):
+        try:
+            task_ids, unassigned = flush(cursor, batch)
+            conn.commit()
+        except Error as e:
+            conn.rollback()
+            # 回滚后本批新建的标签不复存在，清空已解析的标签id
+            tag_ids.clear()
+            if len(batch) == 1:
+                report.error(batch[0][0], f"写入失败: {e}")
+                return
+            for item in batch:
+                commit(conn, cursor, [item])
+            return
+        report.committed(batch, unassigned)
+        if on_commit:
+            on_commit(_batch_tasks(batch, task_ids))
+
+    with DatabaseConnection(user_id=user_id) as (conn, cursor):
+        if not conn or not cursor:
+            return None
+        batch = []
+        for line_no, row, tag_names, error in iter_import_records(lines, fmt):
+            if error:
+                report.error(line_no, error)
+                continue
+            batch.append((line_no, row, tag_names))
+            if len(batch) >= batch_size:
+                commit(conn, cursor, batch)
+                batch = []
+        if batch:
+            commit(conn, cursor, batch)
+    return report
+
+
+def export_query(user_id):
+    """
+    导出用户全部未删除任务（附带标签）的查询
+    """
+    query, params, _ = _build_task_query(user_id, with_tags=True)
+    return query, params
+
+
+if __name__ == "__main__":
+    import sys
+
+    from .cache import invalidate
+    from .config import apply_config, load_config
+    from .db import stream_query
+    from .streaming import STREAM_CHUNK_SIZE, STREAM_FORMATS, RowEncoder
+
+    apply_config(load_config())
+    if len(sys.argv) != 4 or sys.argv[1] not in ("import", "export"):
+        sys.exit("用法: python -m app.bulk import <user_id> <文件> | export <user_id> <ndjson|csv|json>")
+    command, user_id = sys.argv[1], int(sys.argv[2])
+
+    if command == "import":
+        fmt = import_format(None, sys.argv[3])
+        if not fmt:
+            sys.exit("无法识别的文件格式，支持 .ndjson / .jsonl / .csv")
+        with open(sys.argv[3], "rb") as f:
+            report = import_tasks(user_id, iter_lines(f), fmt)
+        if report is None:
+            sys.exit("数据库连接失败")
+        invalidate(user_id, "tasks", "tags")
+        print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2))
+    else:
+        if sys.argv[3] not in STREAM_FORMATS:
+            sys.exit("无效的导出格式")
+        rows = stream_query(*export_query(user_id), STREAM_CHUNK_SIZE, user_id=user_id)
+        if rows is None:
+            sys.exit("数据库连接失败")
+        encoder = RowEncoder(sys.argv[3], lambda row: json.dumps(row, ensure_ascii=False, default=str), _decode_tags)
+        for chunk in rows:
+            sys.stdout.write(encoder.chunk(chunk))
+        sys.stdout.write(encoder.end())
@@ -0,0 +1,324 @@
+import hashlib
+import json
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from .db import REPLICA_CONFIG
+from .events import publish_change
+
+# 缓存配置
+# backend: "memory" 为进程内 LRU；"shared" 为多进程共享的后端（默认使用本地替身）
+#          版本号（失效与 ETag 的依据）保存在缓存后端中，多个工作进程时必须使用配置了 redis_url 的共享后端，
+#          否则写入只使处理它的进程失效，其他进程继续返回旧的列表；启动入口在多进程时检查（见 set_worker_count）
+# max_entries: 进程内 LRU 与共享后端本地替身最多保存的条目数（Redis 的容量由其 maxmemory 策略控制）
+# ttl: 条目过期时间（秒）
+# redis_url: 配置后共享后端使用 Redis（需要安装 redis 包）
+CACHE_CONFIG = {
+    "backend": "memory",
+    "max_entries": 1024,
+    "ttl": 30,
+    "redis_url": None,
+}
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    进程内 LRU 缓存
+    条目数量超过 max_entries 时淘汰最久未使用的条目，过期条目在读取时删除
+    """
+
+    def __init__(self, max_entries=1024, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalSharedCache:
+    """
+    共享缓存后端的本地替身
+    与 Redis 后端接口一致，值以 pickle 序列化保存，便于在单机开发和测试时替换
+    条目数量超过 max_entries 时淘汰最久未使用的条目，与 Redis 的 allkeys-lru 策略相当
+    """
+
+    def __init__(self, max_entries=1024, ttl=30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            expires_at, payload = item
+            if expires_at < time.time():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+        return pickle.loads(payload)
+
+    def set(self, key, value, ttl=None):
+        payload = pickle.dumps(value)
+        with self._lock:
+            self._data[key] = (time.time() + (self.ttl if ttl is None else ttl), payload)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache:
+    """
+    基于 Redis 的共享缓存后端，多个工作进程共用同一份缓存
+    """
+
+    def __init__(self, url, ttl=30):
+        import redis  # 可选依赖，仅在启用 Redis 后端时需要
+
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        payload = self._client.get(key)
+        if payload is None:
+            return _MISSING
+        return pickle.loads(payload)
+
+    def set(self, key, value, ttl=None):
+        self._client.set(key, pickle.dumps(value), ex=self.ttl if ttl is None else ttl)
+
+    def delete(self, key):
+        self._client.delete(key)
+
+    def __len__(self):
+        return self._client.dbsize()
+
+
+def _create_backend():
+    if CACHE_CONFIG["backend"] == "shared":
+        if CACHE_CONFIG["redis_url"]:
+            return RedisCache(CACHE_CONFIG["redis_url"], ttl=CACHE_CONFIG["ttl"])
+        return LocalSharedCache(max_entries=CACHE_CONFIG["max_entries"], ttl=CACHE_CONFIG["ttl"])
+    return LRUCache(max_entries=CACHE_CONFIG["max_entries"], ttl=CACHE_CONFIG["ttl"])
+
+
+_backend = None
+_backend_lock = threading.Lock()
+# 服务的工作进程数，由启动入口登记（见 serve.py），未登记时视为单进程
+_workers = 1
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+_stats_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    获取当前缓存后端，首次调用时按 CACHE_CONFIG 创建
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend()
+    return _backend
+
+
+def shared_backend_configured():
+    """
+    CACHE_CONFIG 是否指定了所有工作进程共用的后端（Redis）
+    """
+    return CACHE_CONFIG["backend"] == "shared" and bool(CACHE_CONFIG["redis_url"])
+
+
+def versions_shared():
+    """
+    版本号是否对处理请求的所有进程一致：使用共享后端，或只有一个工作进程
+    不一致时其他进程的写入不会更换本进程的版本号，不能据此判断数据未变化
+    """
+    return _workers == 1 or shared_backend_configured()
+
+
+def set_worker_count(workers):
+    """
+    登记工作进程数，需在 apply_config 之后、启动工作进程之前调用
+    多进程而缓存后端不共享时抛出 RuntimeError，避免各进程的版本号互不相通
+    """
+    global _workers
+    if workers > 1 and not shared_backend_configured():
+        raise RuntimeError(
+            f"{workers} 个工作进程需要共享缓存：请配置 cache.backend = \"shared\" 与 cache.redis_url，或把 workers 设为 1"
+        )
+    _workers = workers
+
+
+def set_cache(backend):
+    """
+    替换缓存后端（传入 None 则下次使用时按 CACHE_CONFIG 重新创建）
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def _count(name):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def _version_key(namespace, user_id):
+    return f"v:{namespace}:{user_id}"
+
+
+def _current_version(backend, namespace, user_id):
+    """
+    获取用户某类数据的版本号
+    版本号丢失（过期或被淘汰）时生成新版本，旧版本下的条目随之失效
+    """
+    key = _version_key(namespace, user_id)
+    version = backend.get(key)
+    if version is _MISSING:
+        version = uuid.uuid4().hex
+        backend.set(key, version, ttl=24 * 3600)
+    return version
+
+
+def _digest(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def make_etag(user_id, namespaces, shape):
+    """
+    根据用户各类数据的当前版本号和请求条件生成 ETag
+    任一类数据变更都会更换版本号，从而得到新的 ETag，无需读取数据行；
+    版本号保存在缓存后端中，只有 versions_shared() 时才能据此返回 304
+    """
+    backend = get_cache()
+    versions = [_current_version(backend, namespace, user_id) for namespace in namespaces]
+    return _digest([user_id, versions, shape])
+
+
+def _cache_key(backend, namespace, user_id, shape):
+    namespaces = (namespace,) if isinstance(namespace, str) else tuple(namespace)
+    versions = ".".join(_current_version(backend, ns, user_id) for ns in namespaces)
+    return f"{'+'.join(namespaces)}:{user_id}:{versions}:{_digest(shape)}"
+
+
+def read_through(namespace, user_id, shape, loader):
+    """
+    读穿缓存
+    namespace: 数据类别（如 "tasks"、"tags"），结果依赖多类数据时传入元组，任一类失效即失效
+    shape: 查询条件，可 JSON 序列化，决定缓存键
+    loader: 未命中时调用，返回 (结果, 状态码)，仅缓存状态码为 200 的结果
+    """
+    backend = get_cache()
+    key = _cache_key(backend, namespace, user_id, shape)
+    value = backend.get(key)
+    if value is not _MISSING:
+        _count("hits")
+        return value, 200
+
+    _count("misses")
+    result, status = loader()
+    if status == 200:
+        backend.set(key, result)
+    return result, status
+
+
+async def read_through_async(namespace, user_id, shape, loader):
+    """
+    read_through 的异步版本，loader 为返回 (结果, 状态码) 的协程函数
+    与同步版本使用相同的缓存键，两种服务模式可共用一个共享缓存
+    """
+    backend = get_cache()
+    key = _cache_key(backend, namespace, user_id, shape)
+    value = backend.get(key)
+    if value is not _MISSING:
+        _count("hits")
+        return value, 200
+
+    _count("misses")
+    result, status = await loader()
+    if status == 200:
+        backend.set(key, result)
+    return result, status
+
+
+def invalidate(user_id, *namespaces):
+    """
+    使用户指定类别的缓存全部失效
+    通过更换版本号实现，无需逐条删除
+    每次写入提交后都会调用，同时记下用户刚写入过（见 mark_written），并通知用户已连接的客户端（见 app/events.py）
+    """
+    backend = get_cache()
+    for namespace in namespaces:
+        backend.set(_version_key(namespace, user_id), uuid.uuid4().hex, ttl=24 * 3600)
+        _count("invalidations")
+    mark_written(user_id)
+    publish_change(user_id, namespaces)
+
+
+def _written_key(user_id):
+    return f"w:{user_id}"
+
+
+def mark_written(user_id):
+    """
+    配置了读副本时，记下用户在 sticky_seconds 秒内写入过，这段时间内该用户的读取走主库
+    标记保存在缓存后端中，使用共享后端时对所有工作进程可见
+    """
+    seconds = REPLICA_CONFIG["sticky_seconds"]
+    if REPLICA_CONFIG["hosts"] and seconds:
+        get_cache().set(_written_key(user_id), 1, ttl=int(seconds))
+
+
+def written_recently(user_id):
+    return get_cache().get(_written_key(user_id)) is not _MISSING
+
+
+def cache_stats():
+    """
+    缓存统计信息（命中、未命中、失效次数与条目数）
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["entries"] = len(get_cache())
+    return stats
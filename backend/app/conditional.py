@@ -0,0 +1,45 @@
+from flask import current_app, jsonify, request
+
+from .cache import make_etag, versions_shared
+
+
+def request_shape(req):
+    """
+    决定 ETag 的请求条件：路径与全部查询参数
+    """
+    return [req.path, sorted(req.args.items(multi=True))]
+
+
+def check_not_modified(user_id, *namespaces):
+    """
+    计算当前请求的 ETag
+    客户端 If-None-Match 与之匹配时返回 (etag, 304 响应)，否则返回 (etag, None)
+    namespaces 为响应所依赖的数据类别（如 "tasks"、"tags"）
+    版本号不是各进程共用时（见 cache.versions_shared）不返回 304，其他进程的写入可能未反映在版本号中
+    """
+    etag = make_etag(user_id, namespaces, request_shape(request))
+    # 压缩后的响应带弱 ETag（见 encoding.mark_encoded），按弱比较匹配
+    if versions_shared() and request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+        set_etag_headers(response, etag)
+        return etag, response
+    return etag, None
+
+
+def json_with_etag(result, status, etag):
+    """
+    序列化结果，成功时附带 ETag
+    """
+    response = jsonify(result)
+    if status == 200:
+        set_etag_headers(response, etag)
+    return response, status
+
+
+def set_etag_headers(response, etag):
+    """
+    为响应设置 ETag 与缓存控制头
+    """
+    response.set_etag(etag)
+    # 响应因用户而异，且客户端每次都应重新验证
+    response.headers["Cache-Control"] = "private, no-cache"
@@ -0,0 +1,148 @@
+import json
+import os
+import secrets
+
+# 服务配置默认值，可被配置文件和环境变量覆盖
+# bind: 监听地址
+# workers: 工作进程数
+# threads: 每个工作进程的线程数
+# timeout: 工作进程无响应多少秒后被重启
+# graceful_timeout: 平滑重启时等待处理中请求完成的秒数
+# max_requests: 工作进程处理多少个请求后自动重启，0 表示不重启
+# preload_app: 是否在主进程中预先加载应用（开启后 HUP 不会重新加载代码）
+# secret_key_file: 会话签名密钥文件，所有工作进程和重启之间共用
+# admin_token: 访问 /api/admin 管理接口所需的令牌，不配置则管理接口不可用
+DEFAULT_CONFIG = {
+    "bind": "127.0.0.1:5000",
+    "workers": (os.cpu_count() or 1) * 2 + 1,
+    "threads": 4,
+    "timeout": 30,
+    "graceful_timeout": 30,
+    "max_requests": 0,
+    "preload_app": False,
+    "secret_key": None,
+    "secret_key_file": os.path.join(os.path.dirname(os.path.dirname(__file__)), "instance", "secret_key"),
+    "admin_token": None,
+    "db": {},
+    "pool": {},
+    "replicas": {},
+    "sharding": {},
+    "cache": {},
+    "hashing": {},
+    "slow_query": {},
+    "reminders": {},
+    "stats": {},
+    "jobs": {},
+    "encoding": {},
+    "admission": {},
+    "events": {},
+}
+
+# 环境变量到配置项的映射
+ENV_KEYS = {
+    "YOUTIME_BIND": ("bind", str),
+    "YOUTIME_WORKERS": ("workers", int),
+    "YOUTIME_THREADS": ("threads", int),
+    "YOUTIME_TIMEOUT": ("timeout", int),
+    "YOUTIME_GRACEFUL_TIMEOUT": ("graceful_timeout", int),
+    "YOUTIME_MAX_REQUESTS": ("max_requests", int),
+    "YOUTIME_PRELOAD_APP": ("preload_app", lambda value: value.lower() in ("1", "true", "yes")),
+    "YOUTIME_SECRET_KEY": ("secret_key", str),
+    "YOUTIME_SECRET_KEY_FILE": ("secret_key_file", str),
+    "YOUTIME_ADMIN_TOKEN": ("admin_token", str),
+}
+
+ENV_DB_KEYS = {
+    "YOUTIME_DB_HOST": "host",
+    "YOUTIME_DB_PORT": "port",
+    "YOUTIME_DB_USER": "user",
+    "YOUTIME_DB_PASSWORD": "password",
+    "YOUTIME_DB_NAME": "database",
+}
+
+
+def load_config(path=None):
+    """
+    加载配置
+    依次合并默认值、JSON 配置文件（path 或环境变量 YOUTIME_CONFIG 指定）和 YOUTIME_ 前缀的环境变量
+    """
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    path = path or os.environ.get("YOUTIME_CONFIG")
+    if path:
+        with open(path, encoding="utf-8") as f:
+            for key, value in json.load(f).items():
+                if isinstance(value, dict) and isinstance(config.get(key), dict):
+                    config[key].update(value)
+                else:
+                    config[key] = value
+
+    for env, (key, convert) in ENV_KEYS.items():
+        if env in os.environ:
+            config[key] = convert(os.environ[env])
+    for env, key in ENV_DB_KEYS.items():
+        if env in os.environ:
+            config["db"][key] = int(os.environ[env]) if key == "port" else os.environ[env]
+    return config
+
+
+def apply_config(config):
+    """
+    将配置中的 db / pool / replicas / sharding / cache / hashing / slow_query / reminders / stats / jobs / encoding / admission / events 部分写入各模块的配置
+    需在第一次使用数据库、缓存和哈希进程池之前调用
+    """
+    from .admission import ADMISSION_CONFIG
+    from .cache import CACHE_CONFIG
+    from .db import DB_CONFIG, POOL_CONFIG, REPLICA_CONFIG, SHARD_CONFIG
+    from .encoding import ENCODING_CONFIG
+    from .events import EVENT_CONFIG
+    from .hashing import HASH_CONFIG
+    from .jobs import JOB_CONFIG
+    from .reminders import REMINDER_CONFIG
+    from .slowlog import SLOW_QUERY_CONFIG
+    from .stats import STATS_CONFIG
+
+    DB_CONFIG.update(config.get("db", {}))
+    POOL_CONFIG.update(config.get("pool", {}))
+    REPLICA_CONFIG.update(config.get("replicas", {}))
+    SHARD_CONFIG.update(config.get("sharding", {}))
+    CACHE_CONFIG.update(config.get("cache", {}))
+    HASH_CONFIG.update(config.get("hashing", {}))
+    SLOW_QUERY_CONFIG.update(config.get("slow_query", {}))
+    REMINDER_CONFIG.update(config.get("reminders", {}))
+    STATS_CONFIG.update(config.get("stats", {}))
+    JOB_CONFIG.update(config.get("jobs", {}))
+    ENCODING_CONFIG.update(config.get("encoding", {}))
+    ADMISSION_CONFIG.update(config.get("admission", {}))
+    EVENT_CONFIG.update(config.get("events", {}))
+
+
+def load_secret_key(config):
+    """
+    获取会话签名密钥
+    优先使用配置中的 secret_key；否则读取 secret_key_file，文件不存在时生成并保存，
+    保证多个工作进程以及重启前后使用同一个密钥
+    """
+    if config.get("secret_key"):
+        return config["secret_key"]
+
+    path = config["secret_key_file"]
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再硬链接到目标路径：并发启动的多个进程中只有一个能成功，
+        # 其他进程读到的一定是完整的密钥
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(temp_path)
+
+    with open(path, encoding="utf-8") as f:
+        key = f.read().strip()
+    if not key:
+        raise RuntimeError(f"会话密钥文件为空: {path}")
+    return key
@@ -1,3 +1,9 @@
+import bisect
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
+
 import mysql.connector
 from mysql.connector import Error
 
@@ -8,19 +14,906 @@ DB_CONFIG = {
     "database": "youtime",
 }
 
+# 连接池配置
+# size: 池中最多同时存在的连接数
+# timeout: 借出连接时最长等待时间（秒），超时视为连接失败
+# recycle: 连接创建后超过该秒数即关闭重建，避免被服务端 wait_timeout 断开
+# validate_after: 连接空闲超过该秒数后，借出前先 ping 一次确认存活
+# prepared_statements: 每个连接最多缓存的预处理语句数，0 表示不使用预处理语句
+POOL_CONFIG = {
+    "size": 10,
+    "timeout": 5.0,
+    "recycle": 3600,
+    "validate_after": 30,
+    "prepared_statements": 64,
+}
+
+# 读副本配置
+# hosts: 副本连接参数列表，每项覆盖 DB_CONFIG 中的同名项（如 {"host": "10.0.0.2", "port": 3307}），
+#        为空时读写都走主库
+# strategy: "round_robin" 轮询，或 "least_connections" 选借出连接最少的副本
+# sticky_seconds: 用户写入后这段时间内的读取仍走主库（读己之写），应大于副本通常的复制延迟
+# retry_interval: 副本借出连接失败或延迟过大后，至少间隔这么多秒才再次尝试
+# max_lag: 复制延迟超过该秒数或无法确定的副本视为不可用，读取改走主库（检查需要 REPLICATION CLIENT 权限）；
+#          副本读到的结果会按当前版本写入缓存并带上 ETag，应不大于 sticky_seconds，使粘滞期过后副本已追上用户的写入；
+#          None 表示不检查，只应在副本确定不会落后时使用
+# check_interval: 每个副本检查复制延迟的最小间隔（秒）
+REPLICA_CONFIG = {
+    "hosts": [],
+    "strategy": "round_robin",
+    "sticky_seconds": 5,
+    "retry_interval": 10,
+    "max_lag": 5,
+    "check_interval": 5,
+}
+
+# 分片配置
+# shards: 分片名到连接参数的映射，每项覆盖 DB_CONFIG 中的同名项，如 {"s1": {"host": "10.0.1.1"}}；为空时不分片
+#         DB_CONFIG 指向的主库保存 users、jobs 与 user_shards 目录，也是名为 MAIN_SHARD 的分片：
+#         目录中没有记录的用户（启用分片之前注册的用户）的数据都在主库；要向主库放置新用户，在 shards 中加入 "main": {}
+#         任务和标签的 id 在各分片间不能重复（迁移时按原 id 复制，缓存与增量同步也以 id 区分），
+#         各库需设置互不相交的 auto_increment_offset / auto_increment_increment
+# placement: 新用户按一致性哈希放置到的分片，None 表示 shards 中的全部分片；扩容时可只列出新分片
+# vnodes: 一致性哈希环上每个分片的虚拟节点数
+# directory_ttl: 进程内缓存用户所在分片的秒数；迁移用户时冻结写入与切换分片之后都会等待这段时间
+# directory_size: 进程内最多缓存的目录条目数
+SHARD_CONFIG = {
+    "shards": {},
+    "placement": None,
+    "vnodes": 64,
+    "directory_ttl": 30,
+    "directory_size": 100000,
+}
+MAIN_SHARD = "main"
+
+LOOKUP_SHARD = "SELECT shard, moving FROM user_shards WHERE user_id = %s"
+# 分片库中的 users 只有占位行，满足任务和标签到 users 的外键；账号信息只保存在主库
+# 占位行不可登录（is_active = 0）；放置在主库时 id 已存在，INSERT IGNORE 不做任何事
+INSERT_SHARD_USER = (
+    "INSERT IGNORE INTO users (id, username, email, password_hash, is_active) VALUES (%s, %s, %s, '', 0)"
+)
+PLACE_USER = "INSERT INTO user_shards (user_id, shard) VALUES (%s, %s) ON DUPLICATE KEY UPDATE shard = shard"
+
+# DatabaseConnection / stream_query 的读写意图：READ 可以由副本处理，WRITE（默认）总是使用主库
+READ = "read"
+WRITE = "write"
 
-def get_db_connection():
+REPLICA_STATUS = "SHOW REPLICA STATUS"
+
+# 通过 prepared() 登记的语句，在连接池连接上以服务端预处理语句执行
+_prepared_registry = set()
+_prepared_stats = {"hits": 0, "prepares": 0, "evictions": 0}
+_prepared_lock = threading.Lock()
+
+
+def prepared(statement):
+    """
+    登记一条需要预处理的 SQL 并原样返回
+    登记过的语句在每个连接上只预处理一次，之后复用
+    只应登记形状固定的语句（不含随参数个数变化的 IN 列表）
     """
-    获取一个新的数据库连接
+    _prepared_registry.add(statement)
+    return statement
+
+
+def prepared_stats():
     """
+    预处理语句统计（复用次数、预处理次数、淘汰次数）
+    """
+    with _prepared_lock:
+        return dict(_prepared_stats)
+
+
+def _count_prepared(name):
+    with _prepared_lock:
+        _prepared_stats[name] += 1
+
+
+class PreparedStatements:
+    """
+    单个连接上的预处理语句缓存
+    每条语句对应一个预处理游标，超过 max_size 时关闭最久未用的游标以释放服务端语句
+    """
+
+    def __init__(self, connection, max_size):
+        self.connection = connection
+        self.max_size = max_size
+        self._cursors = OrderedDict()
+
+    def get(self, statement):
+        cursor = self._cursors.get(statement)
+        if cursor is not None:
+            self._cursors.move_to_end(statement)
+            _count_prepared("hits")
+            return cursor
+        cursor = self.connection.cursor(prepared=True, dictionary=True)
+        self._cursors[statement] = cursor
+        _count_prepared("prepares")
+        while len(self._cursors) > self.max_size:
+            _, evicted = self._cursors.popitem(last=False)
+            _count_prepared("evictions")
+            try:
+                evicted.close()
+            except Error:
+                pass
+        return cursor
+
+
+class StatementCursor:
+    """
+    游标包装
+    登记过的语句交给连接上对应的预处理游标执行，结果一次读入内存后由本游标返回；
+    其他语句和属性直接转发给普通游标
+    """
+
+    def __init__(self, cursor, statements):
+        self._cursor = cursor
+        self._statements = statements
+        self._rows = None
+        self._rowcount = -1
+        self._lastrowid = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def execute(self, operation, params=(), *args, **kwargs):
+        if operation not in _prepared_registry:
+            self._rows = None
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        cursor = self._statements.get(operation)
+        cursor.execute(operation, params or ())
+        self._rows = deque(cursor.fetchall() if cursor.with_rows else ())
+        self._rowcount = cursor.rowcount
+        self._lastrowid = cursor.lastrowid
+        return None
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount if self._rows is None else self._rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid if self._rows is None else self._lastrowid
+
+    def fetchone(self):
+        if self._rows is None:
+            return self._cursor.fetchone()
+        return self._rows.popleft() if self._rows else None
+
+    def fetchmany(self, size=1):
+        if self._rows is None:
+            return self._cursor.fetchmany(size)
+        return [self._rows.popleft() for _ in range(min(size, len(self._rows)))]
+
+    def fetchall(self):
+        if self._rows is None:
+            return self._cursor.fetchall()
+        rows, self._rows = list(self._rows), deque()
+        return rows
+
+
+class _PooledConnection:
+    """
+    连接池中的一条连接及其元数据
+    """
+
+    __slots__ = ("connection", "statements", "created_at", "last_used")
+
+    def __init__(self, connection, statements=None):
+        now = time.monotonic()
+        self.connection = connection
+        self.statements = statements
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """
+    有界数据库连接池
+    - 最多同时持有 size 个连接，借满后新的请求最多等待 timeout 秒
+    - 连接存活超过 recycle 秒后关闭重建
+    - 空闲超过 validate_after 秒的连接在借出前 ping 一次，失效则丢弃重连
+    - 每个连接各自缓存至多 prepared_statements 条预处理语句，随连接一起复用和销毁
+    - 统计借出/空闲数量与等待时间
+    shard 为连接池所属的分片，读副本的连接池属于主库
+    """
+
+    def __init__(
+        self,
+        config=None,
+        size=10,
+        timeout=5.0,
+        recycle=3600,
+        validate_after=30,
+        prepared_statements=64,
+        shard=MAIN_SHARD,
+    ):
+        self.config = dict(config or DB_CONFIG)
+        self.shard = shard
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.validate_after = validate_after
+        self.prepared_statements = prepared_statements
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._in_use = {}
+        self._opening = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _connect(self):
+        connection = mysql.connector.connect(**self.config)
+        statements = None
+        if self.prepared_statements:
+            statements = PreparedStatements(connection, self.prepared_statements)
+        return _PooledConnection(connection, statements)
+
+    def _close_quietly(self, entry):
+        self._discarded += 1
+        try:
+            entry.connection.close()
+        except Error:
+            pass
+
+    def _is_usable(self, entry, now):
+        if self.recycle and now - entry.created_at > self.recycle:
+            return False
+        if now - entry.last_used > self.validate_after:
+            try:
+                entry.connection.ping(reconnect=False)
+            except Error:
+                return False
+        return True
+
+    def acquire(self):
+        """
+        借出一个连接
+        池满时最多等待 timeout 秒，超时或连接失败返回 None
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+        entry = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    return None
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if len(self._in_use) + self._opening < self.size:
+                    self._opening += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    self._record_wait(time.monotonic() - start)
+                    print("获取数据库连接超时: 连接池已满")
+                    return None
+                self._cond.wait(remaining)
+            self._record_wait(time.monotonic() - start)
+
+        # 建立或校验连接均在锁外进行，避免阻塞其他线程
+        if entry is not None and not self._is_usable(entry, time.monotonic()):
+            with self._cond:
+                self._close_quietly(entry)
+                self._opening += 1
+            entry = None
+        if entry is None:
+            try:
+                entry = self._connect()
+            except Error as e:
+                print(f"数据库连接失败: {e}")
+                with self._cond:
+                    self._opening -= 1
+                    self._cond.notify()
+                return None
+            with self._cond:
+                self._opening -= 1
+                self._created += 1
+
+        with self._cond:
+            self._in_use[id(entry.connection)] = entry
+            self._checkouts += 1
+        return entry.connection
+
+    def _record_wait(self, waited):
+        self._wait_total += waited
+        if waited > self._wait_max:
+            self._wait_max = waited
+
+    def statements_for(self, connection):
+        """
+        获取借出连接的预处理语句缓存，未启用或不是本池的连接返回 None
+        """
+        with self._cond:
+            entry = self._in_use.get(id(connection))
+        return entry.statements if entry is not None else None
+
+    def owns(self, connection):
+        """
+        判断连接是否由本连接池借出
+        """
+        with self._cond:
+            return id(connection) in self._in_use
+
+    def release(self, connection, discard=False):
+        """
+        归还连接
+        归还前回滚未提交的事务，连接已断开或 discard 为 True 时直接关闭
+        """
+        with self._cond:
+            entry = self._in_use.pop(id(connection), None)
+        if entry is None:
+            return
+        if not discard:
+            try:
+                if connection.in_transaction:
+                    connection.rollback()
+            except Error:
+                discard = True
+        with self._cond:
+            if discard or self._closed:
+                self._close_quietly(entry)
+            else:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+            self._cond.notify()
+
+    @property
+    def in_use(self):
+        return len(self._in_use)
+
+    def close(self):
+        """
+        关闭所有空闲连接，借出中的连接在归还时关闭
+        """
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._close_quietly(self._idle.pop())
+            self._cond.notify_all()
+
+    def stats(self):
+        """
+        连接池统计信息
+        """
+        with self._cond:
+            return {
+                "size": self.size,
+                "in_use": len(self._in_use),
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "timeouts": self._timeouts,
+                "created": self._created,
+                "discarded": self._discarded,
+                "wait_total_seconds": round(self._wait_total, 6),
+                "wait_max_seconds": round(self._wait_max, 6),
+                "wait_avg_seconds": round(self._wait_total / self._checkouts, 6)
+                if self._checkouts
+                else 0.0,
+            }
+
+
+class Replica:
+    """
+    一个读副本及其连接池与健康状态
+    """
+
+    __slots__ = ("name", "pool", "down_until", "checked_at", "failures")
+
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.down_until = 0.0
+        self.checked_at = 0.0
+        self.failures = 0
+
+
+class ReplicaSet:
+    """
+    一组读副本的选择与健康状态，同步与异步连接池共用
+    - 在可用副本中按 strategy 排出尝试顺序：轮询，或借出连接最少的优先
+    - 借出连接失败或复制延迟过大的副本在 retry_interval 秒内不被选中，之后自动重新尝试
+    - 复制延迟按 check_interval 抽查，同一时刻只有一个请求负责检查
+    没有可用副本时 candidates() 为空，调用方改用主库
+    """
+
+    def __init__(self, replicas, strategy="round_robin", retry_interval=10, check_interval=5):
+        self.replicas = replicas
+        self.strategy = strategy
+        self.retry_interval = retry_interval
+        self.check_interval = check_interval
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def candidates(self):
+        """
+        按尝试顺序返回当前可用的副本
+        """
+        now = time.monotonic()
+        with self._lock:
+            available = [replica for replica in self.replicas if replica.down_until <= now]
+            if not available:
+                return []
+            if self.strategy == "least_connections":
+                return sorted(available, key=lambda replica: replica.pool.in_use)
+            start = self._next % len(available)
+            self._next += 1
+            return available[start:] + available[:start]
+
+    def mark_down(self, replica, reason):
+        with self._lock:
+            replica.down_until = time.monotonic() + self.retry_interval
+            replica.failures += 1
+        print(f"读副本 {replica.name} 暂不可用（{reason}），{self.retry_interval} 秒后重试")
+
+    def lag_check_due(self, replica):
+        """
+        是否应在这次借出的连接上检查复制延迟
+        """
+        if REPLICA_CONFIG["max_lag"] is None:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if now - replica.checked_at < self.check_interval:
+                return False
+            replica.checked_at = now
+            return True
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            replica.name: {
+                "up": int(replica.down_until <= now),
+                "in_use": replica.pool.in_use,
+                "failures": replica.failures,
+            }
+            for replica in self.replicas
+        }
+
+
+def replica_name(entry):
+    return f"{entry.get('host', DB_CONFIG.get('host'))}:{entry.get('port', DB_CONFIG.get('port', 3306))}"
+
+
+def build_replica_set(make_pool):
+    """
+    按 REPLICA_CONFIG 创建副本集合，make_pool(连接参数) 创建单个副本的连接池
+    未配置副本时返回 None
+    """
+    entries = REPLICA_CONFIG["hosts"]
+    if not entries:
+        return None
+    replicas = [Replica(replica_name(entry), make_pool({**DB_CONFIG, **entry})) for entry in entries]
+    return ReplicaSet(
+        replicas,
+        strategy=REPLICA_CONFIG["strategy"],
+        retry_interval=REPLICA_CONFIG["retry_interval"],
+        check_interval=REPLICA_CONFIG["check_interval"],
+    )
+
+
+def replica_lag_ok(row):
+    """
+    根据 SHOW REPLICA STATUS 的结果判断副本延迟是否在 max_lag 之内
+    延迟无法确定时视为不可用：没有结果（未配置复制）、复制线程停止（延迟为 NULL）
+    """
+    if row is None:
+        return False
+    lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+    return lag is not None and lag <= REPLICA_CONFIG["max_lag"]
+
+
+def use_primary_for(user_id):
+    """
+    读操作是否应改用主库：用户刚刚写入过（见 cache.mark_written）
+    """
+    if user_id is None or not REPLICA_CONFIG["sticky_seconds"]:
+        return False
+    from .cache import written_recently
+
+    return written_recently(user_id)
+
+
+class HashRing:
+    """
+    一致性哈希环：每个分片在环上有 vnodes 个虚拟节点，键落在顺时针方向的第一个节点
+    增减分片时只有相邻区间的键改变归属
+    """
+
+    def __init__(self, names, vnodes=64):
+        points = sorted((_ring_hash(f"{name}#{index}"), name) for name in names for index in range(vnodes))
+        self._keys = [point for point, _ in points]
+        self._names = [name for _, name in points]
+
+    def get(self, key):
+        index = bisect.bisect(self._keys, _ring_hash(str(key))) % len(self._keys)
+        return self._names[index]
+
+
+def _ring_hash(value):
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class ShardUnavailable(Exception):
+    """
+    用户正在迁移分片，暂不接受写入
+    """
+
+
+def sharding_enabled():
+    return bool(SHARD_CONFIG["shards"])
+
+
+def shard_names():
+    """
+    所有分片（含主库），按名称排序，后台任务按此顺序逐个分片处理
+    """
+    return sorted(set(SHARD_CONFIG["shards"]) | {MAIN_SHARD})
+
+
+def shard_config(name):
+    if name == MAIN_SHARD:
+        return {**DB_CONFIG, **SHARD_CONFIG["shards"].get(MAIN_SHARD, {})}
+    return {**DB_CONFIG, **SHARD_CONFIG["shards"][name]}
+
+
+_ring = None
+
+
+def placement_shard(user_id):
+    """
+    按一致性哈希为新用户选择分片
+    """
+    global _ring
+    if _ring is None:
+        names = SHARD_CONFIG["placement"] or list(SHARD_CONFIG["shards"])
+        _ring = HashRing(names, SHARD_CONFIG["vnodes"])
+    return _ring.get(user_id)
+
+
+_directory = OrderedDict()
+_directory_lock = threading.Lock()
+
+
+def cached_shard(user_id):
+    """
+    进程内缓存的 (分片, 是否迁移中)，未缓存或已过期时返回 None
+    """
+    with _directory_lock:
+        entry = _directory.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _directory[user_id]
+            return None
+        _directory.move_to_end(user_id)
+        return entry[1]
+
+
+def remember_shard(user_id, row):
+    """
+    缓存目录查询结果（LOOKUP_SHARD 的行，没有记录时为 None，即在主库），返回 (分片, 是否迁移中)
+    """
+    location = (row["shard"], bool(row["moving"])) if row else (MAIN_SHARD, False)
+    with _directory_lock:
+        _directory[user_id] = (time.monotonic() + SHARD_CONFIG["directory_ttl"], location)
+        _directory.move_to_end(user_id)
+        while len(_directory) > SHARD_CONFIG["directory_size"]:
+            _directory.popitem(last=False)
+    return location
+
+
+def forget_shard(user_id=None):
+    with _directory_lock:
+        if user_id is None:
+            _directory.clear()
+        else:
+            _directory.pop(user_id, None)
+
+
+def locate_user(user_id):
+    """
+    查询用户所在的分片，返回 (分片, 是否迁移中)；未启用分片时总是主库
+    目录读自主库并在进程内缓存 directory_ttl 秒
+    """
+    if not sharding_enabled():
+        return MAIN_SHARD, False
+    location = cached_shard(user_id)
+    if location is not None:
+        return location
+    with DatabaseConnection() as (conn, cursor):
+        if not conn or not cursor:
+            raise ShardUnavailable(f"无法读取用户 {user_id} 的分片目录")
+        cursor.execute(LOOKUP_SHARD, (user_id,))
+        row = cursor.fetchone()
+    return remember_shard(user_id, row)
+
+
+def shard_user_stub(user_id):
+    return (user_id, f"#{user_id}", f"#{user_id}@shard")
+
+
+def place_user(user_id):
+    """
+    为新注册的用户选择分片：先在分片中建立占位行，再写入目录
+    未启用分片时什么也不做；失败时用户留在主库（目录中没有记录），返回所在分片
+    """
+    if not sharding_enabled():
+        return MAIN_SHARD
+    shard = placement_shard(user_id)
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
+        with DatabaseConnection(shard=shard) as (conn, cursor):
+            if not conn or not cursor:
+                return MAIN_SHARD
+            cursor.execute(INSERT_SHARD_USER, shard_user_stub(user_id))
+            conn.commit()
+        with DatabaseConnection() as (conn, cursor):
+            if not conn or not cursor:
+                return MAIN_SHARD
+            cursor.execute(PLACE_USER, (user_id, shard))
+            conn.commit()
+    except Error as e:
+        print(f"为用户 {user_id} 分配分片失败: {e}")
+        return MAIN_SHARD
+    forget_shard(user_id)
+    return shard
+
+
+_pool = None
+_replicas = None
+_shard_pools = {}
+_pool_lock = threading.Lock()
+_acquire_hooks = []
+_query_hooks = []
+
+
+def add_acquire_hook(hook):
+    """
+    注册连接获取钩子，每次从连接池借出连接后以耗时（秒）调用 hook(seconds)
+    """
+    if hook not in _acquire_hooks:
+        _acquire_hooks.append(hook)
+
+
+def add_query_hook(hook):
+    """
+    注册查询钩子，每次 execute / executemany 之后调用
+    hook(statement, params, seconds, rowcount, error, shard)，执行成功时 error 为 None，shard 为语句执行所在的分片
+    """
+    if hook not in _query_hooks:
+        _query_hooks.append(hook)
+
+
+def _run_hooks(hooks, *args):
+    for hook in hooks:
+        try:
+            hook(*args)
+        except Exception as e:
+            print(f"数据库钩子执行失败: {e}")
+
+
+class InstrumentedCursor:
+    """
+    游标包装
+    记录每次 execute / executemany 的耗时并调用查询钩子，其他属性和方法直接转发给原游标
+    """
+
+    def __init__(self, cursor, shard=MAIN_SHARD):
+        self._cursor = cursor
+        self.shard = shard
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        return self._timed(self._cursor.execute, operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        return self._timed(self._cursor.executemany, operation, seq_params, *args, **kwargs)
+
+    def _timed(self, method, operation, params, *args, **kwargs):
+        start = time.perf_counter()
+        error = None
+        try:
+            return method(operation, params, *args, **kwargs)
+        except Error as e:
+            error = e
+            raise
+        finally:
+            _run_hooks(
+                _query_hooks,
+                operation,
+                params,
+                time.perf_counter() - start,
+                self._cursor.rowcount,
+                error,
+                self.shard,
+            )
+
+
+def _instrument(cursor, pool):
+    """
+    挂载了查询钩子时包装游标，pool 为连接所属的连接池（未知时为 None，视为主库）
+    """
+    if not _query_hooks:
+        return cursor
+    return InstrumentedCursor(cursor, pool.shard if pool is not None else MAIN_SHARD)
+
+
+def get_pool(shard=MAIN_SHARD):
+    """
+    获取进程内共享的连接池，首次调用时按 POOL_CONFIG 创建
+    shard 为分片名，每个分片各有一个连接池，主库（MAIN_SHARD）即原有的连接池
+    """
+    global _pool
+    if shard != MAIN_SHARD:
+        pool = _shard_pools.get(shard)
+        if pool is None:
+            with _pool_lock:
+                pool = _shard_pools.get(shard)
+                if pool is None:
+                    pool = _shard_pools[shard] = ConnectionPool(shard_config(shard), shard=shard, **POOL_CONFIG)
+        return pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(shard_config(MAIN_SHARD), **POOL_CONFIG)
+    return _pool
+
+
+def get_replica_set():
+    """
+    获取进程内共享的读副本集合，首次调用时按 REPLICA_CONFIG 创建，未配置副本时为 None
+    """
+    global _replicas
+    if _replicas is None and REPLICA_CONFIG["hosts"]:
+        with _pool_lock:
+            if _replicas is None:
+                _replicas = build_replica_set(lambda config: ConnectionPool(config, **POOL_CONFIG))
+    return _replicas
+
+
+def reset_pool():
+    """
+    关闭并丢弃当前连接池（含读副本与各分片的连接池），下次使用时重新创建
+    多进程部署时应在 fork 之后调用，避免子进程共用父进程的连接
+    """
+    global _pool, _replicas, _shard_pools, _ring
+    with _pool_lock:
+        pool, _pool = _pool, None
+        replicas, _replicas = _replicas, None
+        shard_pools, _shard_pools = _shard_pools, {}
+        _ring = None
+    forget_shard()
+    if pool is not None:
+        pool.close()
+    if replicas is not None:
+        for replica in replicas.replicas:
+            replica.pool.close()
+    for shard_pool in shard_pools.values():
+        shard_pool.close()
+
+
+def get_pool_stats():
+    """
+    获取连接池统计信息（借出数、空闲数、等待时间等）
+    """
+    return get_pool().stats()
+
+
+def get_shard_pool_stats():
+    """
+    各分片连接池的统计信息（不含主库），未启用分片时为空
+    """
+    return {name: pool.stats() for name, pool in list(_shard_pools.items())}
+
+
+def get_replica_stats():
+    """
+    各读副本的可用状态、借出连接数与失败次数，未配置副本时为空
+    """
+    replicas = _replicas
+    return replicas.stats() if replicas is not None else {}
+
+
+def _owning_pool(connection):
+    pool = _pool
+    if pool is not None and pool.owns(connection):
+        return pool
+    replicas = _replicas
+    if replicas is not None:
+        for replica in replicas.replicas:
+            if replica.pool.owns(connection):
+                return replica.pool
+    for shard_pool in list(_shard_pools.values()):
+        if shard_pool.owns(connection):
+            return shard_pool
+    return None
+
+
+def _lag_ok(connection):
+    try:
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute(REPLICA_STATUS)
+            return replica_lag_ok(cursor.fetchone())
+        finally:
+            cursor.close()
     except Error as e:
-        print(f"数据库连接失败: {e}")
+        print(f"检查复制延迟失败: {e}")
+        return False
+
+
+def _acquire_replica(user_id):
+    """
+    为读操作从副本借出连接，依次尝试可用副本
+    用户刚写入过、未配置副本或全部副本不可用时返回 None，由主库处理
+    """
+    replicas = get_replica_set()
+    if replicas is None or use_primary_for(user_id):
+        return None
+    for replica in replicas.candidates():
+        connection = replica.pool.acquire()
+        if connection is None:
+            replicas.mark_down(replica, "借出连接失败")
+            continue
+        if replicas.lag_check_due(replica) and not _lag_ok(connection):
+            replica.pool.release(connection)
+            replicas.mark_down(replica, "复制延迟过大")
+            continue
+        return connection
     return None
 
 
+def resolve_shard(intent=WRITE, user_id=None, shard=None):
+    """
+    决定连接所属的分片：显式指定的 shard，或 user_id 所在的分片，都没有时为主库
+    用户正在迁移时写入会抛出 ShardUnavailable
+    """
+    if shard is not None or user_id is None:
+        return shard or MAIN_SHARD
+    shard, moving = locate_user(user_id)
+    if moving and intent == WRITE:
+        raise ShardUnavailable(f"用户 {user_id} 正在迁移分片")
+    return shard
+
+
+def get_db_connection(intent=WRITE, user_id=None, shard=None):
+    """
+    借出一个数据库连接
+    启用分片时，传入 user_id 的连接来自该用户所在的分片（见 resolve_shard），否则来自主库
+    intent 为 READ 时主库上的读取优先使用读副本（user_id 用于读己之写），副本不可用时自动改用主库
+    使用完毕后需调用 close_db_resources 归还；分片不可用时返回 None
+    """
+    start = time.perf_counter() if _acquire_hooks else None
+    try:
+        shard = resolve_shard(intent, user_id, shard)
+    except ShardUnavailable as e:
+        print(e)
+        return None
+    connection = _acquire_replica(user_id) if intent == READ and shard == MAIN_SHARD else None
+    if connection is None:
+        connection = get_pool(shard).acquire()
+    if start is not None:
+        _run_hooks(_acquire_hooks, time.perf_counter() - start)
+    return connection
+
+
 def get_db_cursor(connection):
     """
     从现有连接获取数据库游标
@@ -28,7 +921,11 @@ def get_db_cursor(connection):
     if connection and connection.is_connected():
         try:
             cursor = connection.cursor(dictionary=True)  # 使用字典游标
-            return cursor
+            pool = _owning_pool(connection)
+            statements = pool.statements_for(connection) if pool is not None else None
+            if statements is not None:
+                cursor = StatementCursor(cursor, statements)
+            return _instrument(cursor, pool)
         except Error as e:
             print(f"获取游标失败: {e}")
             return None
@@ -39,23 +936,31 @@ def get_db_connection_and_cursor():
     """
     获取数据库连接和游标
     """
-    try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        if connection.is_connected():
-            cursor = connection.cursor(dictionary=True)  # 使用字典游标
+    connection = get_db_connection()
+    if connection:
+        cursor = get_db_cursor(connection)
+        if cursor:
             return connection, cursor
-    except Error as e:
-        print(f"数据库连接失败: {e}")
+        close_db_resources(connection)
     return None, None
 
 
-def close_db_resources(connection, cursor=None):
+def close_db_resources(connection, cursor=None, discard=False):
     """
-    关闭数据库连接和游标
+    关闭游标并归还数据库连接
+    连接池借出的连接归还到池中，其他连接直接关闭
     """
     if cursor:
-        cursor.close()
-    if connection and connection.is_connected():
+        try:
+            cursor.close()
+        except Error:
+            discard = True
+    if not connection:
+        return
+    pool = _owning_pool(connection)
+    if pool is not None:
+        pool.release(connection, discard=discard)
+    elif connection.is_connected():
         connection.close()
 
 
@@ -63,23 +968,86 @@ class DatabaseConnection:
     """
     数据库上下文管理器
     用于自动管理数据库连接和游标的获取与释放
+    连接从连接池借出，退出时归还
+    访问用户数据（任务、标签、统计）时传入 user_id，连接来自该用户所在的分片；
+    只读的查询另传入 intent=READ，可以交给读副本处理；shard 用于后台任务逐个分片处理（见 get_db_connection）
     """
 
-    def __init__(self):
+    def __init__(self, intent=WRITE, user_id=None, shard=None):
+        self.intent = intent
+        self.user_id = user_id
+        self.shard = shard
         self.connection = None
         self.cursor = None
 
     def __enter__(self):
-        self.connection = get_db_connection()
+        self.connection = get_db_connection(self.intent, self.user_id, self.shard)
         if not self.connection:
             print("无法获取数据库连接")
             return None, None
         self.cursor = get_db_cursor(self.connection)
         if not self.cursor:
             print("无法获取数据库游标")
-            close_db_resources(self.connection)
+            close_db_resources(self.connection, discard=True)
+            self.connection = None
             return None, None
         return self.connection, self.cursor
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        close_db_resources(self.connection, self.cursor)
+        # 数据库异常后连接状态不可信，直接丢弃
+        discard = exc_type is not None and issubclass(exc_type, Error)
+        close_db_resources(self.connection, self.cursor, discard=discard)
+
+
+class RowStream:
+    """
+    基于非缓冲游标的分块结果迭代器
+    每次迭代从服务端读取至多 chunk_size 行，内存占用与结果集大小无关
+    结果读完或调用 close() 时归还连接；未读完就关闭时丢弃该连接，避免残留结果影响复用
+    """
+
+    def __init__(self, connection, cursor, chunk_size):
+        self.connection = connection
+        self.cursor = cursor
+        self.chunk_size = chunk_size
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._closed:
+            raise StopIteration
+        try:
+            rows = self.cursor.fetchmany(self.chunk_size)
+        except Error:
+            self.close(discard=True)
+            raise
+        if not rows:
+            self.close()
+            raise StopIteration
+        return rows
+
+    def close(self, discard=False):
+        if self._closed:
+            return
+        self._closed = True
+        close_db_resources(self.connection, self.cursor, discard=discard)
+
+
+def stream_query(query, params=None, chunk_size=500, intent=WRITE, user_id=None, shard=None):
+    """
+    以非缓冲字典游标执行查询，返回 RowStream
+    intent / user_id / shard 同 DatabaseConnection；获取连接失败时返回 None
+    """
+    connection = get_db_connection(intent, user_id, shard)
+    if not connection:
+        return None
+    try:
+        cursor = _instrument(connection.cursor(dictionary=True, buffered=False), _owning_pool(connection))
+        cursor.execute(query, params)
+    except Error as e:
+        print(f"流式查询失败: {e}")
+        close_db_resources(connection, discard=True)
+        return None
+    return RowStream(connection, cursor, chunk_size)
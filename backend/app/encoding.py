@@ -0,0 +1,157 @@
+"""
+响应编码：更快的 JSON 序列化与按 Accept-Encoding 协商的压缩
+同步（Flask）与异步（Quart）两种服务模式共用
+"""
+import gzip
+from datetime import datetime, timezone
+
+try:
+    import orjson  # 可选依赖，未安装时使用框架默认的 JSON 序列化
+except ImportError:
+    orjson = None
+
+try:
+    import brotli  # 可选依赖，未安装时只提供 gzip
+except ImportError:
+    brotli = None
+
+# 响应编码配置
+# fast_json: 安装了 orjson 时用它序列化 JSON 响应
+# compress: 是否压缩响应
+# compress_min_size: 小于此字节数的响应不压缩，压缩收益抵不过 CPU 开销
+# gzip_level / brotli_quality: 压缩级别，取偏低的值以控制每个响应的 CPU 时间
+ENCODING_CONFIG = {
+    "fast_json": True,
+    "compress": True,
+    "compress_min_size": 1024,
+    "gzip_level": 6,
+    "brotli_quality": 4,
+}
+
+# 可压缩的响应类型
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html"}
+
+
+_WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def http_date(value):
+    """
+    把 datetime 格式化为 HTTP 日期（RFC 1123），与 Flask 默认 provider 的输出相同，无时区的值视为 UTC
+    任务行的多个时间列是序列化的主要开销，直接拼接比 email.utils / strftime 快
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return (
+        f"{_WEEKDAYS[value.weekday()]}, {value.day:02d} {_MONTHS[value.month - 1]} {value.year:04d} "
+        f"{value.hour:02d}:{value.minute:02d}:{value.second:02d} GMT"
+    )
+
+
+def make_json_provider(base):
+    """
+    基于框架默认 JSON provider（base）生成使用 orjson 的 provider
+    输出格式与默认 provider 一致（键同样排序，日期时间为 HTTP 日期），只是非 ASCII 字符不再转义；
+    Decimal、date 等其他类型仍交给 base 的 default 处理
+    """
+
+    class OrjsonProvider(base):
+        def _default(self, value):
+            if isinstance(value, datetime):
+                return http_date(value)
+            return self.default(value)
+
+        def dumps(self, obj, **kwargs):
+            # 调试模式下的缩进输出等非常规参数仍走默认实现
+            if kwargs:
+                return super().dumps(obj, **kwargs)
+            option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            return orjson.dumps(obj, default=self._default, option=option).decode()
+
+    return OrjsonProvider
+
+
+def install_json_provider(app, base):
+    """
+    按 ENCODING_CONFIG 为应用换用 orjson，返回是否生效
+    """
+    if not ENCODING_CONFIG["fast_json"] or orjson is None:
+        return False
+    app.json_provider_class = make_json_provider(base)
+    app.json = app.json_provider_class(app)
+    return True
+
+
+def available_encodings():
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=ENCODING_CONFIG["brotli_quality"])
+    return gzip.compress(data, compresslevel=ENCODING_CONFIG["gzip_level"])
+
+
+def compression_candidate(response):
+    """
+    响应是否可能被压缩：成功的、非流式的、尚未编码的可压缩类型
+    流式响应（导出）逐块生成，不在这里压缩
+    """
+    return (
+        ENCODING_CONFIG["compress"]
+        and 200 <= response.status_code < 300
+        and response.status_code != 204
+        and response.mimetype in COMPRESSIBLE_MIMETYPES
+        and "Content-Encoding" not in response.headers
+    )
+
+
+def choose_encoding(accept_encodings, size):
+    """
+    按客户端的 Accept-Encoding（含 q 值）与响应大小选择编码，不压缩时返回 None
+    同等权重时优先 br
+    """
+    if size < ENCODING_CONFIG["compress_min_size"]:
+        return None
+    return accept_encodings.best_match(available_encodings())
+
+
+def mark_encoded(response, encoding, data):
+    """
+    写入压缩后的响应体
+    编码后的表示与原表示不同，强 ETag 改为弱 ETag，If-None-Match 按弱比较仍能匹配
+    """
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def compress_response(response):
+    """
+    Flask after_request 钩子：按 Accept-Encoding 压缩响应
+    """
+    from flask import request
+
+    if not compression_candidate(response) or response.is_streamed or response.direct_passthrough:
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    encoding = choose_encoding(request.accept_encodings, len(data))
+    if encoding:
+        mark_encoded(response, encoding, compress(data, encoding))
+    return response
+
+
+def init_encoding(app):
+    """
+    为 Flask 应用启用 orjson 序列化与响应压缩
+    """
+    from flask.json.provider import DefaultJSONProvider
+
+    install_json_provider(app, DefaultJSONProvider)
+    app.after_request(compress_response)
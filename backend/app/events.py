@@ -0,0 +1,316 @@
+"""
+变更通知
+用户的任务或标签在任一工作进程中被修改（cache.invalidate）、或截止提醒到期时，
+向该用户已连接的客户端推送一条事件，客户端据此重新拉取（带 If-None-Match 或走 /changes 增量同步），
+不必每隔几秒轮询任务列表
+
+事件经跨进程通道（配置了 redis_url 时为 Redis 发布订阅，否则为只在本进程内投递的本地替身）
+到达每个工作进程，再由进程内的 EventHub 分发给该用户的订阅者；
+订阅者只是一个回调（把事件放入队列），空闲的订阅不占用线程或任务之外的资源
+
+事件：{"type": "change", "namespaces": ["tasks"], "at": 时间戳}
+      {"type": "reminder", "task_id": 1, "title": "...", "due_date": ..., "at": 时间戳}
+at 为发布时的时间戳，长轮询以它作为游标
+"""
+import json
+import threading
+import time
+from collections import OrderedDict, deque
+
+# 变更通知配置
+# enabled: 是否发布与推送事件
+# redis_url: 配置后经 Redis 发布订阅在工作进程之间传递事件（需要安装 redis 包），否则只在本进程内投递
+# channel: Redis 频道名
+# heartbeat: SSE 连接上发送心跳注释的间隔（秒），防止代理断开空闲连接
+# poll_timeout: 长轮询最长等待的秒数
+# max_subscribers: 每个进程最多的订阅数
+# max_per_user: 每个用户最多的订阅数（如同时打开的标签页）
+# recent_events: 每个用户保留的最近事件数，长轮询据此补发两次请求之间的事件
+# recent_users: 最多为多少个用户保留最近事件，超出时淘汰最久没有事件的用户
+EVENT_CONFIG = {
+    "enabled": True,
+    "redis_url": None,
+    "channel": "youtime:events",
+    "heartbeat": 25,
+    "poll_timeout": 30,
+    "max_subscribers": 10000,
+    "max_per_user": 20,
+    "recent_events": 20,
+    "recent_users": 10000,
+}
+
+
+class Subscription:
+    """
+    一个订阅：有事件时以事件调用 deliver，deliver 需立即返回（如放入队列）
+    """
+
+    __slots__ = ("user_id", "deliver")
+
+    def __init__(self, user_id, deliver):
+        self.user_id = user_id
+        self.deliver = deliver
+
+
+class EventHub:
+    """
+    进程内的事件分发：按用户保存订阅与最近的事件
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self._count = 0
+        self._listeners = []
+        self._stats = {"dispatched": 0, "delivered": 0, "rejected": 0}
+
+    def add_listener(self, listener):
+        """
+        注册进程级的监听者，本进程收到的每个事件（不论用户是否有订阅）都以 (user_id, event) 调用
+        """
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def subscribe(self, user_id, deliver):
+        """
+        订阅用户的事件，超出订阅数上限时返回 None
+        """
+        with self._lock:
+            subscribers = self._subscribers.setdefault(user_id, set())
+            if self._count >= EVENT_CONFIG["max_subscribers"] or len(subscribers) >= EVENT_CONFIG["max_per_user"]:
+                self._stats["rejected"] += 1
+                if not subscribers:
+                    del self._subscribers[user_id]
+                return None
+            subscription = Subscription(user_id, deliver)
+            subscribers.add(subscription)
+            self._count += 1
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is None or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            self._count -= 1
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+
+    def dispatch(self, user_id, event):
+        """
+        记录事件并投递给用户的所有订阅者，由跨进程通道在收到事件时调用
+        """
+        with self._lock:
+            recent = self._recent.pop(user_id, None)
+            if recent is None:
+                recent = deque(maxlen=EVENT_CONFIG["recent_events"])
+            recent.append(event)
+            self._recent[user_id] = recent
+            while len(self._recent) > EVENT_CONFIG["recent_users"]:
+                self._recent.popitem(last=False)
+            subscribers = list(self._subscribers.get(user_id, ()))
+            self._stats["dispatched"] += 1
+            self._stats["delivered"] += len(subscribers)
+        for listener in self._listeners:
+            try:
+                listener(user_id, event)
+            except Exception as e:
+                print(f"事件监听者执行失败: {e}")
+        for subscription in subscribers:
+            try:
+                subscription.deliver(event)
+            except Exception as e:
+                print(f"事件投递失败: {e}")
+
+    def events_since(self, user_id, since):
+        """
+        本进程收到的、时间戳晚于 since 的该用户事件
+        """
+        with self._lock:
+            recent = self._recent.get(user_id)
+            return [event for event in recent if event["at"] > since] if recent else []
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "subscribers": self._count, "users": len(self._subscribers)}
+
+
+class LocalChannel:
+    """
+    跨进程通道的本地替身：事件直接交给本进程的 EventHub
+    单进程部署、开发和测试时使用；多进程部署时其他进程的订阅者收不到事件
+    """
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def publish(self, user_id, event):
+        self.hub.dispatch(user_id, event)
+
+    def close(self):
+        pass
+
+
+class RedisChannel:
+    """
+    基于 Redis 发布订阅的跨进程通道
+    每个进程一个监听线程，收到的事件（包括本进程发布的）交给本进程的 EventHub
+    """
+
+    def __init__(self, url, hub, channel):
+        import redis  # 可选依赖，仅在配置了 redis_url 时需要
+
+        self.hub = hub
+        self.channel = channel
+        self._client = redis.Redis.from_url(url)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._listen, name="event-channel", daemon=True)
+        self._thread.start()
+
+    def publish(self, user_id, event):
+        try:
+            self._client.publish(self.channel, json.dumps({"user_id": user_id, "event": event}))
+        except Exception as e:
+            # Redis 不可用时至少投递给本进程的订阅者
+            print(f"事件发布失败: {e}")
+            self.hub.dispatch(user_id, event)
+
+    def _listen(self):
+        while not self._stop.is_set():
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message:
+                        data = json.loads(message["data"])
+                        self.hub.dispatch(data["user_id"], data["event"])
+                pubsub.close()
+            except Exception as e:
+                print(f"事件通道断开，稍后重连: {e}")
+                self._stop.wait(1)
+
+    def close(self):
+        self._stop.set()
+
+
+_hub = EventHub()
+_channel = None
+_channel_lock = threading.Lock()
+
+
+def get_hub():
+    return _hub
+
+
+def get_channel():
+    """
+    获取跨进程通道，首次调用时按 EVENT_CONFIG 创建
+    """
+    global _channel
+    if _channel is None:
+        with _channel_lock:
+            if _channel is None:
+                if EVENT_CONFIG["redis_url"]:
+                    _channel = RedisChannel(EVENT_CONFIG["redis_url"], _hub, EVENT_CONFIG["channel"])
+                else:
+                    _channel = LocalChannel(_hub)
+    return _channel
+
+
+def reset_events():
+    """
+    关闭跨进程通道，下次使用时重新创建；fork 之后子进程中不存在父进程的监听线程
+    """
+    global _channel
+    with _channel_lock:
+        channel, _channel = _channel, None
+    if channel is not None:
+        channel.close()
+
+
+def publish(user_id, event):
+    """
+    向用户的所有客户端（所有工作进程中的订阅者）发布事件，未启用时不做任何事
+    """
+    if not EVENT_CONFIG["enabled"]:
+        return
+    get_channel().publish(user_id, {**event, "at": time.time()})
+
+
+def publish_change(user_id, namespaces):
+    publish(user_id, {"type": "change", "namespaces": list(namespaces)})
+
+
+def publish_reminders(reminders):
+    """
+    提醒钩子：把到期提醒推送给对应用户
+    """
+    from .encoding import http_date
+
+    for reminder in reminders:
+        due_date = reminder["due_date"]
+        publish(
+            reminder["user_id"],
+            {
+                "type": "reminder",
+                "task_id": reminder["task_id"],
+                "title": reminder["title"],
+                "due_date": http_date(due_date) if hasattr(due_date, "weekday") else due_date,
+            },
+        )
+
+
+def parse_since(value):
+    """
+    解析长轮询的游标（上次响应中的 cursor），返回 (时间戳, 错误信息)；未提供时为 None
+    """
+    if value is None:
+        return None, None
+    try:
+        since = float(value)
+    except ValueError:
+        return None, "无效的游标"
+    return since, None
+
+
+def poll_timeout(args):
+    """
+    长轮询的等待秒数：查询参数 timeout，不超过 poll_timeout
+    """
+    try:
+        timeout = float(args.get("timeout", EVENT_CONFIG["poll_timeout"]))
+    except ValueError:
+        timeout = EVENT_CONFIG["poll_timeout"]
+    return max(0.0, min(timeout, EVENT_CONFIG["poll_timeout"]))
+
+
+def sse_message(event):
+    """
+    把事件编码为一条 SSE 消息，id 为事件的时间戳，断线重连时浏览器以 Last-Event-ID 带回
+    """
+    return f"id: {event['at']!r}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+def sse_preamble():
+    # 断线后浏览器等待 3 秒再重连
+    return "retry: 3000\n\n"
+
+
+SSE_HEARTBEAT = ": ping\n\n"
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def poll_result(events, since):
+    """
+    长轮询的响应体：{"cursor": 下次请求带上的游标, "events": [...]}
+    首次请求（没有游标）时游标为当前时间
+    """
+    cursor = events[-1]["at"] if events else (time.time() if since is None else since)
+    return {"cursor": repr(cursor), "events": events}
+
+
+def event_stats():
+    return _hub.stats()
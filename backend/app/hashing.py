@@ -0,0 +1,208 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# 密码哈希配置
+# method: 新哈希使用的算法及参数，登录成功时旧参数的哈希会自动按此重新生成
+# workers: 计算哈希的进程数，为 0 时在请求线程中直接计算
+# start_method: 哈希进程的启动方式；工作进程中已有连接池、调度等线程，fork 出的子进程可能继承被占用的锁，
+#               因此使用 forkserver（不支持的平台上用 spawn）
+# max_pending: 排队与计算中的哈希任务上限，超出时立即拒绝；超时的哈希在计算结束前仍占用名额
+# timeout: 等待单个哈希结果的最长时间（秒）
+HASH_CONFIG = {
+    "method": "scrypt:32768:8:1",
+    "workers": 2,
+    "start_method": "forkserver",
+    "max_pending": 32,
+    "timeout": 10.0,
+}
+
+
+class HashPoolBusy(Exception):
+    """
+    哈希进程池已满
+    """
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(password_hash, password):
+    return check_password_hash(password_hash, password)
+
+
+_executor = None
+_slots = None
+# 重新哈希完成后写库的线程，不占用进程池的结果线程
+_writer = None
+_lock = threading.Lock()
+_stats = {
+    "hash": {"count": 0, "seconds_total": 0.0, "seconds_max": 0.0},
+    "verify": {"count": 0, "seconds_total": 0.0, "seconds_max": 0.0},
+    "rejected": 0,
+    "rehashed": 0,
+}
+
+
+def _get_executor():
+    global _executor, _slots, _writer
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _slots = threading.BoundedSemaphore(HASH_CONFIG["max_pending"])
+                if HASH_CONFIG["workers"] > 0:
+                    _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rehash-writer")
+                    _executor = ProcessPoolExecutor(
+                        max_workers=HASH_CONFIG["workers"],
+                        mp_context=multiprocessing.get_context(HASH_CONFIG["start_method"]),
+                    )
+                else:
+                    _executor = False
+    return _executor
+
+
+def shutdown_hash_pool():
+    """
+    关闭哈希进程池与写库线程，下次使用时按 HASH_CONFIG 重新创建
+    """
+    global _executor, _slots, _writer
+    with _lock:
+        executor, _executor, _slots = _executor, None, None
+        writer, _writer = _writer, None
+    if executor:
+        executor.shutdown(wait=False, cancel_futures=True)
+    if writer:
+        writer.shutdown(wait=False)
+
+
+def _record(operation, seconds):
+    with _lock:
+        stats = _stats[operation]
+        stats["count"] += 1
+        stats["seconds_total"] += seconds
+        if seconds > stats["seconds_max"]:
+            stats["seconds_max"] = seconds
+
+
+def _run(operation, func, *args):
+    """
+    在进程池中执行哈希计算并等待结果
+    排队任务已达上限或等待超时时抛出 HashPoolBusy
+    """
+    executor = _get_executor()
+    slots = _slots
+    if not slots.acquire(blocking=False):
+        with _lock:
+            _stats["rejected"] += 1
+        raise HashPoolBusy()
+    start = time.monotonic()
+    if not executor:
+        try:
+            result = func(*args)
+        finally:
+            slots.release()
+        _record(operation, time.monotonic() - start)
+        return result
+    future = _submit(executor, slots, func, *args)
+    try:
+        result = future.result(timeout=HASH_CONFIG["timeout"])
+    except TimeoutError:
+        # 仍在排队的任务直接取消；已开始计算的不能中断，计算结束前继续占用名额
+        future.cancel()
+        with _lock:
+            _stats["rejected"] += 1
+        raise HashPoolBusy()
+    _record(operation, time.monotonic() - start)
+    return result
+
+
+def _submit(executor, slots, func, *args):
+    """
+    提交哈希任务，任务结束（完成、失败或被取消）时归还名额
+    """
+    try:
+        future = executor.submit(func, *args)
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
+def hash_password(password):
+    """
+    生成密码哈希
+    """
+    return _run("hash", _hash, password, HASH_CONFIG["method"])
+
+
+def verify_password(password_hash, password):
+    """
+    校验密码
+    """
+    return _run("verify", _verify, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """
+    判断哈希是否使用了与当前配置不同的算法或参数
+    """
+    return password_hash.split("$", 1)[0] != HASH_CONFIG["method"]
+
+
+def rehash_in_background(password, on_done):
+    """
+    在进程池中按当前配置重新生成哈希，完成后在写库线程中以新哈希调用 on_done
+    进程池繁忙时放弃本次重新哈希，下次登录再试；workers 为 0 时直接计算
+    """
+    executor = _get_executor()
+    slots, writer = _slots, _writer
+    if not slots.acquire(blocking=False):
+        return
+    if not executor:
+        try:
+            on_done(_hash(password, HASH_CONFIG["method"]))
+        finally:
+            slots.release()
+        with _lock:
+            _stats["rehashed"] += 1
+        return
+    future = _submit(executor, slots, _hash, password, HASH_CONFIG["method"])
+
+    def store(new_hash):
+        try:
+            on_done(new_hash)
+        except Exception as e:
+            print(f"重新生成密码哈希失败: {e}")
+            return
+        with _lock:
+            _stats["rehashed"] += 1
+
+    def done(f):
+        # 在进程池的结果线程中执行，只取出结果，写库交给写库线程
+        if f.cancelled():
+            return
+        try:
+            new_hash = f.result()
+            writer.submit(store, new_hash)
+        except Exception as e:
+            print(f"重新生成密码哈希失败: {e}")
+
+    future.add_done_callback(done)
+
+
+def hash_stats():
+    """
+    哈希统计信息（各操作次数与耗时、拒绝次数、重新哈希次数）
+    """
+    with _lock:
+        return {
+            "hash": dict(_stats["hash"]),
+            "verify": dict(_stats["verify"]),
+            "rejected": _stats["rejected"],
+            "rehashed": _stats["rehashed"],
+        }
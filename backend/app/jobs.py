@@ -0,0 +1,323 @@
+"""
+后台清理任务
+- purge: 彻底删除软删除超过墓碑保留期（TOMBSTONE_RETENTION_DAYS）的任务和标签
+- delete_user: 异步删除账号，按表分批删除用户的数据，最后删除 users 中的行
+
+任务记录在 jobs 表中，每批删除与进度（阶段、已处理到的主键）在同一事务中提交，
+进程中断后由任意进程从记录的位置继续；执行中的任务持有租约，租约过期后可被其他进程接手
+启用分片时 jobs 表在主库，分片上的一批删除先在分片提交、再在主库记录进度，
+两者之间中断时重跑这一批，已删除的行不会再被选出
+
+多进程部署时每个工作进程都会启动任务线程，各自每 poll_interval 秒查询一次 jobs 表（走 idx_status 索引），
+并每 purge_interval 秒尝试提交清理任务（已有未完成的清理任务时不重复提交）；
+工作进程较多时可在配置中关闭 enabled，只在一个单独的进程中运行 python -m app.jobs 或启用任务线程
+
+    python -m app.jobs             # 执行所有待处理的任务后退出
+    python -m app.jobs purge       # 先提交一次清理任务再执行
+"""
+import threading
+import time
+
+from mysql.connector import Error
+
+from .db import MAIN_SHARD, DatabaseConnection, ShardUnavailable, locate_user, shard_names
+
+# 后台任务配置
+# enabled: 是否在应用进程中运行任务线程，开启时每个工作进程各运行一个（见模块说明）；
+#          关闭时需另行运行 python -m app.jobs，否则账号删除不会执行
+# batch_size: 每批删除的行数
+# pause: 每批之间暂停的秒数，让出行锁和 IO 给在线请求
+# poll_interval: 检查待处理任务的间隔（秒）
+# purge_interval: 自动提交清理任务的间隔（秒），0 表示不自动清理
+# lease: 执行中任务的租约（秒），每批提交时续期
+# max_attempts: 连续失败多少次后标记为失败
+JOB_CONFIG = {
+    "enabled": True,
+    "batch_size": 500,
+    "pause": 0.05,
+    "poll_interval": 30,
+    "purge_interval": 3600,
+    "lease": 60,
+    "max_attempts": 5,
+}
+
+# 任务状态，与 schema.sql 中的注释一致
+PENDING, RUNNING, DONE, FAILED = 0, 1, 2, 3
+JOB_STATUS_NAMES = {PENDING: "pending", RUNNING: "running", DONE: "done", FAILED: "failed"}
+
+# 各类任务按顺序执行的阶段：(表, 过滤条件, 所在位置)
+# 位置 all 为每个分片（含主库）各一个阶段，user 为用户数据所在的分片，main 为主库
+# 每批先按主键顺序选出下一批 id（一致性读，不加锁），再按 id 删除并重新检查条件
+# delete_user 按 is_deleted 分两个阶段删除任务，两者都能沿 (user_id, is_deleted) 索引按 id 顺序扫描；
+# task_tags 与 task_stats 随任务、标签和用户级联删除，分片上的 users 占位行最后删除，user_shards 随主库的用户级联删除
+JOB_STAGES = {
+    "purge": (
+        ("tasks", "is_deleted = 1 AND updated_at < NOW() - INTERVAL %s DAY", "all"),
+        ("tags", "is_deleted = 1 AND updated_at < NOW() - INTERVAL %s DAY", "all"),
+    ),
+    "delete_user": (
+        ("tasks", "user_id = %s AND is_deleted = 0", "user"),
+        ("tasks", "user_id = %s AND is_deleted = 1", "user"),
+        ("tags", "user_id = %s", "user"),
+        ("users", "id = %s", "user"),
+        ("users", "id = %s", "main"),
+    ),
+}
+
+JOB_COLUMNS = "id, kind, user_id, status, stage, position, processed, attempts, error, created_at, updated_at"
+
+INSERT_JOB = "INSERT INTO jobs (kind, user_id) VALUES (%s, %s)"
+# 已有未完成的清理任务时不再提交
+INSERT_PURGE_JOB = (
+    "INSERT INTO jobs (kind) SELECT 'purge' FROM DUAL "
+    "WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE kind = 'purge' AND status < %s)"
+)
+CLAIM_JOB = (
+    "SELECT id, kind, user_id, stage, position, attempts FROM jobs "
+    "WHERE status < %s AND (locked_until IS NULL OR locked_until < NOW()) "
+    "ORDER BY id LIMIT 1 FOR UPDATE SKIP LOCKED"
+)
+LEASE_JOB = (
+    "UPDATE jobs SET status = %s, attempts = attempts + 1, locked_until = NOW() + INTERVAL %s SECOND "
+    "WHERE id = %s"
+)
+CHECKPOINT_JOB = (
+    "UPDATE jobs SET stage = %s, position = %s, processed = processed + %s, "
+    "locked_until = NOW() + INTERVAL %s SECOND WHERE id = %s"
+)
+FINISH_JOB = "UPDATE jobs SET status = %s, locked_until = NULL, error = NULL WHERE id = %s"
+FAIL_JOB = "UPDATE jobs SET status = %s, locked_until = NULL, error = %s WHERE id = %s"
+LIST_JOBS = f"SELECT {JOB_COLUMNS} FROM jobs ORDER BY id DESC LIMIT %s"
+SELECT_JOB = f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = %s"
+
+
+def _stage_params(job):
+    if job["kind"] == "purge":
+        # 延迟导入：墓碑保留期定义在任务路由中，清理不能早于增量同步还可能需要的墓碑
+        from .routes.tasks import TOMBSTONE_RETENTION_DAYS
+
+        return (TOMBSTONE_RETENTION_DAYS,)
+    return (job["user_id"],)
+
+
+def job_stages(job):
+    """
+    展开任务的阶段为 [(分片, 表, 过滤条件)]，阶段序号即 jobs.stage
+    分片列表按名称排序，只要分片配置不变，中断后展开的结果与之前相同；
+    未启用分片时所有阶段都在主库，重复的阶段（分片与主库上的 users）只保留一个；
+    用户正在迁移分片时抛出 ShardUnavailable，任务稍后重试
+    """
+    stages = []
+    for table, condition, scope in JOB_STAGES[job["kind"]]:
+        if scope == "all":
+            shards = shard_names()
+        elif scope == "user":
+            shard, moving = locate_user(job["user_id"])
+            if moving:
+                raise ShardUnavailable(f"用户 {job['user_id']} 正在迁移分片")
+            shards = [shard]
+        else:
+            shards = [MAIN_SHARD]
+        for shard in shards:
+            if (shard, table, condition) not in stages:
+                stages.append((shard, table, condition))
+    return stages
+
+
+def enqueue_job(cursor, kind, user_id=None):
+    """
+    在调用方的事务中提交任务，返回任务id
+    """
+    cursor.execute(INSERT_JOB, (kind, user_id))
+    return cursor.lastrowid
+
+
+def enqueue_purge():
+    """
+    提交一次清理任务，返回任务id；已有未完成的清理任务时不重复提交，返回 0
+    数据库连接失败时返回 None
+    """
+    with DatabaseConnection() as (conn, cursor):
+        if not conn or not cursor:
+            return None
+        cursor.execute(INSERT_PURGE_JOB, (DONE,))
+        conn.commit()
+        return cursor.lastrowid if cursor.rowcount else 0
+
+
+def _claim(conn, cursor):
+    """
+    领取一个待处理或租约已过期的任务，没有时返回 None
+    """
+    cursor.execute(CLAIM_JOB, (DONE,))
+    job = cursor.fetchone()
+    if job:
+        cursor.execute(LEASE_JOB, (RUNNING, JOB_CONFIG["lease"], job["id"]))
+    conn.commit()
+    return job
+
+
+def _delete_batch(cursor, table, condition, params, position, batch_size):
+    """
+    按主键顺序删除 position 之后的一批行，返回 (选出的 id, 删除的行数)
+    """
+    cursor.execute(
+        f"SELECT id FROM {table} WHERE id > %s AND {condition} ORDER BY id LIMIT %s",
+        (position,) + params + (batch_size,),
+    )
+    ids = [row["id"] for row in cursor.fetchall()]
+    if not ids:
+        return ids, 0
+    placeholders = ",".join(["%s"] * len(ids))
+    cursor.execute(f"DELETE FROM {table} WHERE id IN ({placeholders}) AND {condition}", tuple(ids) + params)
+    return ids, cursor.rowcount
+
+
+def _run_batch(conn, cursor, job, stages, batch_size):
+    """
+    执行一批删除并记录进度，返回任务是否已完成
+    主库上的阶段删除与进度在同一事务中提交；分片上的阶段先提交删除，再提交进度
+    """
+    shard, table, condition = stages[job["stage"]]
+    params = _stage_params(job)
+    if shard == MAIN_SHARD:
+        ids, deleted = _delete_batch(cursor, table, condition, params, job["position"], batch_size)
+    else:
+        with DatabaseConnection(shard=shard) as (shard_conn, shard_cursor):
+            if not shard_conn or not shard_cursor:
+                raise Error(f"无法连接分片 {shard}")
+            ids, deleted = _delete_batch(shard_cursor, table, condition, params, job["position"], batch_size)
+            shard_conn.commit()
+
+    if len(ids) < batch_size:
+        job["stage"], job["position"] = job["stage"] + 1, 0
+    else:
+        job["position"] = ids[-1]
+    cursor.execute(
+        CHECKPOINT_JOB,
+        (job["stage"], job["position"], deleted, JOB_CONFIG["lease"], job["id"]),
+    )
+    conn.commit()
+    job["processed"] = job.get("processed", 0) + deleted
+    return job["stage"] >= len(stages)
+
+
+def _finish(job):
+    if job["kind"] == "delete_user":
+        from .cache import invalidate
+
+        invalidate(job["user_id"], "tasks", "tags")
+
+
+def run_job(job, batch_size=None, pause=None):
+    """
+    从记录的阶段和位置继续执行一个已领取的任务，直到完成
+    """
+    batch_size = batch_size or JOB_CONFIG["batch_size"]
+    pause = JOB_CONFIG["pause"] if pause is None else pause
+    try:
+        stages = job_stages(job)
+        while True:
+            with DatabaseConnection() as (conn, cursor):
+                if not conn or not cursor:
+                    return False
+                if _run_batch(conn, cursor, job, stages, batch_size):
+                    cursor.execute(FINISH_JOB, (DONE, job["id"]))
+                    conn.commit()
+                    break
+            time.sleep(pause)
+    except (Error, ShardUnavailable) as e:
+        with DatabaseConnection() as (conn, cursor):
+            if conn and cursor:
+                status = FAILED if job["attempts"] + 1 >= JOB_CONFIG["max_attempts"] else PENDING
+                cursor.execute(FAIL_JOB, (status, str(e), job["id"]))
+                conn.commit()
+        print(f"后台任务 {job['id']} 执行失败: {e}")
+        return False
+    _finish(job)
+    return True
+
+
+def run_pending_jobs(max_jobs=None):
+    """
+    依次领取并执行任务，直到没有可领取的任务，返回执行完成的任务数
+    """
+    finished = 0
+    while max_jobs is None or finished < max_jobs:
+        with DatabaseConnection() as (conn, cursor):
+            if not conn or not cursor:
+                break
+            job = _claim(conn, cursor)
+        if not job or not run_job(job):
+            break
+        finished += 1
+    return finished
+
+
+def list_jobs(limit=50):
+    with DatabaseConnection() as (conn, cursor):
+        if not conn or not cursor:
+            return None
+        cursor.execute(LIST_JOBS, (limit,))
+        jobs = cursor.fetchall()
+    for job in jobs:
+        job["status"] = JOB_STATUS_NAMES.get(job["status"], job["status"])
+    return jobs
+
+
+_runner = None
+_runner_stop = threading.Event()
+_runner_wake = threading.Event()
+
+
+def notify_job_runner():
+    """
+    提交任务后唤醒本进程的任务线程，不必等到下一次轮询
+    """
+    _runner_wake.set()
+
+
+def _run_loop():
+    last_purge = None
+    while not _runner_stop.is_set():
+        _runner_wake.clear()
+        try:
+            interval = JOB_CONFIG["purge_interval"]
+            if interval and (last_purge is None or time.monotonic() - last_purge >= interval):
+                enqueue_purge()
+                last_purge = time.monotonic()
+            run_pending_jobs()
+        except Error as e:
+            print(f"后台任务调度失败: {e}")
+        _runner_wake.wait(JOB_CONFIG["poll_interval"])
+
+
+def start_job_runner():
+    """
+    按 JOB_CONFIG 启动后台任务线程，未启用时不做任何事
+    多个进程同时运行时通过租约和 SKIP LOCKED 分担任务，同一任务不会被重复执行
+    """
+    global _runner
+    if not JOB_CONFIG["enabled"] or _runner is not None:
+        return
+    _runner_stop.clear()
+    _runner = threading.Thread(target=_run_loop, name="job-runner", daemon=True)
+    _runner.start()
+
+
+def stop_job_runner():
+    global _runner
+    _runner_stop.set()
+    _runner_wake.set()
+    _runner = None
+
+
+if __name__ == "__main__":
+    import sys
+
+    from .config import apply_config, load_config
+
+    apply_config(load_config())
+    if "purge" in sys.argv[1:]:
+        enqueue_purge()
+    print(f"完成 {run_pending_jobs()} 个任务")
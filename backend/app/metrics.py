@@ -0,0 +1,313 @@
+import re
+import threading
+import time
+from functools import lru_cache
+
+from flask import g, request
+
+# 延迟直方图的分桶上限（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    """
+    按标签计数的计数器
+    """
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Gauge:
+    """
+    仪表，可直接设置数值，或在采集时调用 func 获取 {标签值元组: 数值}
+    """
+
+    def __init__(self, name, help_text, labels=(), func=None):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.func = func
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        if self.func:
+            values = self.func()
+        else:
+            with self._lock:
+                values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    按标签统计的直方图
+    """
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            item = self._values.get(label_values)
+            if item is None:
+                item = self._values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            counts = item[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            item[1] += value
+            item[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, [list(v[0]), v[1], v[2]]) for key, v in self._values.items())
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, label_values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+_registry = []
+
+
+def register(metric):
+    """
+    注册指标，/metrics 按注册顺序输出
+    """
+    _registry.append(metric)
+    return metric
+
+
+def render_metrics():
+    """
+    以 Prometheus 文本格式输出所有已注册指标
+    多进程部署时每个工作进程各自统计
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+_IN_LIST = re.compile(r"\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)")
+# 多行 INSERT 的 VALUES (...), (...), ...，各组先由 _IN_LIST 合并为 (...)
+_ROW_GROUPS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_NUMBER = re.compile(r"\b\d+\b")
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'")
+_SPACES = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(statement):
+    """
+    SQL 语句指纹：去掉字面量、合并 IN 列表、多行 VALUES 和空白，使同一形状的语句归为一类
+    行数不同的批量写入属于同一类，指纹的取值个数不随批量大小增长
+    """
+    text = _STRING.sub("?", statement)
+    text = _NUMBER.sub("?", text)
+    text = _IN_LIST.sub("(...)", text)
+    text = _ROW_GROUPS.sub("(...)", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+http_requests = register(
+    Counter("youtime_http_requests_total", "HTTP 请求数", ("method", "endpoint", "status"))
+)
+http_latency = register(
+    Histogram("youtime_http_request_duration_seconds", "HTTP 请求耗时", ("method", "endpoint"))
+)
+http_in_flight = register(Gauge("youtime_http_requests_in_flight", "处理中的 HTTP 请求数"))
+db_acquire_latency = register(
+    Histogram("youtime_db_connection_acquire_seconds", "从连接池获取连接的耗时")
+)
+db_query_latency = register(
+    Histogram("youtime_db_query_duration_seconds", "SQL 语句执行耗时", ("statement",))
+)
+db_query_errors = register(
+    Counter("youtime_db_query_errors_total", "SQL 语句执行失败次数", ("statement",))
+)
+
+
+def _endpoint():
+    return request.url_rule.rule if request.url_rule else "<unmatched>"
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_in_flight = True
+    http_in_flight.inc()
+
+
+def _after_request(response):
+    start = g.pop("metrics_start", None)
+    if start is not None:
+        endpoint = _endpoint()
+        http_latency.observe(time.perf_counter() - start, request.method, endpoint)
+        http_requests.inc(request.method, endpoint, str(response.status_code))
+    return response
+
+
+def _teardown_request(exc):
+    if g.pop("metrics_in_flight", False):
+        http_in_flight.dec()
+
+
+def _on_acquire(seconds):
+    db_acquire_latency.observe(seconds)
+
+
+def _on_query(statement, params, seconds, rowcount, error, shard):
+    key = fingerprint(statement)
+    db_query_latency.observe(seconds, key)
+    if error is not None:
+        db_query_errors.inc(key)
+
+
+def _collect_pool():
+    from .db import get_pool_stats
+
+    stats = get_pool_stats()
+    return {(name,): stats[name] for name in ("in_use", "idle", "size", "timeouts", "wait_total_seconds")}
+
+
+def _collect_shard_pools():
+    from .db import get_shard_pool_stats
+
+    return {
+        (shard, name): stats[name]
+        for shard, stats in get_shard_pool_stats().items()
+        for name in ("in_use", "idle", "size", "timeouts", "wait_total_seconds")
+    }
+
+
+def _collect_replicas():
+    from .db import get_replica_stats
+
+    return {
+        (replica, name): value for replica, stats in get_replica_stats().items() for name, value in stats.items()
+    }
+
+
+def _collect_prepared():
+    from .db import prepared_stats
+
+    return {(name,): value for name, value in prepared_stats().items()}
+
+
+def _collect_cache():
+    from .cache import cache_stats
+
+    return {(name,): value for name, value in cache_stats().items()}
+
+
+def _collect_hashing():
+    from .hashing import hash_stats
+
+    stats = hash_stats()
+    values = {("rejected",): stats["rejected"], ("rehashed",): stats["rehashed"]}
+    for operation in ("hash", "verify"):
+        for name, value in stats[operation].items():
+            values[(f"{operation}_{name}",)] = value
+    return values
+
+
+def _collect_reminders():
+    from .reminders import reminder_stats
+
+    return {(name,): value for name, value in reminder_stats().items()}
+
+
+def _collect_admission():
+    from .admission import admission_stats
+
+    return {(name,): value for name, value in admission_stats().items()}
+
+
+def _collect_events():
+    from .events import event_stats
+
+    return {(name,): value for name, value in event_stats().items()}
+
+
+def _collect_stats_reconcile():
+    from .stats import reconcile_totals
+
+    return {(name,): value for name, value in reconcile_totals().items()}
+
+
+register(Gauge("youtime_db_pool", "数据库连接池状态", ("stat",), func=_collect_pool))
+register(Gauge("youtime_db_shard_pool", "各分片的数据库连接池状态", ("shard", "stat"), func=_collect_shard_pools))
+register(Gauge("youtime_db_replica", "读副本状态（up、in_use、failures）", ("replica", "stat"), func=_collect_replicas))
+register(Gauge("youtime_db_prepared_statements", "预处理语句缓存统计", ("stat",), func=_collect_prepared))
+register(Gauge("youtime_cache", "列表缓存统计", ("stat",), func=_collect_cache))
+register(Gauge("youtime_password_hashing", "密码哈希进程池统计", ("stat",), func=_collect_hashing))
+register(Gauge("youtime_reminders", "截止提醒调度统计", ("stat",), func=_collect_reminders))
+register(Gauge("youtime_admission", "准入控制（并发上限、处理中与排队的请求数、拒绝次数）", ("stat",), func=_collect_admission))
+register(Gauge("youtime_events", "变更通知（订阅数、分发与投递的事件数）", ("stat",), func=_collect_events))
+register(Gauge("youtime_task_stats_reconcile", "任务统计对账累计结果", ("stat",), func=_collect_stats_reconcile))
+
+
+def init_metrics(app):
+    """
+    为应用注册请求统计中间件，并在数据库层挂载连接获取与 SQL 执行的计时钩子
+    """
+    from .db import add_acquire_hook, add_query_hook
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    add_acquire_hook(_on_acquire)
+    add_query_hook(_on_query)
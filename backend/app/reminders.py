@@ -0,0 +1,392 @@
+"""
+截止提醒调度
+用最小堆保存即将到期的任务，按 idx_due_date 索引分批增量加载未来 lookahead 秒内的截止时间，
+到期时再确认任务仍未关闭（未完成、未归档）、未删除且截止时间未变，然后通知提醒钩子
+
+多进程部署时每个进程都会各自提醒一次，应只在一个进程中启用（或单独运行 python -m app.reminders）
+启用分片时每个分片（含主库）各有一个调度器，各自扫描所在库的 idx_due_date
+
+到期提醒作为事件发布（见 app/events.py），每个工作进程从事件通道收到后保存最近的提醒，
+GET /api/tasks/reminders 在任一进程中都能读到；多进程部署时需配置 events.redis_url，
+否则只有运行调度器的进程收到提醒；关闭 events.enabled 时提醒不会发布
+"""
+import heapq
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import date, datetime, timedelta
+
+from mysql.connector import Error
+
+from .db import MAIN_SHARD, DatabaseConnection, ShardUnavailable, locate_user, shard_names
+from .events import get_hub, poll_result, publish_reminders
+
+# 提醒调度配置
+# enabled: 是否在应用进程中运行调度线程
+# lookahead: 预先加载多少秒内到期的任务
+# lead_time: 提前多少秒提醒
+# batch_size: 每次从数据库加载的任务数
+# poll_interval: 检查到期任务的间隔（秒）
+# refresh_interval: 重新加载已加载时间窗的间隔（秒），用于发现其他进程修改的截止时间
+# max_pending: 每个进程为每个用户保留的最近提醒数
+# max_users: 每个进程最多为多少个用户保留提醒，超出时淘汰最久没有提醒的用户
+REMINDER_CONFIG = {
+    "enabled": False,
+    "lookahead": 3600,
+    "lead_time": 0,
+    "batch_size": 500,
+    "poll_interval": 30,
+    "refresh_interval": 300,
+    "max_pending": 50,
+    "max_users": 10000,
+}
+
+# 已关闭的任务状态（已完成、已归档），不再算作逾期，也不再提醒
+CLOSED_STATUSES = ("2", "3")
+
+# 键集位置中的最大任务id，(t, MAX_TASK_ID) 表示截止时间严格晚于 t
+MAX_TASK_ID = 2**63 - 1
+
+# 按 (due_date, id) 键集分批读取时间窗内的任务，走 idx_due_date 范围扫描
+LOAD_WINDOW = (
+    "SELECT id, user_id, due_date FROM tasks "
+    "WHERE due_date >= %s AND (due_date > %s OR id > %s) AND due_date < %s "
+    "AND is_deleted = 0 AND status NOT IN (%s, %s) "
+    "ORDER BY due_date, id LIMIT %s"
+)
+
+
+def _as_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class ReminderScheduler:
+    """
+    基于最小堆的截止提醒调度器
+    堆中元素为 (提醒时间, 任务id)，_entries 记录每个任务当前的截止时间和用户；
+    截止时间变化时直接压入新元素，旧元素在弹出时因与 _entries 不一致而被丢弃
+    shard 为调度器读取的分片
+    """
+
+    def __init__(
+        self, lookahead=3600, lead_time=0, batch_size=500, poll_interval=30, refresh_interval=300, shard=MAIN_SHARD, **_
+    ):
+        self.shard = shard
+        self.lookahead = timedelta(seconds=lookahead)
+        self.lead_time = timedelta(seconds=lead_time)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.refresh_interval = refresh_interval
+        self._heap = []
+        self._entries = {}
+        # 已加载到的位置 (due_date, id)，之前的截止时间都已在堆中
+        self._watermark = None
+        self._last_refresh = time.monotonic()
+        self._hooks = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {"loaded": 0, "fired": 0, "stale": 0, "load_queries": 0}
+
+    def add_hook(self, hook):
+        """
+        注册提醒钩子，到期时以 [{"task_id", "user_id", "title", "due_date"}, ...] 调用
+        """
+        if hook not in self._hooks:
+            self._hooks.append(hook)
+
+    def _push(self, task_id, user_id, due_date):
+        self._entries[task_id] = (due_date, user_id)
+        heapq.heappush(self._heap, (due_date - self.lead_time, task_id))
+
+    def _load(self, cursor, start, end):
+        """
+        加载 [start, end) 内的截止时间，返回加载到的最后位置
+        """
+        position = start
+        while True:
+            cursor.execute(
+                LOAD_WINDOW,
+                (position[0], position[0], position[1], end, *CLOSED_STATUSES, self.batch_size),
+            )
+            rows = cursor.fetchall()
+            with self._lock:
+                self._stats["load_queries"] += 1
+                for row in rows:
+                    self._push(row["id"], row["user_id"], row["due_date"])
+                self._stats["loaded"] += len(rows)
+            if len(rows) < self.batch_size:
+                return (end, 0)
+            position = (rows[-1]["due_date"], rows[-1]["id"])
+
+    def _extend(self, cursor, now):
+        """
+        把加载窗口推进到 now + lookahead，只读取新进入窗口的部分
+        """
+        horizon = now + self.lookahead + self.lead_time
+        start = self._watermark or (now, 0)
+        if start[0] < horizon:
+            self._watermark = self._load(cursor, start, horizon)
+
+    def _refresh(self, cursor, now):
+        """
+        重新加载已加载但尚未提醒的时间窗，发现其他进程新建或提前的截止时间
+        只扫描已加载的时间窗，代价与窗口内的任务数成正比
+        需在 _pop_due 之后调用：提醒时间不晚于 now 的任务已经弹出，不能再次加载
+        加载失败时恢复刷新之前的堆
+        """
+        if self._watermark is None:
+            return
+        with self._lock:
+            heap, entries = self._heap, self._entries
+            self._heap = []
+            self._entries = {}
+        try:
+            self._load(cursor, (now + self.lead_time, MAX_TASK_ID), self._watermark[0])
+        except Error:
+            with self._lock:
+                self._heap, self._entries = heap, entries
+            raise
+
+    def _pop_due(self, now):
+        due = {}
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                remind_at, task_id = heapq.heappop(self._heap)
+                entry = self._entries.get(task_id)
+                if entry is None or entry[0] - self.lead_time != remind_at:
+                    self._stats["stale"] += 1
+                    continue
+                del self._entries[task_id]
+                due[task_id] = entry
+        return due
+
+    def _restore(self, due):
+        """
+        把已弹出但未能确认的提醒放回堆中，下次调度时重试
+        期间截止时间被重新登记的任务以新登记的为准
+        """
+        with self._lock:
+            for task_id, (due_date, user_id) in due.items():
+                if task_id not in self._entries:
+                    self._push(task_id, user_id, due_date)
+
+    def _confirm(self, cursor, due):
+        """
+        确认到期的任务仍未关闭、未删除，截止时间也没有变化
+        """
+        placeholders = ",".join(["%s"] * len(due))
+        cursor.execute(
+            "SELECT id, user_id, title, due_date FROM tasks "
+            f"WHERE id IN ({placeholders}) AND is_deleted = 0 AND status NOT IN (%s, %s)",
+            tuple(due) + CLOSED_STATUSES,
+        )
+        reminders = []
+        for row in cursor.fetchall():
+            if row["due_date"] == due[row["id"]][0]:
+                reminders.append(
+                    {"task_id": row["id"], "user_id": row["user_id"], "title": row["title"], "due_date": row["due_date"]}
+                )
+        with self._lock:
+            self._stats["stale"] += len(due) - len(reminders)
+        return reminders
+
+    def tick(self, now=None):
+        """
+        执行一次调度：推进加载窗口、必要时刷新，并通知已到期的提醒
+        返回本次发出的提醒
+        """
+        now = now or datetime.now()
+        with DatabaseConnection(shard=self.shard) as (conn, cursor):
+            if not conn or not cursor:
+                return []
+            self._extend(cursor, now)
+            due = self._pop_due(now)
+            try:
+                reminders = self._confirm(cursor, due) if due else []
+            except Error:
+                self._restore(due)
+                raise
+            if time.monotonic() - self._last_refresh >= self.refresh_interval:
+                # 刷新失败不影响已确认的提醒，下次调度时重新刷新
+                try:
+                    self._refresh(cursor, now)
+                    self._last_refresh = time.monotonic()
+                except Error as e:
+                    print(f"刷新提醒时间窗失败: {e}")
+        if reminders:
+            with self._lock:
+                self._stats["fired"] += len(reminders)
+            for hook in self._hooks:
+                try:
+                    hook(reminders)
+                except Exception as e:
+                    print(f"提醒钩子执行失败: {e}")
+        return reminders
+
+    def schedule(self, task_id, user_id, due_date):
+        """
+        登记新建或修改了截止时间的任务
+        只处理已加载时间窗内的截止时间，窗口之外的会在窗口推进时按索引加载
+        """
+        due_date = _as_datetime(due_date)
+        with self._lock:
+            if self._watermark is None:
+                return
+            if due_date is None or due_date >= self._watermark[0] or due_date < datetime.now():
+                self._entries.pop(task_id, None)
+                return
+            self._push(task_id, user_id, due_date)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Error as e:
+                print(f"提醒调度失败: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"reminder-scheduler-{self.shard}", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._entries)
+            stats["heap_size"] = len(self._heap)
+        return stats
+
+
+# 分片名 -> 调度器
+_schedulers = {}
+_scheduler_lock = threading.Lock()
+# 用户id -> 最近的提醒事件，由事件监听者在每个进程中填充
+_pending = OrderedDict()
+_pending_lock = threading.Lock()
+
+
+def _keep_pending(user_id, event):
+    """
+    事件监听者：按用户保存本进程收到的提醒事件，供 GET /api/tasks/reminders 读取
+    """
+    if event.get("type") != "reminder":
+        return
+    with _pending_lock:
+        queue = _pending.pop(user_id, None)
+        if queue is None:
+            queue = deque(maxlen=REMINDER_CONFIG["max_pending"])
+        queue.append({key: value for key, value in event.items() if key != "type"})
+        _pending[user_id] = queue
+        while len(_pending) > REMINDER_CONFIG["max_users"]:
+            _pending.popitem(last=False)
+
+
+get_hub().add_listener(_keep_pending)
+
+
+def pending_reminders(user_id, since=None):
+    """
+    用户时间戳晚于 since 的最近提醒（since 为 None 时为全部保留的提醒）
+    返回 {"reminders": [{"task_id", "title", "due_date"}, ...], "cursor": 下次请求带上的游标}
+    提醒在每个进程中各保留一份，读取时不清除，客户端以 cursor 作为下次的 since
+    """
+    with _pending_lock:
+        queue = _pending.get(user_id)
+        reminders = [r for r in queue if since is None or r["at"] > since] if queue else []
+    cursor = poll_result(reminders, since)["cursor"]
+    return {"reminders": [{key: value for key, value in r.items() if key != "at"} for r in reminders], "cursor": cursor}
+
+
+def get_scheduler(shard=MAIN_SHARD):
+    """
+    获取当前进程中分片 shard 的调度器，未启用时返回 None
+    """
+    return _schedulers.get(shard)
+
+
+def start_scheduler():
+    """
+    按 REMINDER_CONFIG 为每个分片创建并启动调度线程，未启用时不做任何事
+    """
+    if not REMINDER_CONFIG["enabled"]:
+        return None
+    with _scheduler_lock:
+        for shard in shard_names():
+            if shard not in _schedulers:
+                scheduler = _schedulers[shard] = ReminderScheduler(shard=shard, **REMINDER_CONFIG)
+                scheduler.add_hook(publish_reminders)
+                scheduler.start()
+    return get_scheduler()
+
+
+def stop_scheduler():
+    """
+    停止并丢弃调度器；fork 之后子进程中不存在父进程的线程，需要重新启动
+    """
+    with _scheduler_lock:
+        schedulers = list(_schedulers.values())
+        _schedulers.clear()
+    for scheduler in schedulers:
+        scheduler.stop()
+
+
+def schedule_task(task_id, user_id, due_date):
+    """
+    任务新建或截止时间变化后调用，交给用户所在分片的调度器；调度器未运行时不做任何事
+    无法确定分片时跳过，调度器刷新时间窗时会重新加载
+    """
+    if not _schedulers:
+        return
+    try:
+        shard = locate_user(user_id)[0]
+    except (Error, ShardUnavailable):
+        return
+    scheduler = _schedulers.get(shard)
+    if scheduler is not None:
+        scheduler.schedule(task_id, user_id, due_date)
+
+
+def reminder_stats():
+    """
+    各分片调度器统计之和
+    """
+    totals = {}
+    for scheduler in list(_schedulers.values()):
+        for name, value in scheduler.stats().items():
+            totals[name] = totals.get(name, 0) + value
+    return totals
+
+
+if __name__ == "__main__":
+    # 独立运行调度器，到期提醒输出到标准输出，并经事件通道发布给各工作进程
+    from .config import apply_config, load_config
+
+    apply_config(load_config())
+    schedulers = [ReminderScheduler(shard=shard, **REMINDER_CONFIG) for shard in shard_names()]
+    for scheduler in schedulers:
+        scheduler.add_hook(lambda reminders: [print(f"提醒: {r}") for r in reminders])
+        scheduler.add_hook(publish_reminders)
+        scheduler.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for scheduler in schedulers:
+            scheduler.stop()
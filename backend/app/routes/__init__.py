@@ -1,5 +1,10 @@
 from .users import user_bp as users_bp
 from .tasks import task_bp as tasks_bp
+from .bulk import bulk_bp
+from .tags import tag_bp
+from .metrics import metrics_bp
+from .admin import admin_bp
+from .events import event_bp
 
 def register_blueprints(app):
     '''
@@ -8,3 +13,8 @@ def register_blueprints(app):
     '''
     app.register_blueprint(users_bp)
     app.register_blueprint(tasks_bp)
+    app.register_blueprint(bulk_bp)
+    app.register_blueprint(tag_bp)
+    app.register_blueprint(event_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(admin_bp)
@@ -0,0 +1,69 @@
+import hmac
+
+from flask import Blueprint, current_app, jsonify, request
+
+from ..db import DatabaseConnection
+from ..jobs import JOB_STATUS_NAMES, SELECT_JOB, enqueue_purge, list_jobs, notify_job_runner
+from ..slowlog import slow_queries
+
+admin_bp = Blueprint("admin", __name__, url_prefix="/api/admin")
+
+
+@admin_bp.before_request
+def require_admin_token():
+    """
+    管理接口需要在请求头 X-Admin-Token 中提供配置的 admin_token
+    未配置 admin_token 时管理接口不可用
+    """
+    expected = current_app.config.get("ADMIN_TOKEN")
+    provided = request.headers.get("X-Admin-Token", "")
+    if not expected or not hmac.compare_digest(provided, expected):
+        return jsonify({"error": "无权限"}), 403
+
+
+@admin_bp.route("/slow-queries", methods=["GET"])
+def get_slow_queries():
+    """
+    查看最近的慢查询及其执行计划
+    需要在配置中启用 slow_query.enabled，开启 slow_query.explain 时附带 EXPLAIN 结果
+    """
+    return jsonify(slow_queries()), 200
+
+
+@admin_bp.route("/jobs", methods=["GET"])
+def get_jobs():
+    """
+    查看最近的后台任务（清理、账号删除）及其进度
+    stage 为当前阶段序号，position 为该阶段已处理到的主键，processed 为已删除的行数
+    """
+    jobs = list_jobs()
+    if jobs is None:
+        return jsonify({"error": "数据库连接失败"}), 500
+    return jsonify(jobs), 200
+
+
+@admin_bp.route("/jobs/<int:job_id>", methods=["GET"])
+def get_job(job_id):
+    with DatabaseConnection() as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        cursor.execute(SELECT_JOB, (job_id,))
+        job = cursor.fetchone()
+    if not job:
+        return jsonify({"error": "任务未找到"}), 404
+    job["status"] = JOB_STATUS_NAMES.get(job["status"], job["status"])
+    return jsonify(job), 200
+
+
+@admin_bp.route("/jobs/purge", methods=["POST"])
+def create_purge_job():
+    """
+    立即提交一次清理任务，已有未完成的清理任务时返回 409
+    """
+    job_id = enqueue_purge()
+    if job_id is None:
+        return jsonify({"error": "数据库连接失败"}), 500
+    if not job_id:
+        return jsonify({"error": "已有未完成的清理任务"}), 409
+    notify_job_runner()
+    return jsonify({"job_id": job_id}), 202
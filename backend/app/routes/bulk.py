@@ -0,0 +1,58 @@
+from flask import Blueprint, jsonify, request, session
+
+from ..bulk import IMPORT_FORMATS, import_format, import_tasks, iter_lines
+from ..cache import invalidate
+from ..reminders import schedule_task
+
+bulk_bp = Blueprint("bulk", __name__, url_prefix="/api/tasks")
+
+
+def _import_format(req):
+    """
+    导入格式：查询参数 format 优先，否则按 Content-Type 判断
+    """
+    fmt = req.args.get("format") or import_format(req.content_type)
+    return fmt if fmt in IMPORT_FORMATS else None
+
+
+def _on_import_commit(user_id):
+    """
+    每批提交后失效缓存并通知提醒调度器，导入过程中的读取也能看到已提交的部分
+    """
+
+    def on_commit(tasks):
+        invalidate(user_id, "tasks", "tags")
+        for task_id, due_date in tasks:
+            schedule_task(task_id, user_id, due_date)
+
+    return on_commit
+
+
+@bulk_bp.route("/import", methods=["POST"])
+def import_tasks_route():
+    """
+    批量导入任务
+    请求体为 NDJSON（Content-Type: application/x-ndjson）或 CSV（text/csv，首行为列名），
+    也可用查询参数 format=ndjson|csv 指定
+    每条记录的字段与 POST /api/tasks/ 相同，另可提供 tags: 标签名数组（CSV 中以 ; 分隔），不存在的标签会被创建
+    请求体边读边写入，每 500 条一个事务，校验失败的记录不影响其他记录
+    返回:
+    {
+        "imported": 9998,
+        "failed": 2,
+        "errors": [{"line": 17, "error": "缺少必要字段"}],
+        "errors_truncated": false
+    }
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    fmt = _import_format(request)
+    if not fmt:
+        return jsonify({"error": "无效的导入格式"}), 400
+
+    report = import_tasks(user_id, iter_lines(request.stream), fmt, _on_import_commit(user_id))
+    if report is None:
+        return jsonify({"error": "数据库连接失败"}), 500
+    return jsonify(report.to_dict()), 200
@@ -0,0 +1,96 @@
+import queue
+
+from flask import Blueprint, current_app, jsonify, request, session
+
+from ..events import (
+    EVENT_CONFIG,
+    SSE_HEADERS,
+    SSE_HEARTBEAT,
+    get_hub,
+    parse_since,
+    poll_result,
+    poll_timeout,
+    sse_message,
+    sse_preamble,
+)
+
+event_bp = Blueprint("events", __name__, url_prefix="/api/events")
+
+
+def _too_many():
+    return jsonify({"error": "连接数过多"}), 429, {"Retry-After": str(EVENT_CONFIG["poll_timeout"])}
+
+
+@event_bp.route("/", methods=["GET"])
+def stream_events():
+    """
+    以 SSE（text/event-stream）推送当前用户的变更与提醒事件，事件格式见 app/events.py
+    断线重连时按 Last-Event-ID 补发本进程收到的、之后的事件
+    同步模式下每个连接占用一个工作线程，大量客户端长连接时应使用异步服务模式
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+    last_id, _ = parse_since(request.headers.get("Last-Event-ID"))
+    events = queue.SimpleQueue()
+    hub = get_hub()
+    subscription = hub.subscribe(user_id, events.put)
+    if subscription is None:
+        return _too_many()
+    # 订阅之后再取补发的事件，两者都有的事件只发送一次
+    missed = hub.events_since(user_id, last_id) if last_id is not None else []
+    replayed = {event["at"] for event in missed}
+
+    def generate():
+        yield sse_preamble()
+        for event in missed:
+            yield sse_message(event)
+        while True:
+            try:
+                event = events.get(timeout=EVENT_CONFIG["heartbeat"])
+            except queue.Empty:
+                yield SSE_HEARTBEAT
+                continue
+            if event["at"] not in replayed:
+                yield sse_message(event)
+
+    response = current_app.response_class(generate(), mimetype="text/event-stream", headers=SSE_HEADERS)
+    # 客户端断开后取消订阅
+    response.call_on_close(lambda: hub.unsubscribe(subscription))
+    return response
+
+
+@event_bp.route("/poll", methods=["GET"])
+def poll_events():
+    """
+    长轮询：有晚于 since 的事件时立即返回，否则最多等待 timeout 秒（不超过 poll_timeout）
+    返回 {"cursor": "...", "events": [...]}，下次请求以 cursor 作为 since；
+    首次请求不带 since，立即返回当前游标
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+    since, error = parse_since(request.args.get("since"))
+    if error:
+        return jsonify({"error": error}), 400
+    if since is None:
+        return jsonify(poll_result([], None)), 200
+
+    hub = get_hub()
+    events = hub.events_since(user_id, since)
+    if not events:
+        arrived = queue.SimpleQueue()
+        subscription = hub.subscribe(user_id, arrived.put)
+        if subscription is None:
+            return _too_many()
+        try:
+            # 订阅之后再查一次，避免错过两次检查之间到达的事件
+            events = hub.events_since(user_id, since)
+            if not events:
+                try:
+                    events = [arrived.get(timeout=poll_timeout(request.args))]
+                except queue.Empty:
+                    pass
+        finally:
+            hub.unsubscribe(subscription)
+    return jsonify(poll_result(events, since)), 200
@@ -0,0 +1,14 @@
+from flask import Blueprint
+
+from ..metrics import render_metrics
+
+metrics_bp = Blueprint("metrics", __name__)
+
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Prometheus 指标（文本格式）
+    包括各接口的请求数、耗时直方图、处理中请求数，以及连接池、SQL 执行、缓存和密码哈希的统计
+    """
+    return render_metrics(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
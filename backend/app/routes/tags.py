@@ -1,29 +1,144 @@
 from flask import Blueprint, jsonify, request, session
-from ..db import DatabaseConnection
+from ..cache import invalidate, read_through
+from ..conditional import check_not_modified, json_with_etag, set_etag_headers
+from ..db import READ, DatabaseConnection, prepared
+from ..streaming import parse_stream_format, stream_rows
 
 tag_bp = Blueprint("tags", __name__, url_prefix="/api/tags")
 
+# 固定形状的高频语句，在每条池化连接上只预处理一次
+TAG_OWNED = prepared("SELECT 1 FROM tags WHERE id = %s AND user_id = %s AND is_deleted = 0")
+TASK_OWNED = prepared("SELECT 1 FROM tasks WHERE id = %s AND user_id = %s AND is_deleted = 0")
+TOUCH_TASK = prepared("UPDATE tasks SET updated_at = NOW() WHERE id = %s")
+LIST_TAGS = prepared(
+    "SELECT id, name, color, created_at, updated_at "
+    "FROM tags WHERE user_id = %s AND is_deleted = 0"
+)
+LIST_TAGS_WITH_COUNTS = prepared(
+    "SELECT g.id, g.name, g.color, g.created_at, g.updated_at, COUNT(t.id) AS task_count "
+    "FROM tags g "
+    "LEFT JOIN task_tags tt ON tt.tag_id = g.id "
+    "LEFT JOIN tasks t ON t.id = tt.task_id AND t.is_deleted = 0 "
+    "WHERE g.user_id = %s AND g.is_deleted = 0 "
+    "GROUP BY g.id"
+)
+INSERT_TAG = "INSERT INTO tags (user_id, name) VALUES (%s, %s)"
+RENAME_TAG = (
+    "UPDATE tags SET name = %s, updated_at = NOW() "
+    "WHERE id = %s AND user_id = %s AND is_deleted = 0"
+)
+SOFT_DELETE_TAG = (
+    "UPDATE tags SET is_deleted = 1, updated_at = NOW() "
+    "WHERE id = %s AND user_id = %s AND is_deleted = 0"
+)
+PURGE_TAG = "DELETE FROM tags WHERE id = %s AND user_id = %s"
+TOUCH_TASKS_OF_TAG = (
+    "UPDATE tasks t JOIN task_tags tt ON t.id = tt.task_id "
+    "SET t.updated_at = NOW() "
+    "WHERE tt.tag_id = %s AND t.user_id = %s"
+)
+ASSIGN_TAG = "INSERT IGNORE INTO task_tags (task_id, tag_id) VALUES (%s, %s)"
+REMOVE_TASK_TAG = (
+    "DELETE tt FROM task_tags tt "
+    "JOIN tasks t ON tt.task_id = t.id "
+    "WHERE tt.task_id = %s AND tt.tag_id = %s AND t.user_id = %s"
+)
+TASKS_OF_TAG = prepared(
+    "SELECT t.id, t.title, t.description, t.status, t.priority, t.due_date, t.created_at, t.updated_at "
+    "FROM tasks t "
+    "JOIN task_tags tt ON t.id = tt.task_id "
+    "WHERE tt.tag_id = %s AND t.user_id = %s AND t.is_deleted = 0"
+)
+
+
+def _touch_tasks_of_tag(cursor, tag_id: int, user_id: int):
+    """
+    刷新关联了该标签的任务的 updated_at，使标签改名、删除等变化出现在增量同步中
+    需在删除 task_tags 关联之前调用
+    """
+    cursor.execute(TOUCH_TASKS_OF_TAG, (tag_id, user_id))
+
+
+def _tag_name(data):
+    return data.get("name") if isinstance(data, dict) else None
+
+
+def _assign_args(data):
+    """
+    取出关联请求中的 (task_id, tag_ids)
+    """
+    data = data if isinstance(data, dict) else {}
+    return data.get("task_id"), data.get("tag_ids")
+
+
+def _remove_args(data):
+    """
+    取出解除关联请求中的 (task_id, tag_id)
+    """
+    data = data if isinstance(data, dict) else {}
+    return data.get("task_id"), data.get("tag_id")
+
+
+def _owned_tags_query(user_id: int, tag_ids: list):
+    """
+    取出 tag_ids 中属于该用户且未删除的标签
+    """
+    placeholders = ",".join(["%s"] * len(tag_ids))
+    return (
+        f"SELECT id FROM tags WHERE user_id = %s AND is_deleted = 0 AND id IN ({placeholders})",
+        tuple([user_id] + tag_ids),
+    )
+
+
+def _fetch_tags(user_id: int, with_counts: bool = False):
+    """
+    查询用户未删除的标签
+    with_counts 为 True 时用一条聚合查询附带每个标签下未删除任务的数量 task_count
+    结果按用户缓存，标签变更时失效（附带数量时任务变更也会失效）
+    """
+    if with_counts:
+        namespace = ("tags", "tasks")
+        query = LIST_TAGS_WITH_COUNTS
+    else:
+        namespace = "tags"
+        query = LIST_TAGS
+
+    def load():
+        with DatabaseConnection(READ, user_id) as (conn, cursor):
+            if not conn or not cursor:
+                return {"error": "数据库连接失败"}, 500
+            cursor.execute(query, (user_id,))
+            return cursor.fetchall(), 200
+
+    return read_through(namespace, user_id, [query], load)
+
+
 @tag_bp.route("/", methods=["GET"])
 def get_tags():
     """
     获取所有标签
     仅返回未删除的标签
     需要用户登录,依赖session中的user_id
+    查询参数(可选):
+    - include: 设为 counts 时每个标签附带 task_count
+    响应带 ETag，请求头 If-None-Match 匹配时返回 304
     """
     user_id = session.get("user_id")
     if not user_id:
         return jsonify({"error": "未登录"}), 401
 
-    with DatabaseConnection() as (conn, cursor):
-        if not conn or not cursor:
-            return jsonify({"error": "数据库连接失败"}), 500
-        cursor.execute(
-            "SELECT id, name, color, created_at, updated_at "
-            "FROM tags WHERE user_id = %s AND is_deleted = 0",
-            (user_id,),
-        )
-        tags = cursor.fetchall()
-    return jsonify(tags), 200
+    include = request.args.get("include")
+    if include not in (None, "counts"):
+        return jsonify({"error": "无效的 include 参数"}), 400
+    with_counts = include == "counts"
+
+    etag, not_modified = check_not_modified(user_id, "tags", *(["tasks"] if with_counts else []))
+    if not_modified:
+        return not_modified
+
+    result, status = _fetch_tags(user_id, with_counts)
+    return json_with_etag(result, status, etag)
+
 
 @tag_bp.route("/", methods=["POST"])
 def create_tag():
@@ -38,20 +153,16 @@ def create_tag():
     if not user_id:
         return jsonify({"error": "未登录"}), 401
 
-    data = request.get_json()
-    name = data.get("name")
-
+    name = _tag_name(request.get_json())
     if not name:
         return jsonify({"error": "缺少必要字段"}), 400
 
-    with DatabaseConnection() as (conn, cursor):
+    with DatabaseConnection(user_id=user_id) as (conn, cursor):
         if not conn or not cursor:
             return jsonify({"error": "数据库连接失败"}), 500
-        cursor.execute(
-            "INSERT INTO tags (user_id, name) VALUES (%s, %s)",
-            (user_id, name),
-        )
+        cursor.execute(INSERT_TAG, (user_id, name))
         conn.commit()
+    invalidate(user_id, "tags")
     return jsonify({"message": "标签创建成功"}), 201
 
 @tag_bp.route("/<int:tag_id>", methods=["PUT"])
@@ -67,23 +178,21 @@ def update_tag(tag_id):
     if not user_id:
         return jsonify({"error": "未登录"}), 401
 
-    data = request.get_json()
-    name = data.get("name")
-
+    name = _tag_name(request.get_json())
     if not name:
         return jsonify({"error": "缺少必要字段"}), 400
 
-    with DatabaseConnection() as (conn, cursor):
+    with DatabaseConnection(user_id=user_id) as (conn, cursor):
         if not conn or not cursor:
             return jsonify({"error": "数据库连接失败"}), 500
-        cursor.execute(
-            "UPDATE tags SET name = %s, updated_at = NOW() "
-            "WHERE id = %s AND user_id = %s AND is_deleted = 0",
-            (name, tag_id, user_id),
-        )
+        cursor.execute(RENAME_TAG, (name, tag_id, user_id))
         if cursor.rowcount == 0:
             return jsonify({"error": "标签未找到或无权限"}), 404
+        # 增量同步按任务返回附带的标签名，改名需出现在关联任务的变更中
+        _touch_tasks_of_tag(cursor, tag_id, user_id)
         conn.commit()
+    # 任务列表可以附带标签名（include=tags），改名后一并失效
+    invalidate(user_id, "tags", "tasks")
     return jsonify({"message": "标签更新成功"}), 200
 
 @tag_bp.route("/<int:tag_id>", methods=["DELETE"])
@@ -95,17 +204,15 @@ def delete_tag(tag_id):
     if not user_id:
         return jsonify({"error": "未登录"}), 401
 
-    with DatabaseConnection() as (conn, cursor):
+    with DatabaseConnection(user_id=user_id) as (conn, cursor):
         if not conn or not cursor:
             return jsonify({"error": "数据库连接失败"}), 500
-        cursor.execute(
-            "UPDATE tags SET is_deleted = 1, updated_at = NOW() "
-            "WHERE id = %s AND user_id = %s AND is_deleted = 0",
-            (tag_id, user_id),
-        )
+        cursor.execute(SOFT_DELETE_TAG, (tag_id, user_id))
         if cursor.rowcount == 0:
             return jsonify({"error": "标签未找到或无权限"}), 404
+        _touch_tasks_of_tag(cursor, tag_id, user_id)
         conn.commit()
+    invalidate(user_id, "tags", "tasks")
     return jsonify({"message": "标签删除成功"}), 200
 
 @tag_bp.route("/<int:tag_id>/purge", methods=["DELETE"])
@@ -117,16 +224,15 @@ def purge_tag(tag_id):
     if not user_id:
         return jsonify({"error": "未登录"}), 401
 
-    with DatabaseConnection() as (conn, cursor):
+    with DatabaseConnection(user_id=user_id) as (conn, cursor):
         if not conn or not cursor:
             return jsonify({"error": "数据库连接失败"}), 500
-        cursor.execute(
-            "DELETE FROM tags WHERE id = %s AND user_id = %s",
-            (tag_id, user_id),
-        )
+        _touch_tasks_of_tag(cursor, tag_id, user_id)
+        cursor.execute(PURGE_TAG, (tag_id, user_id))
         if cursor.rowcount == 0:
             return jsonify({"error": "标签未找到或无权限"}), 404
         conn.commit()
+    invalidate(user_id, "tags", "tasks")
     return jsonify({"message": "标签永久删除成功"}), 200
 
 @tag_bp.route("/<int:tag_id>/tasks", methods=["GET"])
@@ -134,29 +240,40 @@ def get_tasks_by_tag(tag_id):
     """
     获取指定标签下的所有任务
     需要用户登录,依赖session中的user_id
+    查询参数(可选):
+    - stream: json 或 ndjson，以流式响应返回结果
+    响应带 ETag，请求头 If-None-Match 匹配时返回 304
     """
     user_id = session.get("user_id")
     if not user_id:
         return jsonify({"error": "未登录"}), 401
 
-    with DatabaseConnection() as (conn, cursor):
+    fmt, error = parse_stream_format(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    etag, not_modified = check_not_modified(user_id, "tasks", "tags")
+    if not_modified:
+        return not_modified
+
+    query = TASKS_OF_TAG
+    with DatabaseConnection(READ, user_id) as (conn, cursor):
         if not conn or not cursor:
             return jsonify({"error": "数据库连接失败"}), 500
-        cursor.execute(
-            "SELECT 1 FROM tags WHERE id = %s AND user_id = %s AND is_deleted = 0",
-            (tag_id, user_id),
-        )
+        cursor.execute(TAG_OWNED, (tag_id, user_id))
         if not cursor.fetchone():
             return jsonify({"error": "标签未找到或无权限"}), 404
-        cursor.execute(
-            "SELECT t.id, t.title, t.description, t.status, t.priority, t.due_date, t.created_at, t.updated_at "
-            "FROM tasks t "
-            "JOIN task_tags tt ON t.id = tt.task_id "
-            "WHERE tt.tag_id = %s AND t.user_id = %s AND t.is_deleted = 0",
-            (tag_id, user_id),
-        )
-        tasks = cursor.fetchall()
-    return jsonify(tasks), 200
+        if not fmt:
+            cursor.execute(query, (tag_id, user_id))
+            tasks = cursor.fetchall()
+
+    if fmt:
+        response = stream_rows(query, (tag_id, user_id), fmt, intent=READ, user_id=user_id)
+        if response is None:
+            return jsonify({"error": "数据库连接失败"}), 500
+        set_etag_headers(response, etag)
+        return response
+    return json_with_etag(tasks, 200, etag)
 
 
 @tag_bp.route("/assign", methods=["POST"])
@@ -173,39 +290,28 @@ def assign_tags_to_task():
     if not user_id:
         return jsonify({"error": "未登录"}), 401
 
-    data = request.get_json()
-    task_id = data.get("task_id")
-    tag_ids = data.get("tag_ids")
-
+    task_id, tag_ids = _assign_args(request.get_json())
     if not task_id or not tag_ids or not isinstance(tag_ids, list):
         return jsonify({"error": "缺少参数"}), 400
 
-    with DatabaseConnection() as (conn, cursor):
+    with DatabaseConnection(user_id=user_id) as (conn, cursor):
         if not conn or not cursor:
             return jsonify({"error": "数据库连接失败"}), 500
 
-        cursor.execute(
-            "SELECT 1 FROM tasks WHERE id = %s AND user_id = %s AND is_deleted = 0",
-            (task_id, user_id),
-        )
+        cursor.execute(TASK_OWNED, (task_id, user_id))
         if not cursor.fetchone():
             return jsonify({"error": "任务未找到或无权限"}), 404
 
-        placeholders = ",".join(["%s"] * len(tag_ids))
-        cursor.execute(
-            f"SELECT id FROM tags WHERE user_id = %s AND is_deleted = 0 AND id IN ({placeholders})",
-            tuple([user_id] + tag_ids),
-        )
+        cursor.execute(*_owned_tags_query(user_id, tag_ids))
         valid_tag_ids = {row["id"] for row in cursor.fetchall()}
         if len(valid_tag_ids) != len(tag_ids):
             return jsonify({"error": "存在无效或无权限的标签"}), 400
 
         values = [(task_id, tag_id) for tag_id in valid_tag_ids]
-        cursor.executemany(
-            "INSERT IGNORE INTO task_tags (task_id, tag_id) VALUES (%s, %s)",
-            values,
-        )
+        cursor.executemany(ASSIGN_TAG, values)
+        cursor.execute(TOUCH_TASK, (task_id,))
         conn.commit()
+    invalidate(user_id, "tasks", "tags")
 
     return jsonify({"message": "标签关联成功"}), 200
 
@@ -224,24 +330,18 @@ def remove_tag_from_task():
     if not user_id:
         return jsonify({"error": "未登录"}), 401
 
-    data = request.get_json()
-    task_id = data.get("task_id")
-    tag_id = data.get("tag_id")
-
+    task_id, tag_id = _remove_args(request.get_json())
     if not task_id or not tag_id:
         return jsonify({"error": "缺少参数"}), 400
 
-    with DatabaseConnection() as (conn, cursor):
+    with DatabaseConnection(user_id=user_id) as (conn, cursor):
         if not conn or not cursor:
             return jsonify({"error": "数据库连接失败"}), 500
-        cursor.execute(
-            "DELETE tt FROM task_tags tt "
-            "JOIN tasks t ON tt.task_id = t.id "
-            "WHERE tt.task_id = %s AND tt.tag_id = %s AND t.user_id = %s",
-            (task_id, tag_id, user_id),
-        )
-        conn.commit()
+        cursor.execute(REMOVE_TASK_TAG, (task_id, tag_id, user_id))
         if cursor.rowcount == 0:
             return jsonify({"error": "关联未找到或无权限"}), 404
+        cursor.execute(TOUCH_TASK, (task_id,))
+        conn.commit()
+    invalidate(user_id, "tasks", "tags")
 
     return jsonify({"message": "标签移除成功"}), 200
@@ -1,31 +1,604 @@
+import base64
+import json
+import re
+from collections import Counter
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 from flask import Blueprint, jsonify, request, session
-from ..db import DatabaseConnection
+from ..cache import invalidate, read_through
+from ..conditional import check_not_modified, json_with_etag, set_etag_headers
+from ..db import READ, DatabaseConnection, prepared
+from ..events import parse_since
+from ..reminders import CLOSED_STATUSES, pending_reminders, schedule_task
+from ..stats import (
+    COUNT_OVERDUE,
+    READ_STATS,
+    TASK_PRIORITIES,
+    TASK_STATUSES,
+    apply_stats_deltas,
+    reconcile_user,
+    stat_key,
+    summarize,
+)
+from ..streaming import parse_stream_format, stream_rows
 from typing import List, Tuple
 
 task_bp = Blueprint("tasks", __name__, url_prefix="/api/tasks")
 
+# 分页默认条数与上限
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
 
-def _fetch_tasks(
-    user_id: int, extra_filters: List[str] | None = None, extra_values: List[str] | None = None
-) -> Tuple[list, int]:
-    filters = ["user_id = %s", "is_deleted = 0"]
-    values: List[str] = [user_id]
-    if extra_filters:
-        filters.extend(extra_filters)
+# 可排序字段，均有 (user_id, is_deleted, 字段) 联合索引支撑
+SORT_COLUMNS = {
+    "id": "id",
+    "due_date": "due_date",
+    "priority": "priority",
+    "created_at": "created_at",
+}
+NULLABLE_SORT_COLUMNS = {"due_date"}
+
+TASK_COLUMNS = "id, title, description, status, priority, due_date, created_at, updated_at"
+# fields 参数可选的字段
+TASK_FIELDS = tuple(TASK_COLUMNS.split(", "))
+# 流式导出附带标签时，用相关子查询按 task_tags 主键取出每个任务的标签，
+# 仍是一条按索引顺序输出的查询，不需要 GROUP BY 或第二条连接
+TASK_TAGS_COLUMN = (
+    "(SELECT JSON_ARRAYAGG(JSON_OBJECT('id', g.id, 'name', g.name)) FROM task_tags tt "
+    "JOIN tags g ON g.id = tt.tag_id "
+    "WHERE tt.task_id = tasks.id AND g.user_id = tasks.user_id AND g.is_deleted = 0) AS tags"
+)
+
+# 允许更新的字段
+UPDATABLE_FIELDS = ("title", "description", "status", "priority", "due_date")
+
+# 批量接口单次最多处理的操作数
+MAX_BATCH_SIZE = 500
+
+# 增量同步：每次最多返回的变更数
+CHANGES_PAGE_SIZE = 500
+# 增量同步：updated_at 在最近若干秒内的变更可能还有未提交的同时间戳写入，
+# 令牌不越过该窗口，客户端应按 id 幂等地合并重复返回的变更
+SYNC_SAFETY_WINDOW = 5
+# 软删除墓碑的保留天数，早于此的同步令牌需要全量同步；后台清理任务（app/jobs.py）据此彻底删除
+TOMBSTONE_RETENTION_DAYS = 30
+
+# 截止日期视图，均由 (user_id, is_deleted, due_date) 联合索引的范围扫描支撑
+# overdue: 已过截止时间且未完成、未归档；today: 今天到期；week: 今天起到本周日到期
+DUE_BUCKETS = ("overdue", "today", "week")
+DUE_DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d")
+
+# 基于 ft_title_description（ngram 分词）全文索引的检索条件
+FULLTEXT_MATCH = "MATCH(title, description) AGAINST (%s IN BOOLEAN MODE)"
+FULLTEXT_OPERATORS = re.compile(r'[+\-<>()~*"@]')
+
+# 按标签过滤：tags 须同时关联全部标签（AND），any_tags 关联其一即可（OR），exclude_tags 不关联其中任何一个（NOT）
+# 子查询经 task_tags 的 (tag_id, task_id) 索引按标签范围扫描，与其他条件合并为一条查询；
+# 关联只存在于同一用户的任务与标签之间，外层的 user_id 条件已限定范围，已删除的标签不参与匹配
+TAG_FILTER_PARAMS = ("tags", "any_tags", "exclude_tags")
+MAX_FILTER_TAGS = 20
+TAGGED_TASKS = (
+    "SELECT tt.task_id FROM task_tags tt JOIN tags g ON g.id = tt.tag_id "
+    "WHERE tt.tag_id IN ({}) AND g.is_deleted = 0"
+)
+
+# 固定形状的高频语句，在每条池化连接上只预处理一次
+INSERT_TASK = prepared(
+    "INSERT INTO tasks (user_id, title, description, status, priority, due_date) "
+    "VALUES (%s, %s, %s, %s, %s, %s)"
+)
+SOFT_DELETE_TASK = prepared(
+    "UPDATE tasks SET is_deleted = 1, updated_at = NOW() "
+    "WHERE id = %s AND user_id = %s AND is_deleted = 0"
+)
+PURGE_TASK = prepared("DELETE FROM tasks WHERE id = %s AND user_id = %s AND is_deleted = 1")
+SELECT_NOW = prepared("SELECT NOW() AS now")
+# 当前连接的自增步长；启用分片时各库按 auto_increment_increment 错开 id，步长可能大于 1
+AUTO_INCREMENT_STEP = prepared("SELECT @@auto_increment_increment AS step")
+# 修改状态或优先级前锁定任务并取出原值，用于更新统计计数
+LOCK_TASK_LEVELS = prepared(
+    "SELECT status, priority FROM tasks WHERE id = %s AND user_id = %s AND is_deleted = 0 FOR UPDATE"
+)
+# 软删除之后取出被删除任务的状态与优先级（本事务已持有行锁）
+TASK_LEVELS = prepared("SELECT status, priority FROM tasks WHERE id = %s")
+DUE_SUMMARY = prepared(
+    "SELECT COALESCE(SUM(due_date < %s AND status NOT IN (%s, %s)), 0) AS overdue, "
+    "COALESCE(SUM(due_date >= %s AND due_date < %s), 0) AS today, "
+    "COALESCE(SUM(due_date >= %s AND due_date < %s), 0) AS week "
+    "FROM tasks WHERE user_id = %s AND is_deleted = 0 AND due_date < %s"
+)
+
+
+def _encode_cursor(sort: str, value, task_id: int) -> str:
+    """
+    将上一页最后一条记录的排序值编码为不透明游标
+    """
+    if isinstance(value, (datetime, date)):
+        value = value.strftime("%Y-%m-%d %H:%M:%S")
+    raw = json.dumps([sort, value, task_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(token: str, sort: str):
+    """
+    解析游标，游标无效或与当前排序方式不一致时返回 None
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        cursor_sort, value, task_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (ValueError, TypeError):
+        return None
+    if cursor_sort != sort or not isinstance(task_id, int):
+        return None
+    return value, task_id
+
+
+def _keyset_condition(column: str, descending: bool, after_null: bool) -> str:
+    """
+    构造"位于游标之后"的过滤条件，以 id 作为同值时的次序
+    MySQL 升序时 NULL 排在最前，降序时排在最后
+    after_null 表示游标处的排序值为 NULL
+    """
+    op = "<" if descending else ">"
+    if column == "id":
+        return f"id {op} %s"
+    if after_null:
+        if descending:
+            return f"({column} IS NULL AND id < %s)"
+        return f"(({column} IS NULL AND id > %s) OR {column} IS NOT NULL)"
+    condition = f"({column} {op} %s OR ({column} = %s AND id {op} %s)"
+    if descending and column in NULLABLE_SORT_COLUMNS:
+        condition += f" OR {column} IS NULL"
+    return condition + ")"
+
+
+def _keyset_values(column: str, value, task_id: int) -> list:
+    """
+    _keyset_condition 对应的参数
+    """
+    if column == "id" or value is None:
+        return [task_id]
+    return [value, value, task_id]
+
+
+def _build_fulltext_query(text: str) -> str | None:
+    """
+    将用户输入的关键词转换为 BOOLEAN MODE 全文检索表达式
+    每个词都必须出现（+），并按前缀匹配（*）；去掉用户输入中的检索运算符
+    """
+    terms = []
+    for word in text.split():
+        word = FULLTEXT_OPERATORS.sub("", word)
+        if word:
+            terms.append(f"+{word}*")
+    return " ".join(terms) or None
+
+
+def _parse_page_args(args, searching: bool = False) -> Tuple[dict | None, str | None]:
+    """
+    解析分页与排序参数
+    - sort: 排序字段，前缀 "-" 表示降序，默认按 id 升序；
+      全文检索时可用 relevance（按相关度降序），且默认按相关度排序
+    - limit: 每页条数，提供 limit 或 cursor 时启用分页
+    - cursor: 上一页返回的 next_cursor
+    返回 (分页参数, 错误信息)
+    """
+    sort = args.get("sort", "relevance" if searching else "id")
+    if sort == "relevance":
+        if not searching:
+            return None, "无效的排序字段"
+        column, descending = "score", True
+    else:
+        descending = sort.startswith("-")
+        column = SORT_COLUMNS.get(sort.lstrip("-"))
+        if not column:
+            return None, "无效的排序字段"
+
+    page = {"sort": sort, "column": column, "descending": descending, "limit": None, "after": None}
+
+    limit = args.get("limit")
+    token = args.get("cursor")
+    if limit is None and token is None:
+        return page, None
+
+    try:
+        page["limit"] = int(limit) if limit is not None else DEFAULT_PAGE_SIZE
+    except ValueError:
+        return None, "无效的分页参数"
+    if page["limit"] <= 0:
+        return None, "无效的分页参数"
+    page["limit"] = min(page["limit"], MAX_PAGE_SIZE)
+
+    if token:
+        page["after"] = _decode_cursor(token, sort)
+        if page["after"] is None:
+            return None, "无效的游标"
+    return page, None
+
+
+@lru_cache(maxsize=256)
+def _task_statement(
+    extra_filters: Tuple[str, ...],
+    rank_expression: str | None,
+    column: str | None,
+    descending: bool,
+    after: str | None,
+    paginated: bool,
+    with_tags: bool = False,
+    fields: Tuple[str, ...] | None = None,
+) -> str:
+    """
+    按查询形状生成任务查询语句并登记为预处理语句
+    过滤条件、排序与分页的组合是有限的，每种形状只拼接一次
+    after: 游标类型，None 表示无游标，"null" 表示游标处排序值为 NULL，"value" 表示非 NULL
+    with_tags: 附带 tags 列（JSON 数组），用于流式导出
+    fields: 只查询这些列（见 _parse_fields），None 表示全部
+    """
+    filters = ["user_id = %s", "is_deleted = 0", *extra_filters]
+    columns = ", ".join(fields) if fields else TASK_COLUMNS
+    if rank_expression:
+        columns += f", {rank_expression} AS score"
+    if with_tags:
+        columns += f", {TASK_TAGS_COLUMN}"
+
+    having = ""
+    order = ""
+    if column:
+        direction = "DESC" if descending else "ASC"
+        if after is not None:
+            condition = _keyset_condition(column, descending, after == "null")
+            if column == "score":
+                # score 是查询列别名，只能在 HAVING 中引用
+                having = f" HAVING {condition}"
+            else:
+                filters.append(condition)
+        order = f" ORDER BY {column} {direction}"
+        if column != "id":
+            order += f", id {direction}"
+        if paginated:
+            # 多取一条用于判断是否还有下一页
+            order += " LIMIT %s"
+
+    return prepared(f"SELECT {columns} FROM tasks WHERE {' AND '.join(filters)}{having}{order}")
+
+
+def _build_task_query(
+    user_id: int,
+    extra_filters: List[str] | None = None,
+    extra_values: List[str] | None = None,
+    page: dict | None = None,
+    rank: Tuple[str, list] | None = None,
+    with_tags: bool = False,
+    fields: Tuple[str, ...] | None = None,
+) -> Tuple[str, tuple, int | None]:
+    """
+    构造任务查询语句
+    返回 (SQL, 参数, 每页条数)；启用分页时会多取一条用于判断是否还有下一页
+    """
+    values: list = list(rank[1]) if rank else []
+    values.append(user_id)
     if extra_values:
         values.extend(extra_values)
 
-    query = (
-        "SELECT id, title, description, status, priority, due_date, created_at, updated_at "
-        f"FROM tasks WHERE {' AND '.join(filters)}"
+    column = None
+    descending = False
+    after = None
+    limit = None
+    having_values: list = []
+    if page:
+        column = page["column"]
+        descending = page["descending"]
+        limit = page["limit"]
+        if page["after"] is not None:
+            after = "null" if page["after"][0] is None else "value"
+            keyset_values = _keyset_values(column, *page["after"])
+            if column == "score":
+                having_values.extend(keyset_values)
+            else:
+                values.extend(keyset_values)
+        if limit is not None:
+            having_values.append(limit + 1)
+
+    query = _task_statement(
+        tuple(extra_filters or ()),
+        rank[0] if rank else None,
+        column,
+        descending,
+        after,
+        limit is not None,
+        with_tags,
+        fields,
     )
+    return query, tuple(values + having_values), limit
 
-    with DatabaseConnection() as (conn, cursor):
-        if not conn or not cursor:
-            return {"error": "数据库连接失败"}, 500
-        cursor.execute(query, tuple(values))
-        tasks = cursor.fetchall()
-    return tasks, 200
+
+def _task_tags_query(user_id: int, tasks: list) -> Tuple[str, tuple]:
+    """
+    一条 IN 查询取出这一批任务的标签
+    """
+    task_ids = [task["id"] for task in tasks]
+    placeholders = ",".join(["%s"] * len(task_ids))
+    return (
+        "SELECT tt.task_id, g.id, g.name FROM task_tags tt "
+        "JOIN tags g ON g.id = tt.tag_id "
+        f"WHERE g.user_id = %s AND g.is_deleted = 0 AND tt.task_id IN ({placeholders})",
+        tuple([user_id] + task_ids),
+    )
+
+
+def _merge_tags(tasks: list, rows: list) -> list:
+    """
+    返回附带 tags 字段的新任务列表，不修改原任务（可能来自缓存）
+    """
+    tags_by_task = {}
+    for row in rows:
+        tags_by_task.setdefault(row["task_id"], []).append({"id": row["id"], "name": row["name"]})
+    return [dict(task, tags=tags_by_task.get(task["id"], [])) for task in tasks]
+
+
+def _decode_tags(row: dict) -> dict:
+    """
+    解码 TASK_TAGS_COLUMN 返回的 JSON，没有标签时为 NULL
+    """
+    tags = row.get("tags")
+    row["tags"] = json.loads(tags) if tags else []
+    return row
+
+
+def _attach_tags(cursor, user_id: int, tasks: list) -> list:
+    """
+    用一条 IN 查询取出这一批任务的标签，返回附带 tags 字段的新任务列表
+    """
+    if not tasks:
+        return tasks
+    cursor.execute(*_task_tags_query(user_id, tasks))
+    return _merge_tags(tasks, cursor.fetchall())
+
+
+def _parse_include(args) -> Tuple[bool, str | None]:
+    """
+    解析查询参数 include，目前只支持 tags
+    返回 (是否附带标签, 错误信息)
+    """
+    include = {part for part in args.get("include", "").split(",") if part}
+    if include - {"tags"}:
+        return False, "无效的 include 参数"
+    return "tags" in include, None
+
+
+def _parse_fields(args) -> Tuple[Tuple[str, ...] | None, str | None]:
+    """
+    解析查询参数 fields（逗号分隔的字段名），只查询并返回这些字段
+    id 总是返回（分页游标与标签合并需要）
+    返回 (字段元组, 错误信息)，未提供时字段为 None
+    """
+    value = args.get("fields")
+    if value is None:
+        return None, None
+    fields = [part.strip() for part in value.split(",") if part.strip()]
+    if not fields or set(fields) - set(TASK_FIELDS):
+        return None, "无效的 fields 参数"
+    return tuple(dict.fromkeys(["id", *fields])), None
+
+
+def _parse_list_args(
+    args, searching: bool = False
+) -> Tuple[dict | None, str | None, bool, Tuple[str, ...] | None, str | None]:
+    """
+    解析列表接口共用的 sort / limit / cursor / stream / include / fields 参数
+    返回 (分页参数, 流式格式, 是否附带标签, 字段, 错误信息)
+    指定 fields 时排序字段总会被查询出来，用于生成下一页游标
+    """
+    page, error = _parse_page_args(args, searching)
+    if error:
+        return None, None, False, None, error
+    fmt, error = parse_stream_format(args)
+    if error:
+        return None, None, False, None, error
+    include_tags, error = _parse_include(args)
+    if error:
+        return None, None, False, None, error
+    fields, error = _parse_fields(args)
+    if error:
+        return None, None, False, None, error
+    if fields and page["column"] in TASK_FIELDS and page["column"] not in fields:
+        fields += (page["column"],)
+    return page, fmt, include_tags, fields, None
+
+
+def _fetch_tasks(
+    user_id: int,
+    extra_filters: List[str] | None = None,
+    extra_values: List[str] | None = None,
+    page: dict | None = None,
+    rank: Tuple[str, list] | None = None,
+    include_tags: bool = False,
+    fields: Tuple[str, ...] | None = None,
+) -> Tuple[list | dict, int]:
+    """
+    查询用户未删除的任务
+    page 为 _parse_page_args 的结果；启用分页时按键集（keyset）方式翻页，
+    返回 {"tasks": [...], "next_cursor": ...}，否则返回完整列表
+    rank 为 (相关度表达式, 参数)，提供时结果附带 score 字段并可按相关度排序
+    include_tags 为 True 时每个任务附带 tags 字段；fields 为 _parse_fields 的结果
+    查询结果按用户和查询条件缓存，任务变更时失效
+    """
+    query, params, limit = _build_task_query(user_id, extra_filters, extra_values, page, rank, fields=fields)
+
+    def load():
+        with DatabaseConnection(READ, user_id) as (conn, cursor):
+            if not conn or not cursor:
+                return {"error": "数据库连接失败"}, 500
+            cursor.execute(query, params)
+            tasks = cursor.fetchall()
+            if include_tags:
+                tasks = _attach_tags(cursor, user_id, tasks)
+            return tasks, 200
+
+    namespace = ("tasks", "tags") if include_tags else "tasks"
+    tasks, status = read_through(namespace, user_id, [query, params, include_tags], load)
+    if status != 200:
+        return tasks, status
+    return _paginate(tasks, page, limit), 200
+
+
+def _paginate(tasks: list, page: dict | None, limit: int | None) -> list | dict:
+    """
+    处理多取的一条：截断到每页条数并生成 next_cursor
+    未启用分页时原样返回列表
+    """
+    if limit is None:
+        return tasks
+    next_cursor = None
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        last = tasks[-1]
+        next_cursor = _encode_cursor(page["sort"], last[page["column"]], last["id"])
+    return {"tasks": tasks, "next_cursor": next_cursor}
+
+
+def _stream_tasks(
+    fmt: str,
+    etag: str,
+    user_id: int,
+    extra_filters: List[str] | None = None,
+    extra_values: List[str] | None = None,
+    page: dict | None = None,
+    rank: Tuple[str, list] | None = None,
+    include_tags: bool = False,
+    fields: Tuple[str, ...] | None = None,
+):
+    """
+    以流式响应输出任务查询结果，不分页也不经过缓存
+    cursor 参数仍可用作起始位置；include_tags 时每行附带 tags，内存占用仍与结果集大小无关
+    """
+    if page:
+        page = dict(page, limit=None)
+    query, params, _ = _build_task_query(user_id, extra_filters, extra_values, page, rank, include_tags, fields)
+    response = stream_rows(query, params, fmt, _decode_tags if include_tags else None, READ, user_id)
+    if response is None:
+        return jsonify({"error": "数据库连接失败"}), 500
+    set_etag_headers(response, etag)
+    return response
+
+
+def _parse_level(value, allowed: tuple) -> int | None:
+    """
+    解析状态或优先级，接受整数或数字字符串，不在 allowed 中时返回 None
+    """
+    if isinstance(value, bool):
+        return None
+    try:
+        level = int(value)
+    except (TypeError, ValueError):
+        return None
+    return level if level in allowed else None
+
+
+def _task_row_for_create(data) -> Tuple[tuple | None, str | None]:
+    """
+    校验新建任务的数据，返回 (title, description, status, priority, due_date) 与错误信息
+    """
+    if not isinstance(data, dict):
+        return None, "缺少必要字段"
+    title = data.get("title")
+    if not title:
+        return None, "缺少必要字段"
+    status = _parse_level(data.get("status", "0"), TASK_STATUSES)
+    if status is None:
+        return None, "无效的任务状态"
+    priority = _parse_level(data.get("priority", "1"), TASK_PRIORITIES)
+    if priority is None:
+        return None, "无效的任务优先级"
+    return (
+        title,
+        data.get("description", ""),
+        status,
+        priority,
+        data.get("due_date"),
+    ), None
+
+
+@lru_cache(maxsize=64)
+def _update_statement(fields: Tuple[str, ...]) -> str:
+    """
+    按更新字段组合生成 UPDATE 语句并登记为预处理语句
+    """
+    return prepared(
+        f"UPDATE tasks SET {', '.join(fields)}, updated_at = NOW() "
+        "WHERE id = %s AND user_id = %s AND is_deleted = 0"
+    )
+
+
+def _task_fields_for_update(data) -> Tuple[List[str], list, str | None]:
+    """
+    校验更新任务的数据，只保留提供了值的字段
+    返回 (SET 子句列表, 对应的值, 错误信息)
+    """
+    fields: List[str] = []
+    values: list = []
+    if isinstance(data, dict):
+        for name in UPDATABLE_FIELDS:
+            if data.get(name):
+                value = data[name]
+                if name in ("status", "priority"):
+                    value = _parse_level(value, TASK_STATUSES if name == "status" else TASK_PRIORITIES)
+                    if value is None:
+                        return [], [], "无效的任务状态" if name == "status" else "无效的任务优先级"
+                fields.append(f"{name} = %s")
+                values.append(value)
+    if not fields:
+        return fields, values, "没有提供更新字段"
+    return fields, values, None
+
+
+def _changes_levels(fields: List[str]) -> bool:
+    """
+    更新是否涉及统计计数（状态或优先级）
+    """
+    return "status = %s" in fields or "priority = %s" in fields
+
+
+def _level_after_update(old: dict, fields: List[str], values: list) -> dict:
+    new = {"status": old["status"], "priority": old["priority"]}
+    for name in new:
+        if f"{name} = %s" in fields:
+            new[name] = values[fields.index(f"{name} = %s")]
+    return new
+
+
+def _update_stats_deltas(old: dict, fields: List[str], values: list) -> Counter:
+    """
+    一次更新对统计计数的增量：原位置减一，新位置加一
+    """
+    new = _level_after_update(old, fields, values)
+    deltas = Counter()
+    deltas[stat_key(old["status"], old["priority"])] -= 1
+    deltas[stat_key(new["status"], new["priority"])] += 1
+    return deltas
+
+
+def _delete_stats_deltas(row: dict) -> Counter:
+    return Counter({stat_key(row["status"], row["priority"]): -1})
+
+
+def _reschedule(user_id: int, task_id: int, fields: List[str], values: list):
+    """
+    更新了截止时间的任务通知提醒调度器
+    """
+    if "due_date = %s" in fields:
+        schedule_task(task_id, user_id, values[fields.index("due_date = %s")])
+
+
+def _schedule_batch(user_id: int, creates: list, updates: list, results: list):
+    """
+    批量操作提交后，把新建和更新了截止时间的任务通知提醒调度器
+    """
+    for index, row in creates:
+        schedule_task(results[index]["task_id"], user_id, row[4])
+    for index, task_id, fields, values in updates:
+        if results[index]["status"] == 200:
+            _reschedule(user_id, task_id, fields, values)
 
 
 @task_bp.route("/", methods=["GET"])
@@ -34,15 +607,31 @@ def get_tasks():
     获取所有任务
     仅返回未删除的任务
     需要用户登录,依赖session中的user_id
+    查询参数(可选):
+    - sort: 排序字段 (id, due_date, priority, created_at)，前缀 "-" 表示降序
+    - limit: 每页条数，提供后返回 {"tasks": [...], "next_cursor": "..."}
+    - cursor: 上一页返回的 next_cursor
+    - stream: json、ndjson 或 csv，以流式响应返回全部结果（不分页），适用于导出
+    - include: 设为 tags 时每个任务附带 tags: [{"id": ..., "name": ...}]（csv 中为 ; 分隔的标签名）
+    - fields: 只返回这些字段，如 fields=title,status,due_date（id 总是返回）
+    响应带 ETag，请求头 If-None-Match 匹配时返回 304
     """
     user_id = session.get("user_id")
     if not user_id:
         return jsonify({"error": "未登录"}), 401
 
-    result, status = _fetch_tasks(user_id)
-    if status != 200:
-        return jsonify(result), status
-    return jsonify(result), 200
+    page, fmt, include_tags, fields, error = _parse_list_args(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    etag, not_modified = check_not_modified(user_id, "tasks", *(["tags"] if include_tags else []))
+    if not_modified:
+        return not_modified
+    if fmt:
+        return _stream_tasks(fmt, etag, user_id, page=page, include_tags=include_tags, fields=fields)
+
+    result, status = _fetch_tasks(user_id, page=page, include_tags=include_tags, fields=fields)
+    return json_with_etag(result, status, etag)
 
 
 @task_bp.route("/", methods=["POST"])
@@ -62,26 +651,19 @@ def create_task():
     if not user_id:
         return jsonify({"error": "未登录"}), 401
 
-    data = request.get_json()
-    title = data.get("title")
-    description = data.get("description", "")
-    status = data.get("status", "0")
-    priority = data.get("priority", "1")
-    due_date = data.get("due_date")
-
-    if not title:
-        return jsonify({"error": "缺少必要字段"}), 400
+    row, error = _task_row_for_create(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
 
-    with DatabaseConnection() as (conn, cursor):
+    with DatabaseConnection(user_id=user_id) as (conn, cursor):
         if not conn or not cursor:
             return jsonify({"error": "数据库连接失败"}), 500
-        cursor.execute(
-            "INSERT INTO tasks (user_id, title, description, status, priority, due_date) "
-            "VALUES (%s, %s, %s, %s, %s, %s)",
-            (user_id, title, description, status, priority, due_date),
-        )
-        conn.commit()
+        cursor.execute(INSERT_TASK, (user_id,) + row)
         task_id = cursor.lastrowid
+        apply_stats_deltas(cursor, user_id, {stat_key(row[2], row[3]): 1})
+        conn.commit()
+    invalidate(user_id, "tasks")
+    schedule_task(task_id, user_id, row[4])
     return jsonify({"message": "任务创建成功", "task_id": task_id}), 201
 
 
@@ -103,46 +685,27 @@ def update_task(task_id):
     if not user_id:
         return jsonify({"error": "未登录"}), 401
 
-    data = request.get_json()
-    title = data.get("title")
-    description = data.get("description")
-    status = data.get("status")
-    priority = data.get("priority")
-    due_date = data.get("due_date")
-
-    if not any([title, description, status, priority, due_date]):
-        return jsonify({"error": "没有提供更新字段"}), 400
-
-    fields = []
-    values = []
-
-    if title:
-        fields.append("title = %s")
-        values.append(title)
-    if description:
-        fields.append("description = %s")
-        values.append(description)
-    if status:
-        fields.append("status = %s")
-        values.append(status)
-    if priority:
-        fields.append("priority = %s")
-        values.append(priority)
-    if due_date:
-        fields.append("due_date = %s")
-        values.append(due_date)
+    fields, values, error = _task_fields_for_update(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
 
-    with DatabaseConnection() as (conn, cursor):
+    with DatabaseConnection(user_id=user_id) as (conn, cursor):
         if not conn or not cursor:
             return jsonify({"error": "数据库连接失败"}), 500
-        cursor.execute(
-            f"UPDATE tasks SET {', '.join(fields)}, updated_at = NOW() "
-            "WHERE id = %s AND user_id = %s AND is_deleted = 0",
-            tuple(values + [task_id, user_id]),
-        )
-        conn.commit()
+        old = None
+        if _changes_levels(fields):
+            cursor.execute(LOCK_TASK_LEVELS, (task_id, user_id))
+            old = cursor.fetchone()
+            if not old:
+                return jsonify({"error": "任务未找到或未更新"}), 404
+        cursor.execute(_update_statement(tuple(fields)), tuple(values + [task_id, user_id]))
         if cursor.rowcount == 0:
             return jsonify({"error": "任务未找到或未更新"}), 404
+        if old:
+            apply_stats_deltas(cursor, user_id, _update_stats_deltas(old, fields, values))
+        conn.commit()
+    invalidate(user_id, "tasks")
+    _reschedule(user_id, task_id, fields, values)
     return jsonify({"message": "任务更新成功"}), 200
 
 
@@ -155,17 +718,16 @@ def delete_task(task_id):
     if not user_id:
         return jsonify({"error": "未登录"}), 401
 
-    with DatabaseConnection() as (conn, cursor):
+    with DatabaseConnection(user_id=user_id) as (conn, cursor):
         if not conn or not cursor:
             return jsonify({"error": "数据库连接失败"}), 500
-        cursor.execute(
-            "UPDATE tasks SET is_deleted = 1, updated_at = NOW() "
-            "WHERE id = %s AND user_id = %s AND is_deleted = 0",
-            (task_id, user_id),
-        )
-        conn.commit()
+        cursor.execute(SOFT_DELETE_TASK, (task_id, user_id))
         if cursor.rowcount == 0:
             return jsonify({"error": "任务未找到或已删除"}), 404
+        cursor.execute(TASK_LEVELS, (task_id,))
+        apply_stats_deltas(cursor, user_id, _delete_stats_deltas(cursor.fetchone()))
+        conn.commit()
+    invalidate(user_id, "tasks")
     return jsonify({"message": "任务删除成功"}), 200
 
 
@@ -173,47 +735,166 @@ def delete_task(task_id):
 def purge_task(task_id):
     """
     彻底删除任务
+    只能清除已软删除的任务，软删除时已从统计计数中扣除，这里不再更新计数
     """
     user_id = session.get("user_id")
     if not user_id:
         return jsonify({"error": "未登录"}), 401
-    with DatabaseConnection() as (conn, cursor):
+    with DatabaseConnection(user_id=user_id) as (conn, cursor):
         if not conn or not cursor:
             return jsonify({"error": "数据库连接失败"}), 500
-        cursor.execute(
-            "DELETE FROM tasks WHERE id = %s AND user_id = %s AND is_deleted = 1",
-            (task_id, user_id),
-        )
+        cursor.execute(PURGE_TASK, (task_id, user_id))
         conn.commit()
         if cursor.rowcount == 0:
             return jsonify({"error": "任务未找到或未软删除"}), 404
+    invalidate(user_id, "tasks")
     return jsonify({"message": "任务已彻底删除"}), 200
 
-@task_bp.route("/search", methods=["GET"])
-def search_tasks():
+
+def _parse_changes_args(args) -> Tuple[tuple | None, int | None, str | None]:
     """
-    搜索任务
-    支持通过标题、状态、优先级和截止日期进行过滤
+    解析增量同步参数
+    返回 ((updated_at, id) 或 None, 每次条数, 错误信息)
+    """
+    since = None
+    token = args.get("since")
+    if token:
+        decoded = _decode_cursor(token, "changes")
+        try:
+            since = (datetime.strptime(decoded[0], "%Y-%m-%d %H:%M:%S"), decoded[1])
+        except (TypeError, ValueError):
+            return None, None, "无效的同步令牌"
+    try:
+        limit = min(int(args.get("limit", CHANGES_PAGE_SIZE)), CHANGES_PAGE_SIZE)
+    except ValueError:
+        return None, None, "无效的分页参数"
+    if limit <= 0:
+        return None, None, "无效的分页参数"
+    return since, limit, None
+
+
+def _sync_token_expired(since: tuple | None, now: datetime) -> bool:
+    """
+    令牌早于墓碑保留期时，期间被彻底清除的删除记录已无法同步
+    """
+    return bool(since) and since[0] < now - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+
+
+def _changes_query(user_id: int, since: tuple | None, limit: int) -> Tuple[str, tuple]:
+    """
+    令牌之后的变更（含软删除），多取一条用于判断是否还有更多
+    由 (user_id, updated_at) 索引支撑，代价与变更数成正比
+    """
+    filters = ["user_id = %s"]
+    values: list = [user_id]
+    if since:
+        filters.append("(updated_at > %s OR (updated_at = %s AND id > %s))")
+        values.extend([since[0], since[0], since[1]])
+    else:
+        filters.append("is_deleted = 0")
+    return (
+        f"SELECT {TASK_COLUMNS}, is_deleted FROM tasks WHERE {' AND '.join(filters)} "
+        "ORDER BY updated_at, id LIMIT %s",
+        tuple(values + [limit + 1]),
+    )
+
+
+def _changes_result(rows: list, live: list, since: tuple | None, now: datetime, has_more: bool) -> dict:
+    """
+    组装增量同步响应
+    live 为 rows 中未删除的任务附带标签后的结果
+    """
+    tags_by_id = {task["id"]: task["tags"] for task in live}
+    changes = []
+    for row in rows:
+        if row["is_deleted"]:
+            changes.append({"id": row["id"], "deleted": True, "updated_at": row["updated_at"]})
+        else:
+            task = {key: value for key, value in row.items() if key != "is_deleted"}
+            task["tags"] = tags_by_id[row["id"]]
+            changes.append(task)
+
+    if rows:
+        position = (rows[-1]["updated_at"], rows[-1]["id"])
+    elif since:
+        position = since
+    else:
+        position = (None, 0)
+    safe_point = now - timedelta(seconds=SYNC_SAFETY_WINDOW)
+    if not has_more and (position[0] is None or position[0] > safe_point):
+        position = (safe_point, 0)
+
+    return {
+        "changes": changes,
+        "next_token": _encode_cursor("changes", *position),
+        "has_more": has_more,
+    }
+
+
+@task_bp.route("/changes", methods=["GET"])
+def get_task_changes():
+    """
+    增量同步：获取自令牌之后新增、修改和软删除的任务
     需要用户登录,依赖session中的user_id
     查询参数:
-    - title: 任务标题关键词
-    - status: 任务状态 (0: 未开始, 1: 进行中, 2: 已完成)
-    - priority: 任务优先级 (0: 低, 1: 中, 2: 高, 3: 紧急)
-    - due_date: 截止日期 (格式: YYYY-MM-DD)
-    示例: /api/tasks/search?title=meeting&status=1&priority=2&due_date=2024-12-31
+    - since: 上次返回的 next_token；不提供时从头同步（不含已删除任务）
+    - limit: 每次最多返回的变更数
+    返回:
+    {
+        "changes": [任务(附带 tags) 或 {"id": 1, "deleted": true, "updated_at": ...}],
+        "next_token": "...",
+        "has_more": false
+    }
+    标签的关联与解除会刷新任务的 updated_at，因此也会出现在变更中
+    令牌早于墓碑保留期时返回 410，客户端需重新全量同步
     """
     user_id = session.get("user_id")
     if not user_id:
         return jsonify({"error": "未登录"}), 401
 
-    title = request.args.get("title")
-    status = request.args.get("status")
-    priority = request.args.get("priority")
-    due_date = request.args.get("due_date")
+    since, limit, error = _parse_changes_args(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    with DatabaseConnection(user_id=user_id) as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        cursor.execute(SELECT_NOW)
+        now = cursor.fetchone()["now"]
+        if _sync_token_expired(since, now):
+            return jsonify({"error": "同步令牌已过期，请重新全量同步"}), 410
+
+        cursor.execute(*_changes_query(user_id, since, limit))
+        rows = cursor.fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        live = _attach_tags(cursor, user_id, [row for row in rows if not row["is_deleted"]])
+
+    return jsonify(_changes_result(rows, live, since, now, has_more)), 200
+
+
+def _search_filters(args) -> Tuple[List[str], list, Tuple[str, list] | None, str | None]:
+    """
+    解析搜索条件
+    返回 (过滤条件, 参数, 相关度表达式与参数, 错误信息)
+    """
+    q = args.get("q")
+    title = args.get("title")
+    status = args.get("status")
+    priority = args.get("priority")
+    due_date = args.get("due_date")
 
     filters: List[str] = []
     values: List[str] = []
+    rank = None
 
+    if q:
+        match_query = _build_fulltext_query(q)
+        if not match_query:
+            return filters, values, None, "无效的搜索关键词"
+        filters.append(FULLTEXT_MATCH)
+        values.append(match_query)
+        rank = (FULLTEXT_MATCH, [match_query])
     if title:
         filters.append("title LIKE %s")
         values.append(f"%{title}%")
@@ -227,7 +908,478 @@ def search_tasks():
         filters.append("due_date = %s")
         values.append(due_date)
 
-    result, status_code = _fetch_tasks(user_id, filters, values)
+    due = args.get("due")
+    if due:
+        if due not in DUE_BUCKETS:
+            return filters, values, rank, "无效的截止日期范围"
+        start, end = _due_bounds(datetime.now())[due]
+        if due == "overdue":
+            filters.append("status NOT IN (%s, %s)")
+            values.extend(CLOSED_STATUSES)
+        if start is not None:
+            filters.append("due_date >= %s")
+            values.append(start)
+        filters.append("due_date < %s")
+        values.append(end)
+    for name, condition in (("due_from", "due_date >= %s"), ("due_to", "due_date < %s")):
+        raw = args.get(name)
+        if raw:
+            bound = _parse_due_date(raw)
+            if bound is None:
+                return filters, values, rank, "无效的截止日期"
+            filters.append(condition)
+            values.append(bound)
+
+    for name in TAG_FILTER_PARAMS:
+        raw = args.get(name)
+        if raw:
+            tag_ids = _parse_tag_ids(raw)
+            if tag_ids is None:
+                return filters, values, rank, "无效的标签"
+            filters.append(_tag_filter(name, len(tag_ids)))
+            values.extend(tag_ids)
+            if name == "tags":
+                values.append(len(tag_ids))
+    return filters, values, rank, None
+
+
+def _parse_tag_ids(raw: str) -> List[int] | None:
+    """
+    解析逗号分隔的标签id，去重并排序（相同的标签集合得到相同的语句与缓存键），无效时返回 None
+    """
+    try:
+        tag_ids = sorted({int(part) for part in raw.split(",") if part.strip()})
+    except ValueError:
+        return None
+    if not tag_ids or len(tag_ids) > MAX_FILTER_TAGS or tag_ids[0] <= 0:
+        return None
+    return tag_ids
+
+
+def _tag_filter(name: str, count: int) -> str:
+    """
+    按标签过滤的条件，参数为 count 个标签id（tags 另有一个标签数）
+    AND 按任务分组，关联到的标签数等于请求的标签数（task_tags 主键保证不重复计数）
+    """
+    tagged = TAGGED_TASKS.format(",".join(["%s"] * count))
+    if name == "tags":
+        return f"id IN ({tagged} GROUP BY tt.task_id HAVING COUNT(*) = %s)"
+    if name == "any_tags":
+        return f"id IN ({tagged})"
+    return f"id NOT IN ({tagged})"
+
+
+def _parse_due_date(raw: str) -> datetime | None:
+    for fmt in DUE_DATE_FORMATS:
+        try:
+            return datetime.strptime(raw, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _due_bounds(now: datetime) -> dict:
+    """
+    各截止日期视图的 [起, 止) 范围，overdue 没有下界
+    当前时间取整到分钟，同一分钟内的查询参数相同，可以命中缓存
+    """
+    now = now.replace(second=0, microsecond=0)
+    today = now.replace(hour=0, minute=0)
+    tomorrow = today + timedelta(days=1)
+    next_week = today + timedelta(days=7 - today.weekday())
+    return {"overdue": (None, now), "today": (today, tomorrow), "week": (today, next_week)}
+
+
+def _due_summary_params(user_id: int, now: datetime) -> tuple:
+    bounds = _due_bounds(now)
+    today, week = bounds["today"], bounds["week"]
+    return (
+        bounds["overdue"][1],
+        *CLOSED_STATUSES,
+        today[0],
+        today[1],
+        week[0],
+        week[1],
+        user_id,
+        week[1],
+    )
+
+
+@task_bp.route("/search", methods=["GET"])
+def search_tasks():
+    """
+    搜索任务
+    支持通过标题、状态、优先级和截止日期进行过滤
+    需要用户登录,依赖session中的user_id
+    查询参数:
+    - q: 全文检索关键词，匹配标题和描述，支持前缀匹配，结果按相关度排序并附带 score
+    - title: 任务标题关键词
+    - status: 任务状态 (0: 未开始, 1: 进行中, 2: 已完成)
+    - priority: 任务优先级 (0: 低, 1: 中, 2: 高, 3: 紧急)
+    - due_date: 截止日期 (格式: YYYY-MM-DD)
+    - due: 截止日期视图 (overdue: 已逾期且未完成、未归档, today: 今天到期, week: 本周内到期)
+    - due_from / due_to: 截止时间范围 [due_from, due_to)，格式 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS
+    - tags: 逗号分隔的标签id，任务须关联其中全部标签
+    - any_tags: 逗号分隔的标签id，任务关联其中任一标签即可
+    - exclude_tags: 逗号分隔的标签id，排除关联了其中任一标签的任务
+    - sort / limit / cursor / stream / include / fields: 排序、分页、流式响应、附带标签与字段选择，同 GET /api/tasks/
+    示例: /api/tasks/search?title=meeting&status=1&priority=2&due_date=2024-12-31
+          /api/tasks/search?q=会议 纪要&limit=20
+          /api/tasks/search?due=overdue&sort=due_date
+          /api/tasks/search?tags=1,2&exclude_tags=5&status=1
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    filters, values, rank, error = _search_filters(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+    page, fmt, include_tags, fields, error = _parse_list_args(request.args, searching=rank is not None)
+    if error:
+        return jsonify({"error": error}), 400
+    if fmt:
+        etag, _ = check_not_modified(user_id, "tasks", *(["tags"] if include_tags else []))
+        return _stream_tasks(fmt, etag, user_id, filters, values, page, rank, include_tags, fields)
+
+    result, status_code = _fetch_tasks(user_id, filters, values, page, rank, include_tags, fields)
     if status_code != 200:
         return jsonify(result), status_code
-    return jsonify(result), 200
\ No newline at end of file
+    return jsonify(result), 200
+
+
+@task_bp.route("/due/summary", methods=["GET"])
+def get_due_summary():
+    """
+    各截止日期视图的任务数
+    返回 {"overdue": 3, "today": 1, "week": 5}
+    一条聚合查询，只扫描 (user_id, is_deleted, due_date) 索引中截止到本周末的范围
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    params = _due_summary_params(user_id, datetime.now())
+
+    def load():
+        with DatabaseConnection(READ, user_id) as (conn, cursor):
+            if not conn or not cursor:
+                return {"error": "数据库连接失败"}, 500
+            cursor.execute(DUE_SUMMARY, params)
+            row = cursor.fetchone()
+            return {bucket: int(row[bucket]) for bucket in DUE_BUCKETS}, 200
+
+    result, status = read_through("tasks", user_id, [DUE_SUMMARY, params], load)
+    return jsonify(result), status
+
+
+def _stats_now() -> datetime:
+    # 取整到分钟，同一分钟内的统计可以命中缓存
+    return datetime.now().replace(second=0, microsecond=0)
+
+
+@task_bp.route("/stats", methods=["GET"])
+def get_task_stats():
+    """
+    任务统计：按状态、按优先级的任务数以及逾期数
+    返回 {"total": 10, "by_status": {"0": 4, ...}, "by_priority": {"0": 1, ...}, "overdue": 2}
+    状态与优先级的计数读自增量维护的 task_stats 表（按主键至多 16 行），不扫描用户的任务；
+    逾期数随时间变化，由 (user_id, is_deleted, due_date) 索引的范围计数得出
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    now = _stats_now()
+
+    def load():
+        with DatabaseConnection(user_id=user_id) as (conn, cursor):
+            if not conn or not cursor:
+                return {"error": "数据库连接失败"}, 500
+            cursor.execute(READ_STATS, (user_id,))
+            rows = cursor.fetchall()
+            if not rows:
+                # 统计表上线前创建的用户还没有计数，先对账一次
+                reconcile_user(cursor, user_id)
+                conn.commit()
+                cursor.execute(READ_STATS, (user_id,))
+                rows = cursor.fetchall()
+            cursor.execute(COUNT_OVERDUE, (user_id, now, *CLOSED_STATUSES))
+            return summarize(rows, cursor.fetchone()["overdue"]), 200
+
+    result, status = read_through("tasks", user_id, [READ_STATS, now], load)
+    return jsonify(result), status
+
+
+@task_bp.route("/reminders", methods=["GET"])
+def get_reminders():
+    """
+    当前用户最近的截止提醒，查询参数 since 为上次响应中的 cursor，只返回之后的提醒
+    提醒由提醒调度器经事件通道发布（见 app/reminders.py），未启用调度器时始终为空
+    返回 {"reminders": [{"task_id": 1, "title": "...", "due_date": ...}], "cursor": "..."}
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+    since, error = parse_since(request.args.get("since"))
+    if error:
+        return jsonify({"error": error}), 400
+    return jsonify(pending_reminders(user_id, since)), 200
+
+
+def _parse_id_list(raw: str) -> List[int] | None:
+    """
+    解析逗号分隔的 id 列表，去重并保持顺序，格式错误时返回 None
+    """
+    try:
+        ids = [int(part) for part in raw.split(",") if part.strip()]
+    except ValueError:
+        return None
+    return list(dict.fromkeys(ids))
+
+
+def _parse_batch_ids(args) -> Tuple[List[int] | None, str | None]:
+    """
+    解析批量获取的 ids 参数，返回 (任务id列表, 错误信息)
+    """
+    ids = _parse_id_list(args.get("ids", ""))
+    if ids is None:
+        return None, "无效的任务id"
+    if not ids:
+        return None, "缺少参数"
+    if len(ids) > MAX_BATCH_SIZE:
+        return None, "批量操作数量超出限制"
+    return ids, None
+
+
+def _tasks_by_ids_query(user_id: int, ids: List[int]) -> Tuple[str, tuple]:
+    placeholders = ",".join(["%s"] * len(ids))
+    return (
+        f"SELECT {TASK_COLUMNS} FROM tasks "
+        f"WHERE user_id = %s AND is_deleted = 0 AND id IN ({placeholders})",
+        tuple([user_id] + ids),
+    )
+
+
+@task_bp.route("/batch", methods=["GET"])
+def get_tasks_batch():
+    """
+    按 id 批量获取任务
+    查询参数:
+    - ids: 逗号分隔的任务id
+    示例: /api/tasks/batch?ids=1,2,3
+    返回 {"tasks": [...], "missing": [不存在或无权限的id]}
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    ids, error = _parse_batch_ids(request.args)
+    if error:
+        return jsonify({"error": error}), 400
+
+    with DatabaseConnection(user_id=user_id) as (conn, cursor):
+        if not conn or not cursor:
+            return jsonify({"error": "数据库连接失败"}), 500
+        cursor.execute(*_tasks_by_ids_query(user_id, ids))
+        tasks = cursor.fetchall()
+    found = {task["id"] for task in tasks}
+    return jsonify({"tasks": tasks, "missing": [i for i in ids if i not in found]}), 200
+
+
+def _apply_batch(cursor, user_id: int, creates: list, updates: list, deletes: list, results: list):
+    """
+    在同一事务中执行批量操作，并把每项结果写入 results 的对应位置
+    - creates: [(序号, 任务行)]，合并为一条多行 INSERT
+    - updates: [(序号, 任务id, SET 子句列表, 值)]，按更新字段分组后 executemany
+    - deletes: [(序号, 任务id)]，合并为一条 UPDATE ... IN (...)
+    """
+    if creates:
+        cursor.execute(*_insert_tasks_query(user_id, [row for _, row in creates]))
+        first_id = cursor.lastrowid
+        cursor.execute(AUTO_INCREMENT_STEP)
+        _record_creates(creates, first_id, cursor.fetchone()["step"], results)
+
+    existing = {}
+    lock = _lock_tasks_query(user_id, updates, deletes)
+    if lock:
+        cursor.execute(*lock)
+        existing = {row["id"]: row for row in cursor.fetchall()}
+
+    groups, delete_ids = _plan_batch_writes(user_id, updates, deletes, existing, results)
+    for fields, params in groups.items():
+        cursor.executemany(_update_statement(fields), params)
+    if delete_ids:
+        cursor.execute(*_soft_delete_tasks_query(user_id, delete_ids))
+    apply_stats_deltas(cursor, user_id, _batch_stats_deltas(creates, updates, delete_ids, existing, results))
+
+
+def _insert_tasks_query(user_id: int, rows: list) -> Tuple[str, tuple]:
+    """
+    多行 INSERT，rows 为 _task_row_for_create 的结果
+    """
+    placeholders = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(rows))
+    params = [value for row in rows for value in (user_id,) + row]
+    return (
+        "INSERT INTO tasks (user_id, title, description, status, priority, due_date) "
+        f"VALUES {placeholders}",
+        tuple(params),
+    )
+
+
+def _inserted_ids(first_id: int, count: int, step: int) -> List[int]:
+    """
+    单条多行 INSERT 分配的自增 id：lastrowid 为第一行的 id，之后每行递增 step
+    """
+    return [first_id + offset * step for offset in range(count)]
+
+
+def _record_creates(creates: list, first_id: int, step: int, results: list):
+    for (index, _), task_id in zip(creates, _inserted_ids(first_id, len(creates), step)):
+        results[index] = {"op": "create", "status": 201, "task_id": task_id}
+
+
+def _lock_tasks_query(user_id: int, updates: list, deletes: list) -> Tuple[str, tuple] | None:
+    """
+    锁定并取出待更新、删除的任务中仍然存在的那些（含状态与优先级），没有目标时返回 None
+    """
+    target_ids = list({item[1] for item in updates} | {item[1] for item in deletes})
+    if not target_ids:
+        return None
+    placeholders = ",".join(["%s"] * len(target_ids))
+    return (
+        f"SELECT id, status, priority FROM tasks WHERE user_id = %s AND is_deleted = 0 AND id IN ({placeholders}) "
+        "FOR UPDATE",
+        tuple([user_id] + target_ids),
+    )
+
+
+def _plan_batch_writes(user_id: int, updates: list, deletes: list, existing, results: list):
+    """
+    按锁定结果决定更新与删除，写入各项结果
+    返回 ({SET 子句元组: [参数, ...]}, 待删除的任务id)
+    """
+    groups = {}
+    for index, task_id, fields, values in updates:
+        if task_id not in existing:
+            results[index] = {"op": "update", "id": task_id, "status": 404, "error": "任务未找到或未更新"}
+            continue
+        groups.setdefault(tuple(fields), []).append(tuple(values) + (task_id, user_id))
+        results[index] = {"op": "update", "id": task_id, "status": 200}
+
+    existing = set(existing)
+    delete_ids = []
+    for index, task_id in deletes:
+        if task_id not in existing:
+            results[index] = {"op": "delete", "id": task_id, "status": 404, "error": "任务未找到或已删除"}
+            continue
+        existing.discard(task_id)
+        delete_ids.append(task_id)
+        results[index] = {"op": "delete", "id": task_id, "status": 200}
+    return groups, delete_ids
+
+
+def _batch_stats_deltas(creates: list, updates: list, delete_ids: list, existing: dict, results: list) -> Counter:
+    """
+    批量操作对统计计数的增量合计
+    existing 为锁定时取出的 {任务id: 原状态与优先级}；执行顺序与 _apply_batch 一致，先更新后删除
+    """
+    deltas = Counter()
+    for _, row in creates:
+        deltas[stat_key(row[2], row[3])] += 1
+    current = dict(existing)
+    for index, task_id, fields, values in updates:
+        if results[index]["status"] == 200 and _changes_levels(fields):
+            deltas.update(_update_stats_deltas(current[task_id], fields, values))
+            current[task_id] = _level_after_update(current[task_id], fields, values)
+    for task_id in delete_ids:
+        deltas.update(_delete_stats_deltas(current[task_id]))
+    return deltas
+
+
+def _soft_delete_tasks_query(user_id: int, task_ids: list) -> Tuple[str, tuple]:
+    placeholders = ",".join(["%s"] * len(task_ids))
+    return (
+        "UPDATE tasks SET is_deleted = 1, updated_at = NOW() "
+        f"WHERE user_id = %s AND is_deleted = 0 AND id IN ({placeholders})",
+        tuple([user_id] + task_ids),
+    )
+
+
+def _parse_batch_operations(data):
+    """
+    校验批量操作，规则与单个任务的创建、更新接口一致
+    同一任务只能更新一次：更新按字段分组执行，重复的更新无法保证按请求中的顺序生效
+    返回 (各项结果, creates, updates, deletes, 错误信息)，校验失败的项直接写入结果
+    """
+    operations = data.get("operations") if isinstance(data, dict) else None
+    if not operations or not isinstance(operations, list):
+        return None, None, None, None, "缺少参数"
+    if len(operations) > MAX_BATCH_SIZE:
+        return None, None, None, None, "批量操作数量超出限制"
+
+    results: list = [None] * len(operations)
+    creates, updates, deletes = [], [], []
+    updated_ids = set()
+    for index, item in enumerate(operations):
+        op = item.get("op") if isinstance(item, dict) else None
+        if op == "create":
+            row, error = _task_row_for_create(item.get("data"))
+            if error:
+                results[index] = {"op": op, "status": 400, "error": error}
+            else:
+                creates.append((index, row))
+        elif op in ("update", "delete"):
+            task_id = item.get("id")
+            if not isinstance(task_id, int):
+                results[index] = {"op": op, "status": 400, "error": "缺少参数"}
+            elif op == "delete":
+                deletes.append((index, task_id))
+            elif task_id in updated_ids:
+                results[index] = {"op": op, "id": task_id, "status": 400, "error": "同一任务只能更新一次"}
+            else:
+                fields, values, error = _task_fields_for_update(item.get("data"))
+                if error:
+                    results[index] = {"op": op, "id": task_id, "status": 400, "error": error}
+                else:
+                    updated_ids.add(task_id)
+                    updates.append((index, task_id, fields, values))
+        else:
+            results[index] = {"op": op, "status": 400, "error": "无效的操作"}
+    return results, creates, updates, deletes, None
+
+
+@task_bp.route("/batch", methods=["POST"])
+def batch_tasks():
+    """
+    批量创建、更新、删除任务，所有操作在同一事务中执行
+    期望的JSON负载格式:
+    {
+        "operations": [
+            {"op": "create", "data": {"title": "任务标题", ...}},
+            {"op": "update", "id": 1, "data": {"status": "2"}},
+            {"op": "delete", "id": 2}
+        ]
+    }
+    各项的校验规则与单个任务的创建、更新接口一致，校验失败的项不影响其他项；
+    同一任务在一次请求中只能更新一次，之后对它的更新返回 400
+    返回 {"results": [...]}，与 operations 一一对应，每项包含 status 以及 task_id 或 error
+    """
+    user_id = session.get("user_id")
+    if not user_id:
+        return jsonify({"error": "未登录"}), 401
+
+    results, creates, updates, deletes, error = _parse_batch_operations(request.get_json())
+    if error:
+        return jsonify({"error": error}), 400
+
+    if creates or updates or deletes:
+        with DatabaseConnection(user_id=user_id) as (conn, cursor):
+            if not conn or not cursor:
+                return jsonify({"error": "数据库连接失败"}), 500
+            _apply_batch(cursor, user_id, creates, updates, deletes, results)
+            conn.commit()
+        invalidate(user_id, "tasks")
+        _schedule_batch(user_id, creates, updates, results)
+
+    return jsonify({"results": results}), 200
@@ -1,10 +1,55 @@
 from flask import Blueprint, jsonify, request, session
 
-from ..db import DatabaseConnection
-from werkzeug.security import check_password_hash, generate_password_hash
+from ..cache import invalidate
+from ..db import DatabaseConnection, place_user, prepared
+from ..hashing import HashPoolBusy, hash_password, needs_rehash, rehash_in_background, verify_password
+from ..jobs import enqueue_job, notify_job_runner
 
 user_bp = Blueprint("users", __name__, url_prefix="/api/users")
 
+LIST_USERS = "SELECT id, username, email FROM users"
+INSERT_USER = "INSERT INTO users (username, email, password_hash) VALUES (%s, %s, %s)"
+SELECT_LOGIN_USER = prepared(
+    "SELECT id, username, password_hash FROM users WHERE username = %s AND is_active = 1"
+)
+UPDATE_PASSWORD_HASH = "UPDATE users SET password_hash = %s WHERE id = %s"
+# 删除账号时先停用，数据由后台任务分批删除（见 app/jobs.py）
+DEACTIVATE_USER = "UPDATE users SET is_active = 0 WHERE id = %s AND is_active = 1"
+
+
+def _busy():
+    """
+    密码哈希进程池已满时的快速拒绝响应
+    """
+    return jsonify({"error": "服务繁忙，请稍后重试"}), 429, {"Retry-After": "1"}
+
+
+def _store_rehash(user_id, password_hash):
+    """
+    保存按新参数生成的密码哈希
+    """
+    with DatabaseConnection() as (conn, cursor):
+        if not conn or not cursor:
+            return
+        cursor.execute(UPDATE_PASSWORD_HASH, (password_hash, user_id))
+        conn.commit()
+
+
+def _new_user_fields(data):
+    """
+    取出注册数据中的 (username, email, password)，password 为明文密码
+    """
+    data = data if isinstance(data, dict) else {}
+    return data.get("username"), data.get("email"), data.get("password")
+
+
+def _credentials(data):
+    """
+    取出登录数据中的 (username, password)
+    """
+    data = data if isinstance(data, dict) else {}
+    return data.get("username"), data.get("password")
+
 
 @user_bp.route("/", methods=["GET"])
 def get_users():
@@ -14,7 +59,7 @@ def get_users():
     with DatabaseConnection() as (conn, cursor):
         if not conn or not cursor:
             return jsonify({"error": "数据库连接失败"}), 500
-        cursor.execute("SELECT id, username, email FROM users")
+        cursor.execute(LIST_USERS)
         users = cursor.fetchall()
         return jsonify(users), 200
 
@@ -30,46 +75,51 @@ def create_user():
         "password": "examplepass"
     }
     """
-    data = request.get_json()
-    username = data.get("username")
-    email = data.get("email")
-    password = data.get("password")  # 明文密码
-
+    username, email, password = _new_user_fields(request.get_json())
     if not username or not email or not password:
         return jsonify({"error": "缺少必要字段"}), 400
 
-    password_hash = generate_password_hash(password)
+    try:
+        password_hash = hash_password(password)
+    except HashPoolBusy:
+        return _busy()
 
     with DatabaseConnection() as (conn, cursor):
         if not conn or not cursor:
             return jsonify({"error": "数据库连接失败"}), 500
-        cursor.execute(
-            "INSERT INTO users (username, email, password_hash) VALUES (%s, %s, %s)",
-            (username, email, password_hash),
-        )
+        cursor.execute(INSERT_USER, (username, email, password_hash))
+        user_id = cursor.lastrowid
         conn.commit()
+    # 启用分片时为新用户选择分片，之后该用户的任务与标签都保存在那里
+    place_user(user_id)
     return jsonify({"message": "用户创建成功"}), 201
 
 @user_bp.route("/login", methods=["POST"])
 def login():
     """
     用户登录
+    密码校验在哈希进程池中执行，进程池繁忙时返回 429
+    旧参数生成的哈希在登录成功后按当前配置重新生成
     """
-    data = request.get_json()
-    username = data.get("username")
-    password = data.get("password")
+    username, password = _credentials(request.get_json())
     if not username or not password:
         return jsonify({"error": "缺少用户名或密码"}), 400
     with DatabaseConnection() as (conn, cursor):
         if not conn or not cursor:
             return jsonify({"error": "数据库连接失败"}), 500
-        cursor.execute(
-            "SELECT id, username, password_hash FROM users WHERE username = %s",
-            (username,),
-        )
+        cursor.execute(SELECT_LOGIN_USER, (username,))
         row = cursor.fetchone()
-    if not row or not check_password_hash(row["password_hash"], password):
+    if not row:
+        return jsonify({"error": "无效的用户名或密码"}), 401
+    try:
+        valid = verify_password(row["password_hash"], password)
+    except HashPoolBusy:
+        return _busy()
+    if not valid:
         return jsonify({"error": "无效的用户名或密码"}), 401
+    if needs_rehash(row["password_hash"]):
+        user_id = row["id"]
+        rehash_in_background(password, lambda new_hash: _store_rehash(user_id, new_hash))
     session["user_id"] = row["id"]
     return (
         jsonify(
@@ -93,6 +143,7 @@ def logout():
 def delete_user():
     """
     删除当前登录用户
+    账号立即停用（不能再登录），任务、标签等数据由后台任务分批删除，返回 202 与任务id
     """
     user_id = session.get("user_id")
     if not user_id:
@@ -101,10 +152,16 @@ def delete_user():
     with DatabaseConnection() as (conn, cursor):
         if not conn or not cursor:
             return jsonify({"error": "数据库连接失败"}), 500
-        cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
+        cursor.execute(DEACTIVATE_USER, (user_id,))
+        if cursor.rowcount == 0:
+            session.pop("user_id", None)
+            return jsonify({"error": "用户不存在或已删除"}), 404
+        job_id = enqueue_job(cursor, "delete_user", user_id)
         conn.commit()
+    notify_job_runner()
+    invalidate(user_id, "tasks", "tags")
     session.pop("user_id", None)
-    return jsonify({"message": "用户删除成功"}), 200
+    return jsonify({"message": "用户删除已提交", "job_id": job_id}), 202
 
 @user_bp.route("/ping", methods=["GET"])
 def ping():
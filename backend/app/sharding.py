@@ -0,0 +1,230 @@
+"""
+用户在分片之间的迁移
+分片的配置与连接路由见 db.SHARD_CONFIG；新用户注册时按一致性哈希放置，已有用户需要用本工具迁移
+（如扩容后把部分用户迁到新分片，或把启用分片之前注册的用户迁出主库）
+
+迁移一个用户的步骤：
+1. 在目录中把用户标记为迁移中（moving = 1），等待 directory_ttl 秒让所有进程的目录缓存过期，
+   此后该用户的写入被拒绝，读取仍由原分片处理
+2. 清除目标分片上上次迁移失败留下的数据，按原 id 分批复制标签、任务、task_tags 与统计计数
+3. 核对两边的行数，切换目录到目标分片并取消迁移标记，使用户的缓存失效
+4. 再等待 directory_ttl 秒（缓存了旧目录的进程可能仍在读原分片），然后分批删除原分片上的数据
+任一步骤失败时取消迁移标记，用户留在原分片；目标分片上复制了一部分的数据在下次迁移时清除
+
+    python -m app.sharding locate 42        # 查看用户 42 所在的分片
+    python -m app.sharding move 42 s2       # 把用户 42 迁移到分片 s2
+"""
+import time
+
+from .db import (
+    INSERT_SHARD_USER,
+    MAIN_SHARD,
+    SHARD_CONFIG,
+    DatabaseConnection,
+    forget_shard,
+    locate_user,
+    shard_names,
+    shard_user_stub,
+)
+
+# 迁移时每批复制或删除的行数
+MOVE_BATCH_SIZE = 500
+# 删除原分片数据时每批之间暂停的秒数
+MOVE_PAUSE = 0.05
+
+SELECT_ACCOUNT = "SELECT is_active FROM users WHERE id = %s"
+FREEZE_USER = (
+    "INSERT INTO user_shards (user_id, shard, moving) VALUES (%s, %s, 1) "
+    "ON DUPLICATE KEY UPDATE moving = 1"
+)
+UNFREEZE_USER = "UPDATE user_shards SET moving = 0 WHERE user_id = %s"
+SWITCH_SHARD = "UPDATE user_shards SET shard = %s, moving = 0 WHERE user_id = %s"
+
+SELECT_TASK_TAGS = "SELECT task_id, tag_id FROM task_tags WHERE task_id IN ({})"
+COUNT_ROWS = {
+    "tags": "SELECT COUNT(*) AS n FROM tags WHERE user_id = %s",
+    "tasks": "SELECT COUNT(*) AS n FROM tasks WHERE user_id = %s",
+    "task_tags": (
+        "SELECT COUNT(*) AS n FROM task_tags tt JOIN tasks t ON t.id = tt.task_id WHERE t.user_id = %s"
+    ),
+    "task_stats": "SELECT COUNT(*) AS n FROM task_stats WHERE user_id = %s",
+}
+# 按外键依赖的逆序删除；task_tags 随任务与标签级联删除
+DELETE_USER_DATA = (
+    "DELETE FROM tasks WHERE user_id = %s LIMIT %s",
+    "DELETE FROM tags WHERE user_id = %s LIMIT %s",
+    "DELETE FROM task_stats WHERE user_id = %s LIMIT %s",
+)
+DELETE_SHARD_USER = "DELETE FROM users WHERE id = %s AND is_active = 0"
+
+
+class MoveError(Exception):
+    """
+    无法迁移用户：参数无效、用户不存在或正在迁移、连接失败、复制后行数不一致
+    """
+
+
+def _insert_rows(cursor, table, rows):
+    """
+    按原样（含 id 与时间戳）把 rows 写入 table
+    """
+    columns = list(rows[0])
+    row_placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    cursor.execute(
+        f"INSERT INTO {table} ({', '.join(f'`{column}`' for column in columns)}) "
+        f"VALUES {', '.join([row_placeholders] * len(rows))}",
+        tuple(row[column] for row in rows for column in columns),
+    )
+
+
+def _delete_user_data(conn, cursor, user_id, batch_size, pause=0):
+    for statement in DELETE_USER_DATA:
+        while True:
+            cursor.execute(statement, (user_id, batch_size))
+            deleted = cursor.rowcount
+            conn.commit()
+            if deleted < batch_size:
+                break
+            time.sleep(pause)
+
+
+def _copy_table(source, target_conn, target, table, user_id, batch_size):
+    """
+    按主键顺序分批复制用户在 table 中的行；复制任务时一并复制这批任务的 task_tags
+    """
+    last_id = 0
+    while True:
+        source.execute(
+            f"SELECT * FROM {table} WHERE user_id = %s AND id > %s ORDER BY id LIMIT %s",
+            (user_id, last_id, batch_size),
+        )
+        rows = source.fetchall()
+        if not rows:
+            return
+        _insert_rows(target, table, rows)
+        if table == "tasks":
+            ids = [row["id"] for row in rows]
+            source.execute(SELECT_TASK_TAGS.format(",".join(["%s"] * len(ids))), tuple(ids))
+            links = source.fetchall()
+            if links:
+                _insert_rows(target, "task_tags", links)
+        target_conn.commit()
+        if len(rows) < batch_size:
+            return
+        last_id = rows[-1]["id"]
+
+
+def _count_rows(cursor, user_id):
+    counts = {}
+    for table, query in COUNT_ROWS.items():
+        cursor.execute(query, (user_id,))
+        counts[table] = cursor.fetchone()["n"]
+    return counts
+
+
+def copy_user(user_id, source_shard, target_shard, batch_size=MOVE_BATCH_SIZE):
+    """
+    把用户的数据从 source_shard 复制到 target_shard，返回各表复制的行数
+    调用前用户须已冻结写入；复制后行数不一致时抛出 MoveError
+    """
+    with DatabaseConnection(shard=source_shard) as (source_conn, source), DatabaseConnection(
+        shard=target_shard
+    ) as (target_conn, target):
+        if not source_conn or not target_conn:
+            raise MoveError("数据库连接失败")
+        target.execute(INSERT_SHARD_USER, shard_user_stub(user_id))
+        target_conn.commit()
+        _delete_user_data(target_conn, target, user_id, batch_size)
+        for table in ("tags", "tasks"):
+            _copy_table(source, target_conn, target, table, user_id, batch_size)
+        source.execute("SELECT * FROM task_stats WHERE user_id = %s", (user_id,))
+        stats = source.fetchall()
+        if stats:
+            _insert_rows(target, "task_stats", stats)
+            target_conn.commit()
+
+        copied = _count_rows(target, user_id)
+        expected = _count_rows(source, user_id)
+        target_conn.commit()
+        source_conn.commit()
+    if copied != expected:
+        raise MoveError(f"复制后行数不一致: 原分片 {expected}，目标分片 {copied}")
+    return copied
+
+
+def _set_directory(statement, params):
+    with DatabaseConnection() as (conn, cursor):
+        if not conn or not cursor:
+            raise MoveError("无法连接主库")
+        cursor.execute(statement, params)
+        conn.commit()
+
+
+def move_user(user_id, target_shard, batch_size=MOVE_BATCH_SIZE, wait=None):
+    """
+    把用户迁移到 target_shard，返回 {"from": 原分片, "to": 目标分片, "rows": 各表复制的行数}
+    wait 为冻结写入与切换目录后等待的秒数，默认 directory_ttl
+    已申请删除的账号（is_active = 0）不迁移，由后台任务在原分片上删除
+    """
+    if target_shard not in shard_names():
+        raise MoveError(f"未配置的分片: {target_shard}")
+    wait = SHARD_CONFIG["directory_ttl"] if wait is None else wait
+
+    forget_shard(user_id)
+    source_shard, moving = locate_user(user_id)
+    if moving:
+        raise MoveError(f"用户 {user_id} 正在迁移")
+    if source_shard == target_shard:
+        return {"from": source_shard, "to": target_shard, "rows": {}}
+    with DatabaseConnection() as (conn, cursor):
+        if not conn or not cursor:
+            raise MoveError("无法连接主库")
+        cursor.execute(SELECT_ACCOUNT, (user_id,))
+        account = cursor.fetchone()
+    if not account or not account["is_active"]:
+        raise MoveError(f"用户 {user_id} 不存在或已申请删除")
+
+    _set_directory(FREEZE_USER, (user_id, source_shard))
+    try:
+        time.sleep(wait)
+        rows = copy_user(user_id, source_shard, target_shard, batch_size)
+        _set_directory(SWITCH_SHARD, (target_shard, user_id))
+    except Exception:
+        _set_directory(UNFREEZE_USER, (user_id,))
+        forget_shard(user_id)
+        raise
+    forget_shard(user_id)
+
+    from .cache import invalidate
+
+    invalidate(user_id, "tasks", "tags")
+
+    time.sleep(wait)
+    with DatabaseConnection(shard=source_shard) as (conn, cursor):
+        if not conn or not cursor:
+            raise MoveError(f"迁移已完成，但无法连接原分片 {source_shard}，其中的数据未清理")
+        _delete_user_data(conn, cursor, user_id, batch_size, MOVE_PAUSE)
+        if source_shard != MAIN_SHARD:
+            cursor.execute(DELETE_SHARD_USER, (user_id,))
+            conn.commit()
+    return {"from": source_shard, "to": target_shard, "rows": rows}
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    from .config import apply_config, load_config
+
+    apply_config(load_config())
+    if len(sys.argv) < 3 or sys.argv[1] not in ("locate", "move") or (sys.argv[1] == "move") != (len(sys.argv) == 4):
+        sys.exit("用法: python -m app.sharding locate <user_id> | move <user_id> <分片>")
+    user_id = int(sys.argv[2])
+    if sys.argv[1] == "locate":
+        shard, moving = locate_user(user_id)
+        print(json.dumps({"user_id": user_id, "shard": shard, "moving": moving}))
+    else:
+        try:
+            print(json.dumps(move_user(user_id, sys.argv[3]), ensure_ascii=False))
+        except MoveError as e:
+            sys.exit(str(e))
@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import has_request_context, request
+
+from .metrics import fingerprint
+
+# 慢查询日志配置
+# enabled: 是否记录慢查询
+# threshold: 耗时超过该秒数的语句记为慢查询
+# redact_params: 为 True 时参数只记录类型，不记录取值
+# explain: 为 True 时对每种慢查询指纹首次出现的语句执行一次 EXPLAIN
+# max_entries / max_plans: 慢查询记录与执行计划的环形缓冲区大小
+SLOW_QUERY_CONFIG = {
+    "enabled": False,
+    "threshold": 0.2,
+    "redact_params": True,
+    "explain": False,
+    "max_entries": 200,
+    "max_plans": 100,
+}
+
+# 支持 EXPLAIN 的语句类型
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "INSERT", "REPLACE")
+
+_lock = threading.Lock()
+_entries = deque(maxlen=SLOW_QUERY_CONFIG["max_entries"])
+_plans = OrderedDict()
+_explainer = None
+
+
+def _redact(params, executemany):
+    if params is None:
+        return None
+    if executemany:
+        return f"<{len(params)} rows>" if SLOW_QUERY_CONFIG["redact_params"] else [list(p) for p in params]
+    if SLOW_QUERY_CONFIG["redact_params"]:
+        return [f"<{type(value).__name__}>" for value in params]
+    return [str(value) for value in params]
+
+
+def _route():
+    if has_request_context() and request.url_rule:
+        return f"{request.method} {request.url_rule.rule}"
+    return None
+
+
+def _explain(key, statement, params, shard):
+    """
+    在语句所在分片的独立连接上执行 EXPLAIN，结果存入执行计划缓冲区
+    """
+    from mysql.connector import Error
+
+    from .db import DatabaseConnection
+
+    with DatabaseConnection(shard=shard) as (conn, cursor):
+        if not conn or not cursor:
+            return
+        try:
+            cursor.execute(f"EXPLAIN {statement}", params)
+            plan = cursor.fetchall()
+        except Error as e:
+            print(f"EXPLAIN 执行失败: {e}")
+            return
+    with _lock:
+        if key in _plans:
+            _plans[key]["plan"] = plan
+            _plans[key]["explained_at"] = time.time()
+
+
+def _schedule_explain(key, statement, params, shard):
+    global _explainer
+    with _lock:
+        if key in _plans:
+            return
+        _plans[key] = {"fingerprint": key, "statement": statement, "shard": shard, "plan": None, "explained_at": None}
+        while len(_plans) > SLOW_QUERY_CONFIG["max_plans"]:
+            _plans.popitem(last=False)
+        if _explainer is None:
+            _explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+    # 在后台线程中执行，不占用当前请求的连接和时间
+    _explainer.submit(_explain, key, statement, params, shard)
+
+
+def _on_query(statement, params, seconds, rowcount, error, shard):
+    if seconds < SLOW_QUERY_CONFIG["threshold"]:
+        return
+    if statement.lstrip()[:7].upper() == "EXPLAIN":
+        return
+    key = fingerprint(statement)
+    executemany = isinstance(params, list) and bool(params) and isinstance(params[0], (list, tuple))
+    entry = {
+        "time": time.time(),
+        "seconds": round(seconds, 6),
+        "fingerprint": key,
+        "params": _redact(params, executemany),
+        "rowcount": rowcount,
+        "route": _route(),
+        "shard": shard,
+        "error": str(error) if error else None,
+    }
+    with _lock:
+        _entries.append(entry)
+    print(f"慢查询 {entry['seconds']}s [{entry['route']}] {key} params={entry['params']} rows={rowcount}")
+
+    if (
+        SLOW_QUERY_CONFIG["explain"]
+        and error is None
+        and not executemany
+        and statement.lstrip().split(None, 1)[0].upper() in EXPLAINABLE
+    ):
+        _schedule_explain(key, statement, params, shard)
+
+
+def slow_queries():
+    """
+    最近的慢查询记录和已采集的执行计划
+    """
+    with _lock:
+        return {
+            "threshold": SLOW_QUERY_CONFIG["threshold"],
+            "entries": list(_entries),
+            "plans": list(_plans.values()),
+        }
+
+
+def init_slow_query_log():
+    """
+    按 SLOW_QUERY_CONFIG 启用慢查询日志，在数据库层挂载查询钩子
+    """
+    global _entries
+    if not SLOW_QUERY_CONFIG["enabled"]:
+        return
+    from .db import add_query_hook
+
+    with _lock:
+        if _entries.maxlen != SLOW_QUERY_CONFIG["max_entries"]:
+            _entries = deque(_entries, maxlen=SLOW_QUERY_CONFIG["max_entries"])
+    add_query_hook(_on_query)
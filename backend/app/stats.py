@@ -0,0 +1,221 @@
+"""
+按用户增量维护的任务统计
+task_stats 表按 (user_id, status, priority) 保存未删除任务的数量，任务的新建、更新、删除
+在同一事务中以增量方式更新对应计数，读取时只需按主键取出至多十几行
+计数可能因故障或绕过接口的直接修改而偏离，由对账任务按 GROUP BY 的结果校正
+
+    python -m app.stats            # 对账所有用户
+    python -m app.stats 42         # 只对账用户 42
+"""
+import threading
+import time
+from collections import Counter
+
+from mysql.connector import Error
+
+from .db import DatabaseConnection, prepared, shard_names
+
+# 统计配置
+# reconcile_interval: 应用进程内对账线程的运行间隔（秒），0 表示不在应用内对账
+# reconcile_batch_size: 对账时每批处理的用户数
+# reconcile_pause: 每批之间暂停的秒数，避免对账占满数据库
+STATS_CONFIG = {
+    "reconcile_interval": 0,
+    "reconcile_batch_size": 100,
+    "reconcile_pause": 0.1,
+}
+
+# 合法的任务状态与优先级，与 schema.sql 中的注释一致
+TASK_STATUSES = (0, 1, 2, 3)
+TASK_PRIORITIES = (0, 1, 2, 3)
+
+READ_STATS = prepared("SELECT status, priority, task_count FROM task_stats WHERE user_id = %s")
+LOCK_STATS = "SELECT status, priority, task_count FROM task_stats WHERE user_id = %s FOR UPDATE"
+COUNT_TASKS = (
+    "SELECT status, priority, COUNT(*) AS task_count FROM tasks "
+    "WHERE user_id = %s AND is_deleted = 0 GROUP BY status, priority"
+)
+# 逾期数随时间变化，无法增量维护，由 (user_id, is_deleted, due_date) 索引的范围计数得出
+COUNT_OVERDUE = prepared(
+    "SELECT COUNT(*) AS overdue FROM tasks "
+    "WHERE user_id = %s AND is_deleted = 0 AND due_date < %s AND status NOT IN (%s, %s)"
+)
+RECONCILE_USERS = "SELECT id FROM users WHERE id > %s ORDER BY id LIMIT %s"
+
+_totals = {"runs": 0, "users": 0, "drifted": 0, "cells": 0}
+_totals_lock = threading.Lock()
+
+
+def stat_key(status, priority):
+    """
+    任务在统计表中的位置 (status, priority)，取值已由接口校验
+    """
+    return int(status), int(priority)
+
+
+def stats_delta_query(user_id, deltas):
+    """
+    把 {(status, priority): 增量} 合并为一条 upsert，没有非零增量时返回 None
+    """
+    items = [(key, delta) for key, delta in deltas.items() if delta]
+    if not items:
+        return None
+    placeholders = ", ".join(["(%s, %s, %s, %s)"] * len(items))
+    params = [value for (status, priority), delta in items for value in (user_id, status, priority, delta)]
+    return (
+        "INSERT INTO task_stats (user_id, status, priority, task_count) "
+        f"VALUES {placeholders} "
+        "ON DUPLICATE KEY UPDATE task_count = task_count + VALUES(task_count)",
+        tuple(params),
+    )
+
+
+def apply_stats_deltas(cursor, user_id, deltas):
+    """
+    在调用方的事务中更新统计计数
+    """
+    query = stats_delta_query(user_id, deltas)
+    if query:
+        cursor.execute(*query)
+
+
+def summarize(rows, overdue):
+    """
+    把 task_stats 的行与逾期数汇总为接口返回的结构
+    """
+    by_status = {str(status): 0 for status in TASK_STATUSES}
+    by_priority = {str(priority): 0 for priority in TASK_PRIORITIES}
+    total = 0
+    for row in rows:
+        count = int(row["task_count"])
+        by_status[str(row["status"])] = by_status.get(str(row["status"]), 0) + count
+        by_priority[str(row["priority"])] = by_priority.get(str(row["priority"]), 0) + count
+        total += count
+    return {"total": total, "by_status": by_status, "by_priority": by_priority, "overdue": int(overdue)}
+
+
+def reconcile_deltas(stored_rows, actual_rows):
+    """
+    比较计数表（LOCK_STATS）与实际计数（COUNT_TASKS），返回需要补上的增量
+    """
+    stored = {(row["status"], row["priority"]): int(row["task_count"]) for row in stored_rows}
+    actual = {(row["status"], row["priority"]): int(row["task_count"]) for row in actual_rows}
+    deltas = Counter()
+    for key in stored.keys() | actual.keys():
+        deltas[key] = actual.get(key, 0) - stored.get(key, 0)
+    return deltas
+
+
+def reconcile_user(cursor, user_id):
+    """
+    在调用方的事务中校正用户的统计计数，返回被修正的计数个数
+    先锁住用户的计数行（含间隙），并发写入会在更新计数时等待本事务提交，
+    之后的 GROUP BY 读到的是这些写入提交之后的快照
+    """
+    cursor.execute(LOCK_STATS, (user_id,))
+    stored = cursor.fetchall()
+    cursor.execute(COUNT_TASKS, (user_id,))
+    deltas = reconcile_deltas(stored, cursor.fetchall())
+    apply_stats_deltas(cursor, user_id, deltas)
+    return sum(1 for delta in deltas.values() if delta)
+
+
+def _reconcile_one(conn, cursor, user_id, result):
+    cells = reconcile_user(cursor, user_id)
+    conn.commit()
+    result["users"] += 1
+    if cells:
+        result["drifted"] += 1
+        result["cells"] += cells
+
+
+def reconcile_stats(user_ids=None, batch_size=None, pause=None):
+    """
+    对账：按用户id顺序分批校正统计计数，每个用户一个事务
+    user_ids 不提供时依次处理每个分片（含主库）上的所有用户，否则各用户在其所在的分片上处理
+    返回 {"users": 处理的用户数, "drifted": 有偏差的用户数, "cells": 修正的计数个数}
+    """
+    batch_size = batch_size or STATS_CONFIG["reconcile_batch_size"]
+    pause = STATS_CONFIG["reconcile_pause"] if pause is None else pause
+    result = {"users": 0, "drifted": 0, "cells": 0}
+    try:
+        if user_ids is not None:
+            for user_id in user_ids:
+                # 连接失败或用户正在迁移分片时跳过
+                with DatabaseConnection(user_id=user_id) as (conn, cursor):
+                    if conn and cursor:
+                        _reconcile_one(conn, cursor, user_id, result)
+            return result
+        for shard in shard_names():
+            last_id = 0
+            while True:
+                with DatabaseConnection(shard=shard) as (conn, cursor):
+                    if not conn or not cursor:
+                        break
+                    cursor.execute(RECONCILE_USERS, (last_id, batch_size))
+                    batch = [row["id"] for row in cursor.fetchall()]
+                    conn.commit()
+                    for user_id in batch:
+                        _reconcile_one(conn, cursor, user_id, result)
+                if len(batch) < batch_size:
+                    break
+                last_id = batch[-1]
+                time.sleep(pause)
+        return result
+    finally:
+        with _totals_lock:
+            _totals["runs"] += 1
+            for key, value in result.items():
+                _totals[key] += value
+
+
+def reconcile_totals():
+    """
+    本进程累计的对账结果，供 /metrics 使用
+    """
+    with _totals_lock:
+        return dict(_totals)
+
+
+_reconciler = None
+_reconciler_stop = threading.Event()
+
+
+def _reconcile_loop(interval):
+    while not _reconciler_stop.wait(interval):
+        try:
+            result = reconcile_stats()
+        except Error as e:
+            print(f"统计对账失败: {e}")
+            continue
+        if result["drifted"]:
+            print(f"统计对账: {result}")
+
+
+def start_reconciler():
+    """
+    按 STATS_CONFIG 启动后台对账线程，interval 为 0 时不启动
+    """
+    global _reconciler
+    interval = STATS_CONFIG["reconcile_interval"]
+    if not interval or _reconciler is not None:
+        return
+    _reconciler_stop.clear()
+    _reconciler = threading.Thread(target=_reconcile_loop, args=(interval,), name="stats-reconciler", daemon=True)
+    _reconciler.start()
+
+
+def stop_reconciler():
+    global _reconciler
+    _reconciler_stop.set()
+    _reconciler = None
+
+
+if __name__ == "__main__":
+    import sys
+
+    from .config import apply_config, load_config
+
+    apply_config(load_config())
+    ids = [int(arg) for arg in sys.argv[1:]] or None
+    print(reconcile_stats(ids))
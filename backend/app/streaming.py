@@ -0,0 +1,95 @@
+import csv
+import io
+
+from flask import current_app
+
+from .db import WRITE, stream_query
+
+# 流式响应每次从数据库读取的行数
+STREAM_CHUNK_SIZE = 500
+
+STREAM_FORMATS = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# CSV 中多值字段（如任务的标签名）的分隔符
+CSV_LIST_SEPARATOR = ";"
+
+
+def parse_stream_format(args):
+    """
+    解析查询参数 stream（json、ndjson 或 csv）
+    返回 (格式, 错误信息)，未请求流式响应时格式为 None
+    """
+    fmt = args.get("stream")
+    if fmt is None:
+        return None, None
+    if fmt not in STREAM_FORMATS:
+        return None, "无效的流式格式"
+    return fmt, None
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return CSV_LIST_SEPARATOR.join(str(item["name"] if isinstance(item, dict) else item) for item in value)
+    return "" if value is None else value
+
+
+class RowEncoder:
+    """
+    把分块读取的查询结果编码为流式响应的片段，同步与异步两种服务模式共用
+    json: 一个 JSON 数组；ndjson: 每行一个 JSON 对象；
+    csv: 首行为列名，列表字段（标签）输出为以 CSV_LIST_SEPARATOR 分隔的名称
+    transform 在编码前作用于每一行
+    """
+
+    def __init__(self, fmt, dumps, transform=None):
+        self.fmt = fmt
+        self.dumps = dumps
+        self.transform = transform
+        self.started = False
+
+    def chunk(self, rows):
+        if self.transform:
+            rows = [self.transform(row) for row in rows]
+        if self.fmt == "ndjson":
+            return "".join(self.dumps(row) + "\n" for row in rows)
+        if self.fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if not self.started and rows:
+                writer.writerow(rows[0].keys())
+            writer.writerows([_csv_value(value) for value in row.values()] for row in rows)
+            self.started = self.started or bool(rows)
+            return buffer.getvalue()
+        separator = "," if self.started else "["
+        self.started = True
+        return separator + ",".join(self.dumps(row) for row in rows)
+
+    def end(self):
+        if self.fmt != "json":
+            return ""
+        return "]" if self.started else "[]"
+
+
+def stream_rows(query, params, fmt, transform=None, intent=WRITE, user_id=None):
+    """
+    执行查询并以流式响应逐块输出结果，格式见 RowEncoder
+    intent / user_id 同 DatabaseConnection；获取连接失败时返回 None
+    """
+    rows = stream_query(query, params, STREAM_CHUNK_SIZE, intent, user_id)
+    if rows is None:
+        return None
+    encoder = RowEncoder(fmt, current_app.json.dumps, transform)
+
+    def generate():
+        for chunk in rows:
+            yield encoder.chunk(chunk)
+        yield encoder.end()
+
+    response = current_app.response_class(generate(), mimetype=STREAM_FORMATS[fmt])
+    # 客户端断开或生成器未被消费时也要归还连接
+    response.call_on_close(rows.close)
+    return response
@@ -0,0 +1,57 @@
+"""
+生产环境启动入口
+基于 gunicorn 的多进程（prefork）服务，每个工作进程使用多线程处理请求
+配置来自 YOUTIME_CONFIG 指定的 JSON 文件和 YOUTIME_ 前缀的环境变量，见 app/config.py
+
+    python serve.py
+    YOUTIME_WORKERS=8 YOUTIME_THREADS=4 python serve.py
+
+平滑重启: kill -HUP <主进程pid>
+"""
+from gunicorn.app.base import BaseApplication
+
+from app import create_app, init_worker_resources, start_background_tasks
+from app.cache import set_worker_count
+from app.config import apply_config, load_config, load_secret_key
+
+
+def post_fork(server, worker):
+    # 未预加载时应用尚未创建、配置尚未应用，这里只重置继承的资源
+    init_worker_resources()
+
+
+def post_worker_init(worker):
+    # 工作进程已加载应用（配置已应用），再启动后台线程
+    start_background_tasks()
+
+
+class YoutimeServer(BaseApplication):
+    def __init__(self, config):
+        self.config = config
+        super().__init__()
+
+    def load_config(self):
+        self.cfg.set("bind", self.config["bind"])
+        self.cfg.set("workers", self.config["workers"])
+        self.cfg.set("threads", self.config["threads"])
+        self.cfg.set("worker_class", "gthread")
+        self.cfg.set("timeout", self.config["timeout"])
+        self.cfg.set("graceful_timeout", self.config["graceful_timeout"])
+        self.cfg.set("max_requests", self.config["max_requests"])
+        self.cfg.set("preload_app", self.config["preload_app"])
+        self.cfg.set("post_fork", post_fork)
+        self.cfg.set("post_worker_init", post_worker_init)
+
+    def load(self):
+        # 后台线程只在工作进程中启动；预加载时 load 在主进程中执行
+        return create_app(self.config, start_background=False)
+
+
+if __name__ == "__main__":
+    config = load_config()
+    # 多进程时要求共享缓存，配置不满足时在启动前报错
+    apply_config(config)
+    set_worker_count(config["workers"])
+    # 在启动工作进程之前准备好共享的会话密钥
+    load_secret_key(config)
+    YoutimeServer(config).run()
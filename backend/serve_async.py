@@ -0,0 +1,39 @@
+"""
+异步（ASGI）服务启动入口
+基于 hypercorn 的单进程事件循环，路由与 serve.py 相同；
+适合大量并发慢连接和长轮询，多核部署可通过 YOUTIME_WORKERS 启动多个进程
+配置来自 YOUTIME_CONFIG 指定的 JSON 文件和 YOUTIME_ 前缀的环境变量，见 app/config.py
+
+    python serve_async.py
+    YOUTIME_WORKERS=4 python serve_async.py
+"""
+from hypercorn.config import Config
+from hypercorn.run import run
+
+from app.cache import set_worker_count
+from app.config import apply_config, load_config, load_secret_key
+
+
+def build_hypercorn_config(config):
+    hypercorn_config = Config()
+    hypercorn_config.bind = [config["bind"]]
+    hypercorn_config.workers = config["workers"]
+    hypercorn_config.graceful_timeout = config["graceful_timeout"]
+    hypercorn_config.application_path = "serve_async:create_asgi_app()"
+    return hypercorn_config
+
+
+def create_asgi_app():
+    from app.aio import create_async_app
+
+    return create_async_app()
+
+
+if __name__ == "__main__":
+    config = load_config()
+    # 多进程时要求共享缓存，配置不满足时在启动前报错
+    apply_config(config)
+    set_worker_count(config["workers"])
+    # 在启动工作进程之前准备好共享的会话密钥
+    load_secret_key(config)
+    run(build_hypercorn_config(config))
@@ -0,0 +1,111 @@
+"""
+任务列表响应的编码基准：序列化耗时与响应大小
+对比标准库 json（与 Flask 默认 provider 相同的参数）和 orjson，
+orjson 一栏使用 app.encoding 中的日期格式化，与响应中实际使用的相同；
+以及完整字段与 fields=title,status,due_date 时的原始 / gzip / br 大小
+
+    cd backend && python tests/bench_encoding.py [行数]
+"""
+import gzip
+import json
+import sys
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.encoding import http_date as fast_http_date  # noqa: E402
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+REPEAT = 20
+FIELDS = ("id", "title", "status", "due_date")
+
+
+def http_date(value):
+    # 与 Flask 默认 provider 对 datetime 的输出相同，无时区的值视为 UTC
+    return format_datetime(value.replace(tzinfo=value.tzinfo or timezone.utc), usegmt=True)
+
+
+def default(value):
+    if isinstance(value, datetime):
+        return http_date(value)
+    raise TypeError(type(value).__name__)
+
+
+def stdlib_dumps(obj):
+    return json.dumps(obj, default=default, ensure_ascii=True, sort_keys=True)
+
+
+def fast_default(value):
+    if isinstance(value, datetime):
+        return fast_http_date(value)
+    raise TypeError(type(value).__name__)
+
+
+def orjson_dumps(obj):
+    option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+    return orjson.dumps(obj, default=fast_default, option=option).decode()
+
+
+def make_rows(count):
+    start = datetime(2024, 1, 1, 9, 0, 0)
+    return [
+        {
+            "id": i,
+            "title": f"任务 {i}：整理会议纪要",
+            "description": "跟进上周讨论的事项并同步给团队" if i % 3 else None,
+            "status": i % 4,
+            "priority": i % 4,
+            "due_date": start + timedelta(hours=i) if i % 5 else None,
+            "created_at": start + timedelta(minutes=i),
+            "updated_at": start + timedelta(minutes=i, seconds=30),
+        }
+        for i in range(count)
+    ]
+
+
+def timed(dumps, rows):
+    best = None
+    for _ in range(REPEAT):
+        begin = time.perf_counter()
+        body = dumps(rows)
+        elapsed = time.perf_counter() - begin
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body.encode()
+
+
+def sizes(body):
+    result = {"raw": len(body), "gzip": len(gzip.compress(body, compresslevel=6))}
+    if brotli is not None:
+        result["br"] = len(brotli.compress(body, quality=4))
+    return result
+
+
+def main():
+    rows = make_rows(ROWS)
+    sparse = [{key: row[key] for key in FIELDS} for row in rows]
+    encoders = [("json", stdlib_dumps)] + ([("orjson", orjson_dumps)] if orjson else [])
+
+    print(f"{ROWS} 行，每项取 {REPEAT} 次中的最短耗时")
+    for label, data in (("全部字段", rows), ("fields=title,status,due_date", sparse)):
+        for name, dumps in encoders:
+            elapsed, body = timed(dumps, data)
+            begin = time.perf_counter()
+            gzip.compress(body, compresslevel=6)
+            gzip_ms = (time.perf_counter() - begin) * 1000
+            print(f"{label:<32} {name:<7} 序列化 {elapsed * 1000:7.1f} ms  gzip {gzip_ms:6.1f} ms  大小 {sizes(body)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+SQL 指纹检查：同一形状、不同行数或参数个数的语句应得到同一个指纹，避免 statement 标签的取值随批量大小增长
+
+    cd backend && python tests/metrics_test.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.metrics import fingerprint  # noqa: E402
+
+
+def rows(count, width):
+    return ", ".join(["(" + ", ".join(["%s"] * width) + ")"] * count)
+
+
+def test_multi_row_insert():
+    statements = [
+        f"INSERT INTO tasks (user_id, title, description, status, priority, due_date) VALUES {rows(count, 6)}"
+        for count in (1, 2, 3, 500)
+    ]
+    assert len({fingerprint(statement) for statement in statements}) == 1
+
+
+def test_stats_upsert():
+    statements = [
+        f"INSERT INTO task_stats (user_id, status, priority, task_count) VALUES {rows(count, 4)} "
+        "ON DUPLICATE KEY UPDATE task_count = task_count + VALUES(task_count)"
+        for count in (1, 2, 16)
+    ]
+    assert len({fingerprint(statement) for statement in statements}) == 1
+
+
+def test_in_list():
+    statements = [
+        f"SELECT id FROM tasks WHERE user_id = %s AND id IN ({', '.join(['%s'] * count)})" for count in (1, 5, 200)
+    ]
+    assert len({fingerprint(statement) for statement in statements}) == 1
+
+
+def test_distinct_shapes():
+    assert fingerprint("SELECT id FROM tasks WHERE id = %s") != fingerprint("SELECT id FROM tags WHERE id = %s")
+
+
+if __name__ == "__main__":
+    for name, check in list(globals().items()):
+        if name.startswith("test_"):
+            check()
+            print(f"{name}: ok")
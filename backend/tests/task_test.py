@@ -1,3 +1,5 @@
+import threading
+
 import requests
 
 base_users = "http://127.0.0.1:5000/api/users"
@@ -26,6 +28,46 @@ resp = session.get(f"{base_tasks}/")
 print("get:", resp.status_code, resp.text)
 
 tasks = resp.json() if resp.ok else []
+
+resp = session.get(f"{base_tasks}/", params={"sort": "-due_date", "limit": 2})
+print("page 1:", resp.status_code, resp.text)
+next_cursor = resp.json().get("next_cursor") if resp.ok else None
+if next_cursor:
+    resp = session.get(
+        f"{base_tasks}/", params={"sort": "-due_date", "limit": 2, "cursor": next_cursor}
+    )
+    print("page 2:", resp.status_code, resp.text)
+
+resp = session.get(f"{base_tasks}/", params={"include": "tags", "limit": 10})
+print("with tags:", resp.status_code, resp.text)
+
+resp = session.get(f"{base_tasks}/search", params={"q": "test", "limit": 10})
+print("search:", resp.status_code, resp.text)
+
+resp = session.get(f"{base_tasks}/search", params={"due": "overdue", "sort": "due_date", "limit": 10})
+print("overdue:", resp.status_code, resp.text)
+
+resp = session.get(f"{base_tasks}/due/summary")
+print("due summary:", resp.status_code, resp.text)
+
+resp = session.post(
+    f"{base_tasks}/import",
+    data='{"title": "Imported Task", "tags": ["imported"]}\n{"title": ""}\n',
+    headers={"Content-Type": "application/x-ndjson"},
+)
+print("import:", resp.status_code, resp.text)
+
+resp = session.get(f"{base_tasks}/", params={"stream": "csv", "include": "tags"})
+print("export csv:", resp.status_code, resp.text[:200])
+
+resp = session.get(f"{base_tasks}/", params={"fields": "title,due_date"}, headers={"Accept-Encoding": "gzip"})
+print("fields:", resp.status_code, resp.headers.get("Content-Encoding"), resp.text[:200])
+
+resp = session.get("http://127.0.0.1:5000/api/tags/")
+tag_ids = [str(tag["id"]) for tag in resp.json()] if resp.ok else []
+if tag_ids:
+    resp = session.get(f"{base_tasks}/search", params={"any_tags": ",".join(tag_ids[:2]), "exclude_tags": tag_ids[-1]})
+    print("search tags:", resp.status_code, resp.text[:200])
 task_id = tasks[0]["id"] if tasks else None
 
 if task_id:
@@ -40,3 +82,13 @@ if task_id:
 else:
     print("update: skipped (no task id)")
     print("delete: skipped (no task id)")
+
+resp = session.get(f"{base_tasks}/stats")
+print("stats:", resp.status_code, resp.text)
+
+# 长轮询：首次请求取得游标，之后在另一线程中修改任务，等待中的请求随即返回变更事件
+resp = session.get("http://127.0.0.1:5000/api/events/poll")
+cursor = resp.json()["cursor"]
+threading.Timer(0.5, lambda: session.post(f"{base_tasks}/", json={"title": "Pushed Task"})).start()
+resp = session.get("http://127.0.0.1:5000/api/events/poll", params={"since": cursor, "timeout": 5})
+print("poll events:", resp.status_code, resp.text)
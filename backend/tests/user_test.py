@@ -11,4 +11,8 @@ resp = requests.post(
     f"{base}/login",
     json={"username": "alice", "password": "secret"}
 )
-print("login:", resp.status_code, resp.text)
\ No newline at end of file
+print("login:", resp.status_code, resp.text)
+# 登录每次消耗 5 个令牌，连续请求超出令牌桶容量后返回 429 与 Retry-After
+for _ in range(10):
+    resp = requests.post(f"{base}/login", json={"username": "alice", "password": "wrong"})
+print("login burst:", resp.status_code, resp.headers.get("Retry-After"), resp.text)
@@ -69,9 +69,79 @@ CREATE TABLE IF NOT EXISTS tasks (
     -- 为 user_id和status 创建联合索引，加快基于用户的任务查询
     INDEX idx_user_status (user_id, status),
     -- 为 due_date 创建索引，加快基于截止日期的查询或排序
-    INDEX idx_due_date (due_date)
+    INDEX idx_due_date (due_date),
+    -- 以下联合索引支撑任务列表的排序与键集分页（InnoDB 二级索引隐含主键 id 作为次序）
+    INDEX idx_user_deleted (user_id, is_deleted),
+    INDEX idx_user_deleted_due (user_id, is_deleted, due_date),
+    INDEX idx_user_deleted_priority (user_id, is_deleted, priority),
+    INDEX idx_user_deleted_created (user_id, is_deleted, created_at),
+    -- 增量同步按 updated_at 扫描用户的变更（含软删除的墓碑）
+    INDEX idx_user_updated (user_id, updated_at),
+    -- 标题和描述的全文索引，ngram 分词以支持中文检索（按相关度排序、前缀匹配）
+    FULLTEXT INDEX ft_title_description (title, description) WITH PARSER ngram
 )ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- 已有数据库上补建 tasks 的全文索引（CREATE TABLE IF NOT EXISTS 不会修改已存在的表）
+-- 以 information_schema 判断是否已添加，本文件可以在已有数据库上重复执行
+SET @tasks_fulltext_migration = IF(
+    (SELECT COUNT(*) FROM information_schema.STATISTICS
+     WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'tasks' AND INDEX_NAME = 'ft_title_description') = 0,
+    'ALTER TABLE tasks ADD FULLTEXT INDEX ft_title_description (title, description) WITH PARSER ngram',
+    'DO 0'
+);
+PREPARE tasks_fulltext_migration FROM @tasks_fulltext_migration;
+EXECUTE tasks_fulltext_migration;
+DEALLOCATE PREPARE tasks_fulltext_migration;
+
+-- 已有数据库上补建任务列表排序与键集分页使用的联合索引
+SET @tasks_user_deleted_migration = IF(
+    (SELECT COUNT(*) FROM information_schema.STATISTICS
+     WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'tasks' AND INDEX_NAME = 'idx_user_deleted') = 0,
+    'ALTER TABLE tasks ADD INDEX idx_user_deleted (user_id, is_deleted)',
+    'DO 0'
+);
+PREPARE tasks_user_deleted_migration FROM @tasks_user_deleted_migration;
+EXECUTE tasks_user_deleted_migration;
+DEALLOCATE PREPARE tasks_user_deleted_migration;
+SET @tasks_user_deleted_due_migration = IF(
+    (SELECT COUNT(*) FROM information_schema.STATISTICS
+     WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'tasks' AND INDEX_NAME = 'idx_user_deleted_due') = 0,
+    'ALTER TABLE tasks ADD INDEX idx_user_deleted_due (user_id, is_deleted, due_date)',
+    'DO 0'
+);
+PREPARE tasks_user_deleted_due_migration FROM @tasks_user_deleted_due_migration;
+EXECUTE tasks_user_deleted_due_migration;
+DEALLOCATE PREPARE tasks_user_deleted_due_migration;
+SET @tasks_user_deleted_priority_migration = IF(
+    (SELECT COUNT(*) FROM information_schema.STATISTICS
+     WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'tasks' AND INDEX_NAME = 'idx_user_deleted_priority') = 0,
+    'ALTER TABLE tasks ADD INDEX idx_user_deleted_priority (user_id, is_deleted, priority)',
+    'DO 0'
+);
+PREPARE tasks_user_deleted_priority_migration FROM @tasks_user_deleted_priority_migration;
+EXECUTE tasks_user_deleted_priority_migration;
+DEALLOCATE PREPARE tasks_user_deleted_priority_migration;
+SET @tasks_user_deleted_created_migration = IF(
+    (SELECT COUNT(*) FROM information_schema.STATISTICS
+     WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'tasks' AND INDEX_NAME = 'idx_user_deleted_created') = 0,
+    'ALTER TABLE tasks ADD INDEX idx_user_deleted_created (user_id, is_deleted, created_at)',
+    'DO 0'
+);
+PREPARE tasks_user_deleted_created_migration FROM @tasks_user_deleted_created_migration;
+EXECUTE tasks_user_deleted_created_migration;
+DEALLOCATE PREPARE tasks_user_deleted_created_migration;
+
+-- 已有数据库上补建增量同步按 updated_at 扫描使用的索引
+SET @tasks_user_updated_migration = IF(
+    (SELECT COUNT(*) FROM information_schema.STATISTICS
+     WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'tasks' AND INDEX_NAME = 'idx_user_updated') = 0,
+    'ALTER TABLE tasks ADD INDEX idx_user_updated (user_id, updated_at)',
+    'DO 0'
+);
+PREPARE tasks_user_updated_migration FROM @tasks_user_updated_migration;
+EXECUTE tasks_user_updated_migration;
+DEALLOCATE PREPARE tasks_user_updated_migration;
+
 -- tags 表：存储任务标签信息（用户隔离）
 CREATE TABLE IF NOT EXISTS tags (
     -- 标签ID：无符号整型，自增，主键
@@ -88,6 +158,22 @@ CREATE TABLE IF NOT EXISTS tags (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 )ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- tags 表补充软删除、更新时间与颜色列（接口按 is_deleted 过滤标签，增量同步与清理任务按 updated_at 判断）
+-- 以 information_schema 判断是否已添加，本文件可以在已有数据库上重复执行
+SET @tags_migration = IF(
+    (SELECT COUNT(*) FROM information_schema.COLUMNS
+     WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'tags' AND COLUMN_NAME = 'is_deleted') = 0,
+    'ALTER TABLE tags
+        ADD COLUMN color VARCHAR(32) DEFAULT NULL AFTER name,
+        ADD COLUMN is_deleted TINYINT(1) NOT NULL DEFAULT 0 AFTER color,
+        ADD COLUMN updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP AFTER created_at,
+        ADD INDEX idx_user_deleted (user_id, is_deleted)',
+    'DO 0'
+);
+PREPARE tags_migration FROM @tags_migration;
+EXECUTE tags_migration;
+DEALLOCATE PREPARE tags_migration;
+
 -- task_tags 表：多对多关联任务和标签
 CREATE TABLE IF NOT EXISTS task_tags (
     -- 任务ID：无符号整型，不能为空，存放任务的ID
@@ -96,8 +182,77 @@ CREATE TABLE IF NOT EXISTS task_tags (
     tag_id INT UNSIGNED NOT NULL,
     -- 联合主键，确保同一任务不能重复关联同一标签
     PRIMARY KEY (task_id, tag_id),
+    -- 按标签查找任务（单标签列表与多标签过滤）时按 tag_id 范围扫描，直接得到 task_id
+    INDEX idx_tag_task (tag_id, task_id),
     -- 外键约束，确保 task_id 必须存在于 tasks 表中
     FOREIGN KEY (task_id) REFERENCES tasks(id) ON DELETE CASCADE,
     -- 外键约束，确保 tag_id 必须存在于 tags 表中
     FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
-)ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
\ No newline at end of file
+)ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 已有数据库上补建按标签查找任务的索引
+SET @task_tags_tag_task_migration = IF(
+    (SELECT COUNT(*) FROM information_schema.STATISTICS
+     WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'task_tags' AND INDEX_NAME = 'idx_tag_task') = 0,
+    'ALTER TABLE task_tags ADD INDEX idx_tag_task (tag_id, task_id)',
+    'DO 0'
+);
+PREPARE task_tags_tag_task_migration FROM @task_tags_tag_task_migration;
+EXECUTE task_tags_tag_task_migration;
+DEALLOCATE PREPARE task_tags_tag_task_migration;
+-- task_stats 表：按用户增量维护的未删除任务计数（见 backend/app/stats.py）
+CREATE TABLE IF NOT EXISTS task_stats (
+    -- 关联用户ID
+    user_id INT UNSIGNED NOT NULL,
+    -- 任务状态与优先级，取值同 tasks 表
+    status TINYINT NOT NULL,
+    priority TINYINT NOT NULL,
+    -- 该用户处于此状态与优先级的未删除任务数
+    task_count INT NOT NULL DEFAULT 0,
+    -- 每个用户至多 16 行，按主键范围读取
+    PRIMARY KEY (user_id, status, priority),
+    -- 外键约束，用户删除时一并删除计数
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+)ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- jobs 表：后台清理与账号删除任务及其进度（见 backend/app/jobs.py）
+CREATE TABLE IF NOT EXISTS jobs (
+    -- 任务ID
+    id INT UNSIGNED NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    -- 任务类型：purge（清理过期的软删除数据）、delete_user（删除账号）
+    kind VARCHAR(32) NOT NULL,
+    -- delete_user 的目标用户；不设外键，任务的最后一步就是删除该用户
+    user_id INT UNSIGNED DEFAULT NULL,
+    -- 任务状态
+    status TINYINT NOT NULL DEFAULT 0 COMMENT '0: pending, 1: running, 2: done, 3: failed',
+    -- 当前阶段序号与该阶段已处理到的主键，中断后从这里继续
+    stage TINYINT UNSIGNED NOT NULL DEFAULT 0,
+    position BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    -- 已删除的行数
+    processed BIGINT UNSIGNED NOT NULL DEFAULT 0,
+    -- 已领取的次数与最近一次失败的原因
+    attempts INT UNSIGNED NOT NULL DEFAULT 0,
+    error TEXT,
+    -- 执行中任务的租约到期时间，过期后其他进程可以接手
+    locked_until DATETIME DEFAULT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    -- 领取任务时按状态查找未完成的任务
+    INDEX idx_status (status, id)
+)ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- user_shards 表：用户所在分片的目录，只在主库中使用（见 backend/app/db.py 的 SHARD_CONFIG）
+-- 没有记录的用户数据在主库；分片库使用同一份表结构，其中的 users 只有占位行
+CREATE TABLE IF NOT EXISTS user_shards (
+    -- 用户ID
+    user_id INT UNSIGNED NOT NULL PRIMARY KEY,
+    -- 分片名，对应配置中 sharding.shards 的键
+    shard VARCHAR(64) NOT NULL,
+    -- 迁移中：1 表示正在复制到新分片，期间拒绝该用户的写入
+    moving TINYINT(1) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    -- 按分片列出用户（迁移、容量统计）
+    INDEX idx_shard (shard),
+    -- 外键约束，账号删除时一并删除目录记录
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+)ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;